@@ -0,0 +1,159 @@
+import asyncio
+import copy
+import inspect
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+
+@dataclass(frozen=True)
+class AnalysisNode:
+    """
+    One analysis task in the pipeline.
+    `inputs` names either source inputs (e.g. "mda_text") or other nodes; their values are
+    passed to `run` positionally. When any of the `required` inputs is empty the task is
+    skipped and `fallback` is used, which is also the result if the task or an upstream task fails.
+    """
+    name: str
+    run: Callable[..., Awaitable[Any]]
+    inputs: tuple = ()
+    required: tuple = ()
+    fallback: Any = field(default_factory=dict)
+
+
+class UpstreamFailed(Exception):
+    def __init__(self, node: str, upstream: str):
+        super().__init__(f"'{node}' was cancelled because '{upstream}' failed")
+        self.node = node
+        self.upstream = upstream
+
+
+class AnalysisDAG:
+    """Executes analysis nodes as soon as their inputs are ready."""
+
+    def __init__(self, nodes: list, sources: tuple):
+        self.nodes = {node.name: node for node in nodes}
+        self.sources = tuple(sources)
+        if len(self.nodes) != len(nodes):
+            raise ValueError("Analysis node names must be unique.")
+        self.dependents = {name: [] for name in self.nodes}
+        for node in nodes:
+            for dependency in node.inputs:
+                if dependency in self.nodes:
+                    self.dependents[dependency].append(node.name)
+                elif dependency not in self.sources:
+                    raise ValueError(f"Node '{node.name}' depends on unknown input '{dependency}'.")
+            if not set(node.required) <= set(node.inputs):
+                raise ValueError(f"Node '{node.name}' requires inputs it does not declare.")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> list:
+        remaining = {name: {d for d in node.inputs if d in self.nodes} for name, node in self.nodes.items()}
+        order = []
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Analysis DAG has a cycle between: {', '.join(sorted(remaining))}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    def fallback(self, name: str):
+        return copy.deepcopy(self.nodes[name].fallback)
+
+    def descendants(self, name: str) -> set:
+        found, stack = set(), list(self.dependents[name])
+        while stack:
+            child = stack.pop()
+            if child not in found:
+                found.add(child)
+                stack.extend(self.dependents[child])
+        return found
+
+    async def run(self, sources: dict, on_complete: Optional[Callable[[str, Any, Optional[BaseException]], Any]] = None,
+                  completed: Optional[dict] = None, around: Optional[Callable[..., Awaitable[Any]]] = None) -> dict:
+        """
+        Runs every node and returns {node name: result}.
+        Source values may be plain values or awaitables that resolve later (e.g. sections that are
+        still being extracted). `on_complete(name, result, error)` is called as each node settles.
+        Nodes in `completed` ({node name: result}, e.g. from an interrupted run) are not run again;
+        their stored result is used, also as input to their dependents. `around(name, run, args)`,
+        when given, is awaited instead of `run(*args)` for every node that runs (e.g. to reuse results).
+        """
+        completed = completed or {}
+        missing = set(self.sources) - set(sources)
+        if missing:
+            raise ValueError(f"Missing analysis inputs: {', '.join(sorted(missing))}")
+
+        values = {}
+        for name in self.sources:
+            value = sources[name]
+            if inspect.isawaitable(value):
+                values[name] = asyncio.ensure_future(value)
+            else:
+                future = asyncio.get_running_loop().create_future()
+                future.set_result(value)
+                values[name] = future
+
+        tasks = {}
+        errors = {}
+
+        async def run_node(node: AnalysisNode):
+            args = []
+            for dependency in node.inputs:
+                try:
+                    args.append(await values[dependency])
+                except asyncio.CancelledError:
+                    if dependency in errors:
+                        raise UpstreamFailed(node.name, dependency)
+                    raise
+                except Exception:
+                    raise UpstreamFailed(node.name, dependency)
+            for dependency in node.required:
+                if not args[node.inputs.index(dependency)]:
+                    return self.fallback(node.name)
+            if around is not None:
+                return await around(node.name, node.run, tuple(args))
+            return await node.run(*args)
+
+        def settle(name: str, task: asyncio.Task):
+            if task.cancelled():
+                error = errors.get(name) or asyncio.CancelledError()
+                result = self.fallback(name)
+            elif task.exception() is not None:
+                error = task.exception()
+                result = self.fallback(name)
+                print(f"--- ERROR in analysis node '{name}': {error}")
+                for child in self.descendants(name):
+                    if child in tasks:
+                        errors.setdefault(child, UpstreamFailed(child, name))
+                        tasks[child].cancel()
+            else:
+                error, result = None, task.result()
+            if on_complete is not None:
+                on_complete(name, result, error)
+
+        for name in self.order:
+            if name in completed:
+                values[name] = asyncio.get_running_loop().create_future()
+                values[name].set_result(completed[name])
+                continue
+            tasks[name] = asyncio.create_task(run_node(self.nodes[name]), name=f"analysis:{name}")
+            values[name] = tasks[name]
+            tasks[name].add_done_callback(lambda task, name=name: settle(name, task))
+
+        try:
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+        results = {name: completed[name] for name in self.order if name in completed}
+        for name, task in tasks.items():
+            if task.cancelled() or task.exception() is not None:
+                results[name] = self.fallback(name)
+            else:
+                results[name] = task.result()
+        return results
@@ -0,0 +1,48 @@
+"""
+Bulk backfill from the command line: analyzes every filing of a directory or manifest with the
+same pipeline as the service and appends the results to a JSON Lines file. Re-running the same
+command after an interruption skips the tasks already in the file.
+
+    python backfill.py filings/AAPL --ticker AAPL --output aapl.jsonl
+    python backfill.py manifest.jsonl --output backfill.jsonl --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+
+import main
+from pdf_extract import shutdown_pool, warm_up_pool
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Analyze a directory or manifest of 10-K/10-Q PDFs.")
+    parser.add_argument("source", help="directory of PDFs, or a manifest (JSON Lines with path/ticker, or one path per line)")
+    parser.add_argument("--output", required=True, help="JSON Lines file to append results to and resume from")
+    parser.add_argument("--ticker", default=None, help="ticker for documents the manifest does not tag")
+    parser.add_argument("--concurrency", type=int, default=main.BATCH_CONCURRENCY,
+                        help="documents analyzed at the same time (LLM calls share one rate-limited queue)")
+    return parser.parse_args(argv)
+
+
+async def backfill(args: argparse.Namespace) -> int:
+    """Runs the batch; returns the number of documents that failed."""
+    documents = main.load_documents(args.source, args.ticker)
+    print(f"--- Backfill: {len(documents)} filings from {args.source} ---")
+    await warm_up_pool()
+    failed = 0
+    try:
+        async for line in main.batch_lines(documents, args.output, args.concurrency):
+            record = json.loads(line)
+            if record["type"] != "document":
+                continue
+            failed += record["status"] == "failed"
+            print(f"--- Backfill: {record['status']} {record['document']} ({record['seconds']}s)"
+                  + (f": {record['error']}" if record["error"] else "") + " ---")
+    finally:
+        shutdown_pool()
+    print(f"--- Backfill complete: {failed} failed; scheduler {json.dumps(main.scheduler.stats())} ---")
+    return failed
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if asyncio.run(backfill(parse_args())) else 0)
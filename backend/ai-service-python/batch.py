@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class BatchDocument:
+    path: str
+    ticker: str = None
+
+
+def contained_path(root: str, path: str) -> str:
+    """`path` resolved against `root` (itself resolved), symlinks included; ValueError if it leads outside `root`."""
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([resolved, root]) != root:
+        raise ValueError(f"'{path}' is outside the batch directory.")
+    return resolved
+
+
+def load_documents(source: str, ticker: str = None, root: str = None) -> list:
+    """
+    The filings of a backfill run. `source` is either a directory (every PDF below it, in path
+    order) or a manifest: JSON Lines of {"path", "ticker"} objects, or one path per line.
+    Relative manifest paths are resolved against the manifest's directory. `ticker` applies to
+    documents that do not name their own. With `root` (a resolved directory), every document
+    must lie below it, or ValueError is raised.
+    """
+    if os.path.isdir(source):
+        paths = sorted(
+            os.path.join(directory, name)
+            for directory, _dirs, names in os.walk(source)
+            for name in names if name.lower().endswith(".pdf")
+        )
+        if root is not None:
+            # A symlink below the directory may still point elsewhere.
+            paths = [contained_path(root, path) for path in paths]
+        return [BatchDocument(path, ticker) for path in paths]
+
+    base = os.path.dirname(os.path.abspath(source))
+    documents = []
+    with open(source, encoding="utf-8") as manifest:
+        for number, line in enumerate(manifest, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    raise ValueError(f"Line {number} of the manifest is not valid JSON.")
+                if not entry.get("path"):
+                    raise ValueError(f"Line {number} of the manifest has no path.")
+                path, document_ticker = entry["path"], entry.get("ticker") or ticker
+            else:
+                path, document_ticker = line, ticker
+            path = os.path.join(base, path)
+            if root is not None:
+                try:
+                    path = contained_path(root, path)
+                except ValueError:
+                    raise ValueError(f"Line {number} of the manifest points outside the batch directory.")
+            documents.append(BatchDocument(path, document_ticker))
+    return documents
+
+
+def file_sha256(path: str) -> str:
+    """Same digest `spool_upload` computes, so batch results share the per-document cache."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as pdf:
+        for chunk in iter(lambda: pdf.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_completed(output_path: str) -> dict:
+    """
+    {pdf hash: {task: result}} of the tasks that succeeded in an earlier run writing to
+    `output_path`. A missing file or a truncated last line (an interrupted write) is ignored.
+    """
+    completed = {}
+    if not output_path or not os.path.exists(output_path):
+        return completed
+    with open(output_path, encoding="utf-8") as output:
+        for line in output:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("type") == "task" and record.get("error") is None and record.get("pdf_hash"):
+                completed.setdefault(record["pdf_hash"], {})[record["task"]] = record["result"]
+    return completed
+
+
+async def run_batch(documents: list, run_document, concurrency: int):
+    """
+    Runs `run_document(document, emit)` for every document, at most `concurrency` at a time,
+    and yields each record passed to `emit` as soon as it is emitted.
+    """
+    queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(document: BatchDocument):
+        async with slots:
+            await run_document(document, queue.put_nowait)
+
+    tasks = [asyncio.create_task(run_one(document)) for document in documents]
+    finished = asyncio.gather(*tasks, return_exceptions=True)
+    finished.add_done_callback(lambda _future: queue.put_nowait(None))
+    try:
+        while True:
+            record = await queue.get()
+            if record is None:
+                break
+            yield record
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,43 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.conftest import CONCURRENCY_LEVELS, FORMS, PAGE_COUNTS, record_rate
+
+REPORT_FIELDS = ("key_metrics", "management_tone", "risk_summary", "financial_ratios", "raw_risk_factors")
+
+
+def upload(service, path: str):
+    with open(path, "rb") as pdf:
+        response = service.post("/analyze", files={"file": ("filing.pdf", pdf, "application/pdf")})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.mark.parametrize("pages", PAGE_COUNTS)
+@pytest.mark.parametrize("form", FORMS)
+def bench_analyze_latency(benchmark, filing_pdf, service, fake_llm, form, pages):
+    path = filing_pdf(form, pages)
+    calls_before = fake_llm.calls
+    report = benchmark.pedantic(upload, args=(service, path), rounds=3, iterations=1)
+    for field in REPORT_FIELDS:
+        assert field in report
+    assert report["raw_risk_factors"]
+    benchmark.extra_info["llm_calls_per_upload"] = (fake_llm.calls - calls_before) / 3
+
+
+@pytest.mark.parametrize("uploads", CONCURRENCY_LEVELS)
+def bench_concurrent_throughput(benchmark, filing_pdf, service, uploads):
+    path = filing_pdf("10-K", min(PAGE_COUNTS))
+
+    def run():
+        with ThreadPoolExecutor(max_workers=uploads) as pool:
+            return list(pool.map(lambda _: upload(service, path), range(uploads)))
+
+    started = time.perf_counter()
+    reports = benchmark.pedantic(run, rounds=2, iterations=1)
+    assert len(reports) == uploads
+    benchmark.extra_info["uploads"] = uploads
+    record_rate(benchmark, "uploads_per_minute", uploads, per_seconds=60)
+    benchmark.extra_info["wall_seconds"] = round(time.perf_counter() - started, 2)
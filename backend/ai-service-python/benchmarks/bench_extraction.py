@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from benchmarks.conftest import FORMS, PAGE_COUNTS, record_rate
+from filing_artifacts import FilingArtifact, write_artifact
+from filing_index import StreamingFilingIndex
+from pdf_extract import iter_pages, shutdown_pool, warm_up_pool
+
+
+@pytest.fixture(scope="module", autouse=True)
+def pdf_pool():
+    # Worker start-up is paid once, as in the service, and not counted in any round.
+    asyncio.run(warm_up_pool())
+    yield
+    shutdown_pool()
+
+
+async def read_pages(path: str) -> list:
+    return [text async for text in iter_pages(path)]
+
+
+@pytest.mark.parametrize("pages", PAGE_COUNTS)
+@pytest.mark.parametrize("form", FORMS)
+def bench_extract_pages(benchmark, filing_pdf, form, pages):
+    path = filing_pdf(form, pages)
+    result = benchmark(lambda: asyncio.run(read_pages(path)))
+    assert len(result) == pages
+    record_rate(benchmark, "pages_per_second", pages)
+
+
+@pytest.mark.parametrize("pages", PAGE_COUNTS)
+@pytest.mark.parametrize("form", FORMS)
+def bench_artifact_load(benchmark, filing_pdf, tmp_path, form, pages):
+    """Reading a stored filing back, which replaces extraction for a PDF analyzed before."""
+    texts = asyncio.run(read_pages(filing_pdf(form, pages)))
+    index = StreamingFilingIndex()
+    for text in texts:
+        index.add_page(text)
+    path = str(tmp_path / "filing.artifact")
+    write_artifact(path, texts, index.raw_headings, index.finish())
+
+    def load():
+        with FilingArtifact(path) as artifact:
+            return artifact.pages()
+    assert benchmark(load) == texts
+    record_rate(benchmark, "pages_per_second", pages)
+    benchmark.extra_info["compression_ratio"] = round(sum(len(text.encode("utf-8")) for text in texts)
+                                                      / (tmp_path / "filing.artifact").stat().st_size, 2)
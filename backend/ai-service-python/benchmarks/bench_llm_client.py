@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmarks import fake_genai
+from llm_client import LLMClient, percentile
+from llm_scheduler import LLMScheduler
+
+CALLS = 200
+# Calls in flight at once; below the scheduler's concurrency, so hedges are not held back by a queue.
+CALLERS = 8
+
+
+@pytest.mark.parametrize("hedge_percentile", [0, 90])
+def bench_llm_client_tail_latency(benchmark, hedge_percentile):
+    """Call latency with a 5% slow tail, without and with hedged requests; no call may fail."""
+
+    def run():
+        fake_genai.install(fake_genai.FakeLLMConfig(latency=0.02, jitter=0.005, slow_probability=0.05,
+                                                    slow_latency=0.5))
+        scheduler = LLMScheduler(requests_per_minute=60000, tokens_per_minute=10 ** 9, max_concurrency=16)
+        client = LLMClient(scheduler, provider=fake_genai.provider, hedge_percentile=hedge_percentile,
+                           hedge_min_samples=20)
+        latencies = []
+
+        async def caller(count: int):
+            for _ in range(count):
+                started = time.perf_counter()
+                await client.generate(["Analyze the tone", "text " * 200], "tone")
+                latencies.append(time.perf_counter() - started)
+
+        async def calls():
+            await asyncio.gather(*(caller(CALLS // CALLERS) for _ in range(CALLERS)))
+        asyncio.run(calls())
+        return latencies, client.stats(), scheduler.stats()
+
+    latencies, client_stats, scheduler_stats = benchmark.pedantic(run, rounds=2, iterations=1)
+    assert scheduler_stats["failed"] == 0
+    assert len(latencies) == CALLS
+    benchmark.extra_info["p50_seconds"] = round(percentile(latencies, 0.5), 3)
+    benchmark.extra_info["p99_seconds"] = round(percentile(latencies, 0.99), 3)
+    benchmark.extra_info["hedges"] = client_stats["hedge"]
+    benchmark.extra_info["hedges_won"] = client_stats["hedge_won"]
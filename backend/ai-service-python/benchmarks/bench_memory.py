@@ -0,0 +1,46 @@
+import asyncio
+import os
+
+import pytest
+
+from benchmarks.conftest import PAGE_COUNTS
+from pdf_extract import iter_pages
+
+# Optional ceiling, so a CI run fails when a change makes memory grow past it.
+MAX_RSS_MB = float(os.getenv("BENCH_MAX_RSS_MB", "0"))
+
+
+def record(benchmark, rss):
+    benchmark.extra_info["peak_rss_mb"] = round(rss.peak_mb, 1)
+    benchmark.extra_info["rss_growth_mb"] = round(rss.growth_mb, 1)
+    print(f"--- Peak RSS {rss.peak_mb:.1f} MB (+{rss.growth_mb:.1f} MB) ---")
+    if MAX_RSS_MB:
+        assert rss.peak_mb <= MAX_RSS_MB
+
+
+def bench_peak_rss_extraction(benchmark, filing_pdf, peak_rss):
+    path = filing_pdf("10-K", max(PAGE_COUNTS))
+
+    async def extract():
+        # Pages are dropped as they arrive, so the peak is what the in-flight page ranges hold.
+        async for _text in iter_pages(path):
+            pass
+
+    def run():
+        with peak_rss() as rss:
+            asyncio.run(extract())
+        return rss
+
+    record(benchmark, benchmark.pedantic(run, rounds=1, iterations=1))
+
+
+def bench_peak_rss_end_to_end(benchmark, filing_pdf, service, peak_rss):
+    path = filing_pdf("10-K", max(PAGE_COUNTS))
+
+    def run():
+        with peak_rss() as rss, open(path, "rb") as pdf:
+            response = service.post("/analyze", files={"file": ("filing.pdf", pdf, "application/pdf")})
+        assert response.status_code == 200, response.text
+        return rss
+
+    record(benchmark, benchmark.pedantic(run, rounds=1, iterations=1))
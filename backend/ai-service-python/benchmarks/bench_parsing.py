@@ -0,0 +1,82 @@
+import random
+
+import fitz  # PyMuPDF
+import pytest
+
+from benchmarks.conftest import FORMS, PAGE_COUNTS
+from filing_index import FilingIndex, StreamingFilingIndex
+from risk_diff import diff_paragraphs
+from statement_tables import extract_statement_tables
+
+# (item, part) of the sections every parse must find.
+EXPECTED_SECTIONS = {"10-K": [("1A", None), ("7", None), ("8", None)],
+                     "10-Q": [("1", "I"), ("2", "I"), ("1A", "II")]}
+
+
+def page_texts(path: str) -> list:
+    with fitz.open(path) as doc:
+        return [page.get_text() for page in doc]
+
+
+@pytest.mark.parametrize("pages", PAGE_COUNTS)
+@pytest.mark.parametrize("form", FORMS)
+def bench_filing_index(benchmark, filing_pdf, form, pages):
+    text = "".join(page_texts(filing_pdf(form, pages)))
+    index = benchmark(FilingIndex, text)
+    assert index.form_type == form
+    for item, part in EXPECTED_SECTIONS[form]:
+        assert index.span(item, part) is not None, f"Item {item} not found"
+
+
+@pytest.mark.parametrize("pages", PAGE_COUNTS)
+@pytest.mark.parametrize("form", FORMS)
+def bench_streaming_filing_index(benchmark, filing_pdf, form, pages):
+    texts = page_texts(filing_pdf(form, pages))
+
+    def ingest():
+        index = StreamingFilingIndex()
+        for text in texts:
+            index.add_page(text)
+        return index.finish()
+
+    index = benchmark(ingest)
+    for item, part in EXPECTED_SECTIONS[form]:
+        assert index.span(item, part) is not None, f"Item {item} not found"
+
+
+@pytest.mark.parametrize("pages", PAGE_COUNTS)
+def bench_risk_factor_diff(benchmark, filing_pdf, pages):
+    index = StreamingFilingIndex()
+    for text in page_texts(filing_pdf("10-K", pages)):
+        index.add_page(text)
+    index.finish()
+    previous = index.prepared.section("1A").text
+    paragraphs = previous.split("\n\n")
+    # About 5% of the paragraphs change between the two versions.
+    rng = random.Random(0)
+    for number in rng.sample(range(len(paragraphs)), max(1, len(paragraphs) // 20)):
+        paragraphs[number] = paragraphs[number].replace("could", "would", 1) + " This risk has increased."
+    current = "\n\n".join(paragraphs)
+
+    result = benchmark(diff_paragraphs, previous, current)
+    assert result["summary"]["modified"] + result["summary"]["added"] > 0
+    benchmark.extra_info["reduction"] = result["summary"]["reduction"]
+
+
+def _number(value: str) -> int:
+    return int(value.strip("()").replace(",", ""))
+
+
+@pytest.mark.parametrize("form", FORMS)
+def bench_statement_tables(benchmark, filing_pdf, form):
+    path = filing_pdf(form, PAGE_COUNTS[0])
+    texts = page_texts(path)
+    start = next(number for number, text in enumerate(texts) if "CONSOLIDATED STATEMENTS OF OPERATIONS" in text)
+    tables = benchmark(extract_statement_tables, path, start, len(texts))
+    income = tables["income_statement"]
+    assert income["confidence"] >= 0.8 and income["periods"] == [2024, 2023]
+    # The 10-Q has "Three Months 2024 | 2023 | Nine Months 2024 | 2023": the prior period is the
+    # three-month 2023 column (within 20% of the current figure), never the nine-month 2024 one (about 3x).
+    for row in income["rows"]:
+        ratio = _number(row["previous_period"]) / _number(row["current_period"])
+        assert 0.75 <= ratio <= 1.15, row
@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+from benchmarks import fake_genai
+from llm_scheduler import LLMScheduler
+
+CALLS = 200
+
+
+@pytest.mark.parametrize("rate_limit_probability", [0.0, 0.1])
+def bench_scheduler_throughput(benchmark, rate_limit_probability):
+    """Scheduler overhead and 429 recovery with a fast fake model; no call may fail for good."""
+
+    def run():
+        stats = fake_genai.install(fake_genai.FakeLLMConfig(latency=0.01, jitter=0.005,
+                                                           rate_limit_probability=rate_limit_probability))
+        scheduler = LLMScheduler(requests_per_minute=60000, tokens_per_minute=10 ** 9,
+                                 max_concurrency=8, base_backoff=0.05)
+        model = fake_genai.FakeGenerativeModel("gemini-1.5-pro-latest")
+
+        async def burst():
+            await asyncio.gather(*(scheduler.generate(model, ["Analyze the tone", "text " * 200], f"call{n}")
+                                   for n in range(CALLS)))
+        asyncio.run(burst())
+        return scheduler.stats(), stats
+
+    scheduler_stats, model_stats = benchmark.pedantic(run, rounds=3, iterations=1)
+    assert scheduler_stats["completed"] == CALLS
+    assert scheduler_stats["failed"] == 0
+    benchmark.extra_info["rate_limited"] = model_stats.rate_limited
+    benchmark.extra_info["average_wait_seconds"] = scheduler_stats["average_wait_seconds"]
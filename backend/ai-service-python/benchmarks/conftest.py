@@ -0,0 +1,124 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import psutil
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+# The service reads its configuration at import time, so it is set up before main is imported.
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+os.environ.setdefault("AI_SERVICE_DATA_DIR", tempfile.mkdtemp(prefix="ai-service-bench-"))
+os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "100000")
+os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "1000000000")
+
+from benchmarks import fake_genai  # noqa: E402
+from benchmarks.synthetic_filings import make_filing  # noqa: E402
+
+PAGE_COUNTS = [int(pages) for pages in os.getenv("BENCH_PAGES", "50,500").split(",")]
+CONCURRENCY_LEVELS = [int(level) for level in os.getenv("BENCH_CONCURRENCY", "1,4,8").split(",")]
+FORMS = ["10-K", "10-Q"]
+
+
+def fake_llm_config() -> fake_genai.FakeLLMConfig:
+    return fake_genai.FakeLLMConfig(
+        latency=float(os.getenv("BENCH_LLM_LATENCY", "0.2")),
+        jitter=float(os.getenv("BENCH_LLM_JITTER", "0.05")),
+        rate_limit_probability=float(os.getenv("BENCH_LLM_RATE_LIMIT", "0.0")),
+    )
+
+
+def record_rate(benchmark, name: str, count: float, per_seconds: float = 1.0):
+    """
+    Records `count` per `per_seconds` of the mean round as extra info. Skipped under
+    --benchmark-disable, where every function runs once as a plain test and no stats are kept.
+    """
+    if benchmark.stats is not None:
+        benchmark.extra_info[name] = round(count / benchmark.stats["mean"] * per_seconds, 1)
+
+
+@pytest.fixture(scope="session")
+def filing_pdf(tmp_path_factory):
+    """Factory for synthetic filings, generated once per (form, pages) for the whole session."""
+    directory = tmp_path_factory.mktemp("filings")
+    made = {}
+
+    def get(form: str = "10-K", pages: int = 50) -> str:
+        if (form, pages) not in made:
+            made[form, pages] = make_filing(str(directory / f"{form}-{pages}.pdf"), form, pages)
+        return made[form, pages]
+    return get
+
+
+@pytest.fixture(scope="session")
+def fake_llm():
+    return fake_genai.install(fake_llm_config())
+
+
+@pytest.fixture(scope="session")
+def service(fake_llm):
+    """
+    The FastAPI app with its lifespan running, behind a TestClient. The result cache and the
+    filing artifact store are bypassed so every round pays for the full pipeline.
+    """
+    from fastapi.testclient import TestClient
+    import main
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(main.result_cache, "lookup", lambda task, model_name, contents: None)
+        patch.setattr(main.artifact_store, "open", lambda pdf_hash: None)
+        with TestClient(main.app) as client:
+            yield client
+
+
+class PeakRSS:
+    """Samples the resident memory of this process plus its children (the PDF workers) in a thread."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _current(self) -> int:
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._current())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.baseline = self._current()
+        self.peak = self.baseline
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._current())
+
+    @property
+    def peak_mb(self) -> float:
+        return self.peak / (1024 * 1024)
+
+    @property
+    def growth_mb(self) -> float:
+        return (self.peak - self.baseline) / (1024 * 1024)
+
+
+@pytest.fixture
+def peak_rss():
+    return PeakRSS
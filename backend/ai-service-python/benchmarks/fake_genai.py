@@ -0,0 +1,133 @@
+import asyncio
+import json
+import random
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+
+import google.generativeai as genai
+
+from fused_analysis import SECTION_MARKER
+
+# Canned answers, picked by a phrase that only appears in the matching task's prompt.
+CANNED_RESPONSES = [
+    ("extract the exact values for", {"revenue": "$1,175 million", "netIncome": "$131 million", "eps": "1.31"}),
+    ("Analyze the tone", {"summary": "Management is measured but confident.", "cautiousness_score": 5}),
+    ("top 3 most significant", {"top_risks": ["Supply chain concentration.", "Foreign currency exposure.",
+                                              "Cybersecurity incidents."]}),
+    ("competing companies", {"competitors": [{"name": "Globex", "context": "Competes on price in core markets."}]}),
+    ("Legal Proceedings", {"legal_summary": ["Patent suit brought by a former supplier is pending."]}),
+    ("forward-looking statements", {"guidance": [{"statement": "We expect net sales to grow between 4% and 6%",
+                                                  "sentiment": "Positive"}]}),
+    ("financial data extraction", {
+        "income_statement": [
+            {"item": "Total net sales", "current_period": "1,175", "previous_period": "1,050"},
+            {"item": "Cost of sales", "current_period": "(705)", "previous_period": "(651)"},
+            {"item": "Operating income", "current_period": "188", "previous_period": "160"},
+            {"item": "Net income", "current_period": "131", "previous_period": "112"},
+        ],
+        "balance_sheet": [
+            {"item": "Total current assets", "current_period": "820", "previous_period": "760"},
+            {"item": "Total assets", "current_period": "2,400", "previous_period": "2,210"},
+            {"item": "Total current liabilities", "current_period": "410", "previous_period": "395"},
+            {"item": "Total liabilities", "current_period": "1,300", "previous_period": "1,240"},
+            {"item": "Total shareholders' equity", "current_period": "1,100", "previous_period": "970"},
+        ],
+        "cash_flow_statement": [
+            {"item": "Net cash provided by operating activities", "current_period": "240", "previous_period": "205"},
+            {"item": "Purchases of property and equipment", "current_period": "(61)", "previous_period": "(55)"},
+        ],
+    }),
+    ("forensic accountant", {"red_flags": [], "governance_changes": ["Chief Financial Officer retired."]}),
+    ("credit and ESG", {"debt_details": {"debt_schedule": [{"year": "2026", "principal_due": "$250 million"}],
+                                        "covenants": []},
+                        "esg_analysis": {"esg_mentions": []}}),
+    ("senior auditor", {"footnote_summary": [{"topic": "Note 1 - Summary", "summary": "Standard policies."}]}),
+]
+
+
+class ResourceExhausted(Exception):
+    """Stand-in for the 429 error raised by the real client."""
+    code = 429
+
+
+@dataclass
+class FakeLLMConfig:
+    latency: float = 0.2
+    jitter: float = 0.05
+    rate_limit_probability: float = 0.0
+    # A share of calls that take `slow_latency` instead: the tail that hedged requests cut off.
+    slow_probability: float = 0.0
+    slow_latency: float = 2.0
+    seed: int = 0
+
+
+@dataclass
+class FakeLLMStats:
+    calls: int = 0
+    rate_limited: int = 0
+    prompt_chars: int = 0
+    by_task: dict = field(default_factory=dict)
+
+
+def canned_response(prompt: str) -> tuple:
+    for marker, payload in CANNED_RESPONSES:
+        if marker in prompt:
+            return marker, payload
+    return "other", {}
+
+
+def fused_response(prompt: str) -> dict:
+    """Answers a fused prompt with the canned answer of each sub-analysis, under its result key."""
+    answer = {}
+    for block in prompt.split(SECTION_MARKER)[1:]:
+        name, _newline, instructions = block.strip().partition("\n")
+        answer[name.strip()] = canned_response(instructions)[1]
+    return answer
+
+
+class FakeGenerativeModel:
+    """
+    Drop-in for genai.GenerativeModel: answers with canned JSON after a configurable delay,
+    and raises a 429-style error for a configurable share of calls.
+    """
+    config = FakeLLMConfig()
+    stats = FakeLLMStats()
+    _random = random.Random(0)
+
+    def __init__(self, model_name: str, generation_config=None, safety_settings=None, **kwargs):
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+
+    async def generate_content_async(self, contents, **kwargs):
+        parts = [contents] if isinstance(contents, str) else list(contents)
+        prompt = parts[0] if parts else ""
+        task, payload = ("fused", fused_response(prompt)) if SECTION_MARKER in prompt else canned_response(prompt)
+        cls = type(self)
+        cls.stats.calls += 1
+        cls.stats.by_task[task] = cls.stats.by_task.get(task, 0) + 1
+        cls.stats.prompt_chars += sum(len(part) for part in parts if isinstance(part, str))
+        latency = cls.config.latency + cls._random.uniform(-cls.config.jitter, cls.config.jitter)
+        if cls._random.random() < cls.config.slow_probability:
+            latency = cls.config.slow_latency
+        await asyncio.sleep(max(0.0, latency))
+        if cls._random.random() < cls.config.rate_limit_probability:
+            cls.stats.rate_limited += 1
+            raise ResourceExhausted("429 Resource has been exhausted (e.g. check quota).")
+        text = json.dumps(payload)
+        prompt_tokens = sum(len(part) for part in parts if isinstance(part, str)) // 4
+        usage = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=len(text) // 4,
+                                total_token_count=prompt_tokens + len(text) // 4)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+def provider(model_name: str, generation_config: dict = None) -> FakeGenerativeModel:
+    """LLM client provider for the fake (LLM_PROVIDER=benchmarks.fake_genai:provider)."""
+    return FakeGenerativeModel(model_name, generation_config)
+
+
+def install(config: FakeLLMConfig = None) -> FakeLLMStats:
+    """Replaces genai.GenerativeModel with the fake; returns the (reset) call statistics."""
+    FakeGenerativeModel.config = config or FakeLLMConfig()
+    FakeGenerativeModel.stats = FakeLLMStats()
+    FakeGenerativeModel._random = random.Random(FakeGenerativeModel.config.seed)
+    genai.GenerativeModel = FakeGenerativeModel
+    return FakeGenerativeModel.stats
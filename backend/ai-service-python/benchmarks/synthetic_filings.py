@@ -0,0 +1,277 @@
+"""
+Generates synthetic 10-K and 10-Q PDFs with the real Part / Item layout (cover, table of
+contents, "Item 1A. Risk Factors", "Item 7. Management's Discussion...", "Item 8. Financial
+Statements...", statement tables and notes), for benchmarking without real filings.
+
+    python -m benchmarks.synthetic_filings out.pdf --form 10-Q --pages 200
+"""
+import argparse
+import random
+
+import fitz  # PyMuPDF
+
+LINES_PER_PAGE = 58
+CHARS_PER_LINE = 105
+
+# (part, item, title, share of the pages, kind of filler text)
+LAYOUTS = {
+    "10-K": [
+        ("I", "1", "Business", 8, "business"),
+        ("I", "1A", "Risk Factors", 15, "risk"),
+        ("I", "1B", "Unresolved Staff Comments", 0.2, "short"),
+        ("I", "1C", "Cybersecurity", 0.5, "risk"),
+        ("I", "2", "Properties", 0.5, "business"),
+        ("I", "3", "Legal Proceedings", 1, "legal"),
+        ("I", "4", "Mine Safety Disclosures", 0.2, "short"),
+        ("II", "5", "Market for Registrant's Common Equity, Related Stockholder Matters and Issuer Purchases of Equity Securities", 1, "business"),
+        ("II", "6", "[Reserved]", 0.2, "short"),
+        ("II", "7", "Management's Discussion and Analysis of Financial Condition and Results of Operations", 15, "mda"),
+        ("II", "7A", "Quantitative and Qualitative Disclosures About Market Risk", 1, "mda"),
+        ("II", "8", "Financial Statements and Supplementary Data", 30, "statements"),
+        ("II", "9", "Changes in and Disagreements with Accountants on Accounting and Financial Disclosure", 0.2, "short"),
+        ("II", "9A", "Controls and Procedures", 1, "business"),
+        ("II", "9B", "Other Information", 0.3, "governance"),
+        ("III", "10", "Directors, Executive Officers and Corporate Governance", 0.5, "governance"),
+        ("III", "11", "Executive Compensation", 0.3, "governance"),
+        ("III", "12", "Security Ownership of Certain Beneficial Owners and Management", 0.3, "short"),
+        ("III", "13", "Certain Relationships and Related Transactions, and Director Independence", 0.3, "short"),
+        ("III", "14", "Principal Accountant Fees and Services", 0.3, "short"),
+        ("IV", "15", "Exhibit and Financial Statement Schedules", 2, "short"),
+        ("IV", "16", "Form 10-K Summary", 0.1, "short"),
+    ],
+    "10-Q": [
+        ("I", "1", "Financial Statements", 30, "statements"),
+        ("I", "2", "Management's Discussion and Analysis of Financial Condition and Results of Operations", 20, "mda"),
+        ("I", "3", "Quantitative and Qualitative Disclosures About Market Risk", 1, "mda"),
+        ("I", "4", "Controls and Procedures", 1, "business"),
+        ("II", "1", "Legal Proceedings", 1, "legal"),
+        ("II", "1A", "Risk Factors", 5, "risk"),
+        ("II", "2", "Unregistered Sales of Equity Securities and Use of Proceeds", 1, "business"),
+        ("II", "3", "Defaults Upon Senior Securities", 0.2, "short"),
+        ("II", "4", "Mine Safety Disclosures", 0.2, "short"),
+        ("II", "5", "Other Information", 0.5, "governance"),
+        ("II", "6", "Exhibits", 1, "short"),
+    ],
+}
+
+PART_TITLES = {"I": "FINANCIAL INFORMATION", "II": "OTHER INFORMATION", "III": "", "IV": ""}
+
+SUBJECTS = ["supply chain", "foreign currency", "interest rates", "cybersecurity", "data privacy",
+            "government regulation", "intense competition", "macroeconomic conditions", "key suppliers",
+            "component shortages", "tariffs", "climate change", "talent retention", "intellectual property",
+            "tax legislation", "product defects", "credit markets", "customer concentration"]
+VERBS = ["could adversely affect", "may disrupt", "has increased", "may reduce", "could materially harm",
+         "continues to pressure", "may limit", "could delay"]
+OBJECTS = ["our operating results", "demand for our products", "gross margin", "our liquidity",
+           "our reputation", "the timing of shipments", "our cost structure", "our ability to raise capital"]
+STATEMENT_ROWS = {
+    "CONSOLIDATED STATEMENTS OF OPERATIONS": ["Total net sales", "Cost of sales", "Gross margin",
+                                              "Research and development", "Selling, general and administrative",
+                                              "Operating income", "Other income/(expense), net",
+                                              "Income before provision for income taxes",
+                                              "Provision for income taxes", "Net income"],
+    "CONSOLIDATED BALANCE SHEETS": ["Cash and cash equivalents", "Accounts receivable, net", "Inventories",
+                                    "Total current assets", "Property, plant and equipment, net", "Total assets",
+                                    "Accounts payable", "Total current liabilities", "Term debt",
+                                    "Total liabilities", "Total shareholders' equity"],
+    "CONSOLIDATED STATEMENTS OF CASH FLOWS": ["Net income", "Depreciation and amortization",
+                                             "Cash generated by operating activities",
+                                             "Payments for acquisition of property, plant and equipment",
+                                             "Cash used in investing activities", "Repayments of term debt",
+                                             "Cash used in financing activities"],
+}
+# Rows shown in parentheses (cash outflows), and the right edges of the two period columns.
+NEGATIVE_ROWS = {"Payments for acquisition of property, plant and equipment", "Cash used in investing activities",
+                 "Repayments of term debt", "Cash used in financing activities"}
+PERIOD_COLUMNS = (440, 540)
+# A 10-Q income statement has two period groups: "Three Months Ended 2024 | 2023 | Nine Months Ended 2024 | 2023".
+QUARTER_GROUPS = ("Three Months Ended", "Nine Months Ended")
+QUARTER_COLUMNS = (360, 420, 500, 560)
+FONT_SIZE = 8
+LINE_HEIGHT = 11
+NOTE_TITLES = ["Summary of Significant Accounting Policies", "Revenue", "Earnings Per Share",
+               "Financial Instruments", "Property, Plant and Equipment", "Income Taxes", "Leases", "Debt",
+               "Shareholders' Equity", "Commitments and Contingencies", "Segment Information"]
+
+
+def _sentence(rng: random.Random, kind: str) -> str:
+    subject, verb, obj = rng.choice(SUBJECTS), rng.choice(VERBS), rng.choice(OBJECTS)
+    if kind == "mda":
+        change = rng.randint(1, 25)
+        return (f"Net sales of our {rng.choice(['Products', 'Services', 'Wearables', 'Software'])} segment "
+                f"{rng.choice(['increased', 'decreased'])} {change}% compared to the prior period, "
+                f"primarily due to {subject}. We expect {subject} to {rng.choice(['continue', 'moderate'])} next year.")
+    if kind == "legal":
+        return f"The Company is defending a lawsuit alleging that {subject} {verb} {obj}; the outcome is uncertain."
+    if kind == "governance":
+        return (f"On {rng.choice(['March', 'June', 'September'])} {rng.randint(1, 28)}, the Board "
+                f"{rng.choice(['appointed', 'accepted the resignation of'])} a {rng.choice(['director', 'Chief Financial Officer'])}.")
+    return f"Changes in {subject} {verb} {obj}, and the effect may be significant."
+
+
+def _wrap(paragraph: str) -> list:
+    lines, current = [], ""
+    for word in paragraph.split():
+        if len(current) + len(word) + 1 > CHARS_PER_LINE:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}".strip()
+    if current:
+        lines.append(current)
+    return lines
+
+
+def _prose(rng: random.Random, kind: str, line_count: int) -> list:
+    lines = []
+    while len(lines) < line_count:
+        if kind == "risk":
+            lines.append(f"Our business is exposed to risks related to {rng.choice(SUBJECTS)}.")
+        paragraph = " ".join(_sentence(rng, kind) for _ in range(rng.randint(3, 7)))
+        lines.extend(_wrap(paragraph))
+        lines.append("")
+    return lines[:line_count]
+
+
+def _statement_values(rng: random.Random, title: str) -> list:
+    """[(row, current, previous)] of one statement; the balance sheet balances."""
+    values = []
+    for row in STATEMENT_ROWS[title]:
+        current = rng.randint(50, 5000)
+        values.append([row, current, int(current * rng.uniform(0.8, 1.1))])
+    if title == "CONSOLIDATED BALANCE SHEETS":
+        by_row = {entry[0]: entry for entry in values}
+        liabilities, equity = by_row["Total liabilities"], by_row["Total shareholders' equity"]
+        by_row["Total assets"][1:] = [liabilities[1] + equity[1], liabilities[2] + equity[2]]
+        values.append(["Total liabilities and shareholders' equity", *by_row["Total assets"][1:]])
+    return values
+
+
+def _amount(row: str, value: int) -> str:
+    return f"({value:,})" if row in NEGATIVE_ROWS else f"{value:,}"
+
+
+def _statements(rng: random.Random, line_count: int) -> list:
+    """The notes; the statements themselves are drawn as tables by `add_statement_page`."""
+    lines = ["Notes to Consolidated Financial Statements", ""]
+    notes = iter(enumerate(NOTE_TITLES, start=1))
+    while len(lines) < line_count:
+        number, title = next(notes, (None, None))
+        if number is not None:
+            lines += [f"Note {number} - {title}", ""]
+        lines += _prose(rng, "business", rng.randint(8, 20))
+    return lines[:line_count]
+
+
+def _section_lines(rng: random.Random, kind: str, line_count: int) -> list:
+    if kind == "statements":
+        return _statements(rng, line_count)
+    if kind == "short":
+        return ["None.", ""] + _prose(rng, "business", max(0, line_count - 2))
+    return _prose(rng, kind, line_count)
+
+
+def _page_budget(layout: list, pages: int) -> list:
+    total = sum(share for _part, _item, _title, share, _kind in layout)
+    budget = [max(1, round(share / total * pages)) for _part, _item, _title, share, _kind in layout]
+    largest = budget.index(max(budget))
+    budget[largest] = max(1, budget[largest] + pages - sum(budget))
+    return budget
+
+
+def build_filing(form: str = "10-K", pages: int = 100, seed: int = 0, company: str = "Acme Corporation") -> fitz.Document:
+    """Builds the filing in memory: a cover page, a table of contents page and `pages` pages of items."""
+    rng = random.Random(seed)
+    layout = LAYOUTS[form]
+    budget = _page_budget(layout, max(len(layout), pages - 2))
+    doc = fitz.open()
+
+    def add_page(lines: list):
+        page = doc.new_page(width=612, height=792)
+        page.insert_text((54, 54), "\n".join(lines + ["", str(doc.page_count)]), fontsize=FONT_SIZE)
+
+    def add_statement_page(heading: list, title: str, years: tuple, quarterly: bool = False):
+        """
+        One statement on its own page, with the period columns right-aligned as in a real filing;
+        `quarterly` adds the nine-month columns of a 10-Q income statement after the three-month ones.
+        """
+        page = doc.new_page(width=612, height=792)
+        y = 54
+
+        def line(text: str, right: float = None, x: float = 54):
+            if right is not None:
+                x = right - fitz.get_text_length(text, fontsize=FONT_SIZE)
+            page.insert_text((x, y), text, fontsize=FONT_SIZE)
+
+        for text in heading + [title, "(In millions)", ""]:
+            line(text)
+            y += LINE_HEIGHT
+        columns = QUARTER_COLUMNS if quarterly else PERIOD_COLUMNS
+        if quarterly:
+            for group, right in zip(QUARTER_GROUPS, columns[1::2]):
+                line(group, right)
+            y += LINE_HEIGHT
+        for year, right in zip(years * (len(columns) // 2), columns):
+            line(str(year), right)
+        y += LINE_HEIGHT
+        for position, (row, current, previous) in enumerate(_statement_values(rng, title)):
+            line(row)
+            values = [current, previous]
+            if quarterly:
+                values += [int(current * rng.uniform(2.8, 3.2)), int(previous * rng.uniform(2.8, 3.2))]
+            for value, right in zip(values, columns):
+                if position == 0:
+                    line("$", x=right - (40 if quarterly else 60))
+                line(_amount(row, value), right)
+            y += LINE_HEIGHT
+        line(str(doc.page_count), x=300)
+
+    period = "fiscal year ended September 28, 2024" if form == "10-K" else "quarterly period ended June 29, 2024"
+    add_page(["UNITED STATES", "SECURITIES AND EXCHANGE COMMISSION", "Washington, D.C. 20549", "",
+              f"FORM {form}", "", f"For the {period}", "", company])
+
+    toc, page_number, last_part = ["TABLE OF CONTENTS", ""], 3, None
+    for (part, item, title, _share, _kind), page_count in zip(layout, budget):
+        if part != last_part:
+            toc.append(f"Part {part}")
+            last_part = part
+        toc.append(f"Item {item}.    {title[:70]}    {page_number}")
+        page_number += page_count
+    add_page(toc)
+
+    last_part = None
+    for (part, item, title, _share, kind), page_count in zip(layout, budget):
+        heading = []
+        if part != last_part:
+            heading = [f"PART {part}", PART_TITLES[part] if form == "10-Q" else "", ""]
+            last_part = part
+        heading += [f"Item {item}.    {title}", ""]
+        if kind == "statements":
+            years = (2024, 2023)
+            for number, statement in enumerate(list(STATEMENT_ROWS)[:page_count]):
+                quarterly = form == "10-Q" and statement == "CONSOLIDATED STATEMENTS OF OPERATIONS"
+                add_statement_page(heading if number == 0 else [], statement, years, quarterly)
+            page_count -= min(page_count, len(STATEMENT_ROWS))
+            heading = []
+        body = heading + _section_lines(rng, kind, page_count * LINES_PER_PAGE - len(heading))
+        for start in range(0, len(body), LINES_PER_PAGE):
+            add_page(body[start:start + LINES_PER_PAGE])
+    return doc
+
+
+def make_filing(path: str, form: str = "10-K", pages: int = 100, seed: int = 0, company: str = "Acme Corporation") -> str:
+    """Writes a synthetic filing to `path` and returns the path."""
+    with build_filing(form, pages, seed, company) as doc:
+        doc.save(path, garbage=3, deflate=True)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic 10-K or 10-Q PDF.")
+    parser.add_argument("path")
+    parser.add_argument("--form", choices=sorted(LAYOUTS), default="10-K")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    make_filing(args.path, args.form, args.pages, args.seed)
+    print(f"--- Wrote {args.form} with {args.pages} pages to {args.path} ---")
@@ -0,0 +1,89 @@
+from llm_scheduler import estimate_tokens
+from prepared_filing import CHARS_PER_TOKEN, CompositeView
+
+# Sections each document-wide task actually needs, per form type, as (item, part) pairs.
+TASK_SECTIONS = {
+    # Red flags live in MD&A, the statements and their notes, auditor changes and controls;
+    # governance changes in "Other Information" and the directors item.
+    "holistic_review": {
+        "10-K": [("7", None), ("8", None), ("9", None), ("9A", None), ("9B", None), ("10", None)],
+        "10-Q": [("1", "I"), ("2", "I"), ("4", "I"), ("5", "II")],
+    },
+    # Debt schedules and covenants sit in MD&A liquidity and the debt note; ESG in the business description.
+    "deep_qualitative": {
+        "10-K": [("1", None), ("7", None), ("8", None)],
+        "10-Q": [("1", "I"), ("2", "I")],
+    },
+}
+
+
+def chunk_spans(text: str, budget_tokens: int) -> list:
+    """
+    Splits `text` into (start, end) pieces of at most `budget_tokens` (estimated), cutting at
+    paragraph breaks where possible, then at line breaks, and only as a last resort mid-line.
+    """
+    if not text:
+        return []
+    budget_chars = max(1, budget_tokens * CHARS_PER_TOKEN)
+    spans, start = [], 0
+    while len(text) - start > budget_chars:
+        window_end = start + budget_chars
+        cut = text.rfind("\n\n", start + budget_chars // 2, window_end)
+        if cut == -1:
+            cut = text.rfind("\n", start + budget_chars // 2, window_end)
+        if cut == -1:
+            cut = window_end
+        spans.append((start, cut))
+        start = cut
+    spans.append((start, len(text)))
+    return spans
+
+
+def select_sections(filing, task: str):
+    """
+    A view of the sections `task` needs, in document order. Falls back to the whole
+    document when the form type is unknown or none of the sections could be located.
+    """
+    specs = TASK_SECTIONS.get(task, {}).get(filing.form_type, [])
+    spans = sorted({span for span in (filing.index.span(item, part) for item, part in specs) if span is not None})
+    if not spans:
+        return filing.whole()
+    return CompositeView([filing.view(start, end).trimmed() for start, end in spans])
+
+
+def _is_empty(value) -> bool:
+    return value in (None, "", [], {}) or (isinstance(value, str) and value.strip().upper() in ("N/A", "NONE", "ERROR"))
+
+
+def merge_results(results: list):
+    """
+    Reduces the JSON results of one prompt run over several chunks: lists are concatenated
+    without duplicates, objects are merged key by key and scalars keep the first real value.
+    """
+    results = [result for result in results if result is not None]
+    if not results:
+        return {}
+    first = results[0]
+    if isinstance(first, dict):
+        keys = []
+        for result in results:
+            if isinstance(result, dict):
+                keys.extend(key for key in result if key not in keys)
+        return {key: merge_results([r[key] for r in results if isinstance(r, dict) and key in r]) for key in keys}
+    if isinstance(first, list):
+        merged, seen = [], set()
+        for result in results:
+            for element in result if isinstance(result, list) else [result]:
+                marker = repr(element)
+                if marker not in seen:
+                    seen.add(marker)
+                    merged.append(element)
+        return merged
+    for result in results:
+        if not _is_empty(result):
+            return result
+    return first
+
+
+def describe_chunks(chunks: list) -> str:
+    return ", ".join(f"{estimate_tokens(chunk)}" for chunk in chunks)
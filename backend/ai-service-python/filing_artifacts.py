@@ -0,0 +1,230 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import Counter
+
+try:
+    import zstandard
+except ImportError:  # optional; artifacts are written with zlib instead
+    zstandard = None
+
+from filing_index import notes_text, section_span
+from prepared_filing import page_range
+
+# One file per analyzed PDF, named after its SHA-256:
+#   header   magic, codec, offset and length of the metadata block
+#   frames   every page's text, compressed on its own so a section reads only its pages
+#   metadata compressed JSON: frame table, page offsets, raw headings, section spans, statement tables
+MAGIC = b"FILART01"
+HEADER = struct.Struct("<8scQI")
+ZSTD, ZLIB = b"z", b"d"
+
+
+def _compressor(codec: bytes):
+    if codec == ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress
+    return lambda data: zlib.compress(data, 6)
+
+
+def _decompressor(codec: bytes):
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ValueError("artifact is zstd-compressed and zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress
+    return zlib.decompress
+
+
+def write_artifact(path: str, pages: list, raw_headings: list, index, statement_tables: dict = None):
+    """
+    Writes the artifact of one filing atomically (to a temp file renamed into place). `index`
+    is the filing's FilingIndex, whose section spans are stored.
+    """
+    codec = ZSTD if zstandard is not None else ZLIB
+    compress = _compressor(codec)
+    page_starts, frames, length = [], [], 0
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "wb") as artifact:
+            artifact.write(HEADER.pack(MAGIC, codec, 0, 0))
+            for text in pages:
+                frame = compress(text.encode("utf-8", "surrogatepass"))
+                frames.append((artifact.tell(), len(frame)))
+                artifact.write(frame)
+                page_starts.append(length)
+                length += len(text)
+            meta = compress(json.dumps({
+                "length": length,
+                "form_type": index.form_type,
+                "frames": frames,
+                "page_starts": page_starts,
+                "raw_headings": raw_headings,
+                "sections": [[*key, start, end] for key, (start, end) in index.sections.items()],
+                "statement_tables": statement_tables,
+            }).encode("utf-8"))
+            meta_offset = artifact.tell()
+            artifact.write(meta)
+            artifact.seek(0)
+            artifact.write(HEADER.pack(MAGIC, codec, meta_offset, len(meta)))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class FilingArtifact:
+    """
+    A stored filing, memory-mapped. Pages are decompressed only when read, so a single section
+    costs the pages it spans rather than the whole document.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as artifact:
+            self._map = mmap.mmap(artifact.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, codec, meta_offset, meta_length = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError("not a filing artifact")
+            self._decompress = _decompressor(codec)
+            meta = json.loads(self._decompress(self._map[meta_offset:meta_offset + meta_length]))
+        except Exception:
+            self._map.close()
+            raise
+        self.length = meta["length"]
+        self.form_type = meta["form_type"]
+        self.frames = meta["frames"]
+        self.page_starts = tuple(meta["page_starts"])
+        self.raw_headings = meta["raw_headings"]
+        self.sections = {(kind, part, item): (start, end) for kind, part, item, start, end in meta["sections"]}
+        self.statement_tables = meta["statement_tables"]
+
+    @property
+    def page_count(self) -> int:
+        return len(self.frames)
+
+    def page(self, number: int) -> str:
+        offset, length = self.frames[number]
+        return self._decompress(self._map[offset:offset + length]).decode("utf-8", "surrogatepass")
+
+    def pages(self) -> list:
+        return [self.page(number) for number in range(self.page_count)]
+
+    def slice(self, start: int, end: int) -> str:
+        """Text between two document offsets, decompressing only the pages it spans."""
+        if end <= start:
+            return ""
+        first, last = page_range(self.page_starts, start, end)
+        joined = "".join(self.page(number) for number in range(first, last + 1))
+        offset = self.page_starts[first]
+        return joined[start - offset:end - offset]
+
+    def span(self, item: str, part: str = None):
+        return section_span(self.sections, item, part)
+
+    def section_text(self, item: str, part: str = None) -> str:
+        span = self.span(item, part)
+        return self.slice(*span).strip() if span is not None else ""
+
+    def footnotes_text(self, item: str, part: str = None) -> str:
+        span = self.span(item, part)
+        return notes_text(self.slice(*span)) if span is not None else ""
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ArtifactStore:
+    """
+    Directory of filing artifacts keyed by PDF hash. Reads refresh a file's modification time;
+    the least recently used artifacts are removed once the directory exceeds `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, pdf_hash: str) -> str:
+        return os.path.join(self.directory, f"{pdf_hash}.artifact")
+
+    def open(self, pdf_hash: str):
+        """The stored artifact of a PDF, or None. Unreadable artifacts are removed."""
+        path = self.path(pdf_hash) if pdf_hash else None
+        if path is None or not os.path.exists(path):
+            self.counts["misses"] += 1
+            return None
+        try:
+            artifact = FilingArtifact(path)
+        except Exception as e:
+            self.counts["misses"] += 1
+            self.discard(pdf_hash, e)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self.counts["hits"] += 1
+        return artifact
+
+    def save(self, pdf_hash: str, pages: list, raw_headings: list, index, statement_tables: dict = None):
+        if not pdf_hash:
+            return
+        write_artifact(self.path(pdf_hash), pages, raw_headings, index, statement_tables)
+        self.counts["writes"] += 1
+        self._evict()
+
+    def discard(self, pdf_hash: str, error: Exception):
+        """Removes an artifact found to be unreadable (truncated or corrupt); the next request re-parses the PDF."""
+        print(f"--- Artifact store: dropping unreadable artifact {pdf_hash[:12]}: {error} ---")
+        self.counts["discarded"] += 1
+        self._remove(self.path(pdf_hash))
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _files(self) -> list:
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".artifact"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _evict(self):
+        with self._lock:
+            files = sorted(self._files())
+            total = sum(size for _mtime, size, _path in files)
+            for _mtime, size, path in files:
+                if total <= self.max_bytes:
+                    break
+                # An open reader keeps its mapping; the file is gone for everyone else.
+                self._remove(path)
+                self.counts["evictions"] += 1
+                total -= size
+
+    def stats(self) -> dict:
+        files = self._files()
+        return {
+            **{key: self.counts[key] for key in ("hits", "misses", "writes", "evictions", "discarded")},
+            "codec": "zstd" if zstandard is not None else "zlib",
+            "artifacts": len(files),
+            "size_bytes": sum(size for _mtime, size, _path in files),
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,295 @@
+import asyncio
+import re
+from collections import namedtuple
+
+from prepared_filing import PreparedFiling, SectionView, page_range, sanitize
+
+# --- Patterns (compiled once at import) ---
+# A heading is an "Item N[A]." or "Part I/II/III/IV" at the start of a line, followed by its title.
+HEADING_PATTERN = re.compile(
+    r"^[ \t]*(?:part[ \t]+(?P<part>iv|iii|ii|i)(?![a-z0-9,])|item[ \t]+(?P<item>\d{1,2}[ \t]*[a-c]?)[ \t]*\.)"
+    r"[ \t]*(?P<title>[^\n]*)",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Table-of-contents lines end with a page number, optionally after dot leaders.
+TOC_PAGE_NUMBER = re.compile(r"(?:^|[\s.])(?:\d{1,3}|[ivxl]{1,6})\s*$", re.IGNORECASE)
+STANDALONE_PAGE_NUMBER = re.compile(r"^\s*\d{1,3}\s*$")
+NOTES_PATTERN = re.compile(r"Notes\s+to\s+(?:the\s+)?(?:Condensed\s+)?Consolidated\s+Financial\s+Statements", re.IGNORECASE)
+FORM_10K_PATTERN = re.compile(r"form\s+10-k", re.IGNORECASE)
+FORM_10Q_PATTERN = re.compile(r"form\s+10-q", re.IGNORECASE)
+
+# A heading followed by less text than this before the next heading, and repeated later
+# in the document, is treated as a table-of-contents entry.
+TOC_MAX_GAP = 200
+FORM_TYPE_HEADER_CHARS = 3000
+
+Heading = namedtuple("Heading", ["kind", "part", "item", "title", "start", "toc"])
+
+
+def detect_form_type(header_text: str) -> str:
+    """Returns "10-K", "10-Q" or "" from the first page(s) of a filing."""
+    header = header_text[:FORM_TYPE_HEADER_CHARS]
+    if FORM_10K_PATTERN.search(header):
+        return "10-K"
+    if FORM_10Q_PATTERN.search(header):
+        return "10-Q"
+    return ""
+
+
+def _next_line(text: str, pos: int) -> str:
+    """The first non-empty line starting at `pos` (bounded, so it never scans far ahead)."""
+    while pos < len(text):
+        end = text.find("\n", pos, pos + 300)
+        if end == -1:
+            end = min(len(text), pos + 300)
+        line = text[pos:end].strip()
+        if line:
+            return line
+        if end == pos + 300:
+            return ""
+        pos = end + 1
+    return ""
+
+
+def scan_headings(text: str, offset: int = 0, part: str = None):
+    """
+    Finds the headings in `text` as [kind, part, item, title, start, page_numbered] lists,
+    with `start` shifted by `offset`. Returns them with the part in effect at the end of the text,
+    so a document can be scanned one page at a time.
+    """
+    raw = []
+    for match in HEADING_PATTERN.finditer(text):
+        title = match.group("title").strip()
+        following = _next_line(text, match.end() + 1)
+        if not title and not HEADING_PATTERN.match(following):
+            # "Item 1A." on its own line, with the title on the next one.
+            title, following = following, _next_line(text, text.find(following, match.end()) + len(following))
+        page_numbered = bool(TOC_PAGE_NUMBER.search(title)) or bool(STANDALONE_PAGE_NUMBER.match(following))
+        if match.group("part"):
+            part = match.group("part").upper()
+            raw.append(["part", part, None, title, offset + match.start(), page_numbered])
+        else:
+            item = "".join(match.group("item").split()).upper()
+            raw.append(["item", part, item, title, offset + match.start(), page_numbered])
+    return raw, part
+
+
+def notes_offset(statements_text: str):
+    """Where the last notes heading starts in `statements_text`, or None."""
+    last_match = None
+    for last_match in NOTES_PATTERN.finditer(statements_text):
+        pass
+    return last_match.start() if last_match is not None else None
+
+
+def notes_text(statements_text: str) -> str:
+    """The notes to the financial statements: from the last notes heading to the end of the statements."""
+    offset = notes_offset(statements_text)
+    return statements_text[offset:].strip() if offset is not None else ""
+
+
+def notes_view(statements: SectionView) -> SectionView:
+    """`notes_text` as a view into the same source."""
+    offset = notes_offset(statements.text)
+    if offset is None:
+        return SectionView(statements.source, statements.start, statements.start)
+    return SectionView(statements.source, statements.start + offset, statements.end).trimmed()
+
+
+def section_span(sections: dict, item: str, part: str = None):
+    """
+    (start, end) of "Item <item>" (optionally within Part <part>) in a {(kind, part, item): span}
+    section table, or None if it is absent.
+    """
+    item = item.upper()
+    if part is not None:
+        return sections.get(("item", part.upper(), item))
+    spans = [span for (kind, _part, key), span in sections.items() if kind == "item" and key == item]
+    return min(spans) if spans else None
+
+
+class FilingIndex:
+    """
+    Locates every "Item N[A]." and "Part I/II" heading of a filing in one linear pass,
+    separates table-of-contents entries from body headings, and serves any section as a
+    (start, end) offset pair into the original text.
+    """
+
+    def __init__(self, text: str, raw_headings: list = None):
+        self.text = text
+        self.form_type = detect_form_type(text)
+        if raw_headings is None:
+            raw_headings, _part = scan_headings(text)
+        self.headings = self._classify(raw_headings, len(text))
+        self.sections = self._build_sections()
+
+    @staticmethod
+    def _classify(raw: list, length: int) -> list:
+        # Short headings that are repeated later are table-of-contents entries too.
+        last_seen = {}
+        for position, (kind, part, item, *_rest) in enumerate(raw):
+            last_seen[(kind, part, item)] = position
+        headings = []
+        for position, (kind, part, item, title, start, page_numbered) in enumerate(raw):
+            next_start = raw[position + 1][4] if position + 1 < len(raw) else length
+            repeated = last_seen[(kind, part, item)] > position
+            toc = page_numbered or (repeated and next_start - start < TOC_MAX_GAP)
+            headings.append(Heading(kind, part, item, title, start, toc))
+        return headings
+
+    def _build_sections(self) -> dict:
+        """Picks one body heading per (kind, part, item) and ends each section at the next one."""
+        chosen = {}
+        for heading in self.headings:
+            key = (heading.kind, heading.part, heading.item)
+            # The first body heading wins; a key that only has TOC entries keeps its last one.
+            if key not in chosen or chosen[key].toc:
+                chosen[key] = heading
+        boundaries = sorted(chosen.values(), key=lambda heading: heading.start)
+        sections = {}
+        for position, heading in enumerate(boundaries):
+            end = boundaries[position + 1].start if position + 1 < len(boundaries) else len(self.text)
+            sections[(heading.kind, heading.part, heading.item)] = (heading.start, end)
+        return sections
+
+    def span(self, item: str, part: str = None):
+        return section_span(self.sections, item, part)
+
+
+class StreamingFilingIndex:
+    """
+    Builds the section index while pages are still being extracted.
+    Coroutines such as `section` resolve as soon as their answer can no longer change:
+    a section is ready once its body heading and the next heading have both arrived,
+    so analysis tasks can start before the last page is parsed. Pages are sanitized as they
+    arrive, and sections are handed out as views that stay valid once the filing is prepared.
+    """
+
+    def __init__(self):
+        self.pages = []
+        self.clean_pages = []
+        self.page_starts = []
+        self.length = 0
+        self.raw_headings = []
+        self.final = None
+        self.prepared = None
+        self.error = None
+        self._part = None
+        self._changed = asyncio.Event()
+
+    def add_page(self, text: str):
+        raw, self._part = scan_headings(text, offset=self.length, part=self._part)
+        self.raw_headings.extend(raw)
+        self.page_starts.append(self.length)
+        self.pages.append(text)
+        self.clean_pages.append(sanitize(text))
+        self.length += len(text)
+        self._notify()
+
+    def finish(self, pdf_hash: str = None) -> FilingIndex:
+        """Called after the last page; from here on every lookup is answered by the prepared filing."""
+        self.final = FilingIndex("".join(self.pages), raw_headings=self.raw_headings)
+        self.prepared = PreparedFiling(pdf_hash, self.final.text, "".join(self.clean_pages),
+                                       tuple(self.page_starts), self.final)
+        self.pages = self.clean_pages = None
+        self._notify()
+        return self.final
+
+    def restore(self, pages: list, raw_headings: list, pdf_hash: str = None) -> FilingIndex:
+        """Loads every page of a filing stored earlier, with its already scanned headings, and finishes."""
+        for text in pages:
+            self.page_starts.append(self.length)
+            self.pages.append(text)
+            self.clean_pages.append(sanitize(text))
+            self.length += len(text)
+        self.raw_headings = [list(heading) for heading in raw_headings]
+        return self.finish(pdf_hash)
+
+    def fail(self, error: Exception):
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _wait_for(self, lookup):
+        while True:
+            if self.error is not None:
+                raise self.error
+            found = lookup()
+            if found is not None:
+                return found
+            await self._changed.wait()
+
+    def _join(self, pages: list, start: int, end: int) -> str:
+        first, last = self.page_range(start, end)
+        joined = "".join(pages[first:last + 1])
+        offset = self.page_starts[first]
+        return joined[start - offset:end - offset]
+
+    # --- View source: early views read the pages, later ones the prepared filing ---
+    def slice(self, start: int, end: int) -> str:
+        if self.prepared is not None:
+            return self.prepared.slice(start, end)
+        return self._join(self.pages, start, end) if end > start else ""
+
+    def page_range(self, start: int, end: int) -> tuple:
+        return page_range(self.page_starts, start, end)
+
+    def clean_slice(self, start: int, end: int) -> str:
+        if self.prepared is not None:
+            return self.prepared.clean_slice(start, end)
+        return self._join(self.clean_pages, start, end) if end > start else ""
+
+    def _early_span(self, item: str, part: str = None):
+        """The span of a section whose body heading and end boundary have both been seen."""
+        raw = self.raw_headings
+        for position, (kind, heading_part, heading_item, _title, start, page_numbered) in enumerate(raw):
+            if kind != "item" or heading_item != item or (part is not None and heading_part != part):
+                continue
+            if page_numbered or position + 1 == len(raw):
+                continue
+            if raw[position + 1][4] - start < TOC_MAX_GAP:
+                continue
+            for kind_after, part_after, item_after, _t, end, numbered_after in raw[position + 1:]:
+                if not numbered_after and (kind_after, part_after, item_after) != (kind, heading_part, heading_item):
+                    return start, end
+            return None
+        return None
+
+    async def form_type(self) -> str:
+        def lookup():
+            if self.final is not None:
+                return self.final.form_type
+            if self.length >= FORM_TYPE_HEADER_CHARS or detect_form_type("".join(self.pages[:3])):
+                return detect_form_type("".join(self.pages[:3]))
+            return None
+        return await self._wait_for(lookup)
+
+    async def head(self, chars: int) -> SectionView:
+        """The first `chars` characters of the document, as soon as they have been extracted."""
+        def lookup():
+            if self.prepared is not None:
+                return self.prepared.view(0, chars)
+            if self.length >= chars:
+                return SectionView(self, 0, chars)
+            return None
+        return await self._wait_for(lookup)
+
+    async def complete(self) -> PreparedFiling:
+        """The prepared filing, once the last page is in."""
+        return await self._wait_for(lambda: self.prepared)
+
+    async def section(self, item: str, part: str = None) -> SectionView:
+        item, part = item.upper(), part.upper() if part else None
+
+        def lookup():
+            if self.prepared is not None:
+                return self.prepared.section(item, part)
+            span = self._early_span(item, part)
+            return SectionView(self, *span).trimmed() if span is not None else None
+        return await self._wait_for(lookup)
+
+    async def footnotes(self, item: str, part: str = None) -> SectionView:
+        return notes_view(await self.section(item, part))
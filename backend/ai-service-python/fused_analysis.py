@@ -0,0 +1,96 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+# Each sub-analysis of a fused prompt is introduced by this marker and its result key.
+SECTION_MARKER = "### ANALYSIS:"
+
+
+@dataclass(frozen=True)
+class FusableTask:
+    """
+    An analysis that reads one extracted section and can share a model call with the other
+    analyses of that section. `schema` is the JSON schema of its answer (the OpenAPI subset the
+    Gemini structured output accepts); `run(section)` is the individual call used as fallback.
+    """
+    name: str
+    section: str
+    prompt: str
+    schema: dict
+    run: Callable[[Any], Awaitable[Any]]
+    fallback: Any = None
+
+
+def matches_schema(value, schema: dict) -> bool:
+    """True when `value` has the shape `schema` describes (types, required keys, array items)."""
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(value, dict):
+            return False
+        if any(key not in value for key in schema.get("required", [])):
+            return False
+        return all(matches_schema(value[key], sub) for key, sub in schema.get("properties", {}).items() if key in value)
+    if kind == "array":
+        return isinstance(value, list) and all(matches_schema(item, schema.get("items", {})) for item in value)
+    if kind == "string":
+        return isinstance(value, str)
+    if kind in ("number", "integer"):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if kind == "boolean":
+        return isinstance(value, bool)
+    return True
+
+
+def group_by_section(tasks: list) -> dict:
+    """{section: [tasks]} in task order."""
+    groups = {}
+    for task in tasks:
+        groups.setdefault(task.section, []).append(task)
+    return groups
+
+
+def fused_schema(tasks: list) -> dict:
+    return {
+        "type": "object",
+        "properties": {task.name: task.schema for task in tasks},
+        "required": [task.name for task in tasks],
+    }
+
+
+def fused_prompt(tasks: list) -> str:
+    instructions = "\n\n".join(f"{SECTION_MARKER} {task.name}\n{task.prompt.strip()}" for task in tasks)
+    return f"""
+    You will perform {len(tasks)} separate analyses of the same text. Each analysis is introduced by
+    "{SECTION_MARKER}" followed by its result key, and describes the JSON object it must produce.
+
+    {instructions}
+
+    Respond ONLY with a single, valid JSON object with the keys {", ".join(f'"{task.name}"' for task in tasks)}.
+    The value under each key must be exactly the JSON object that analysis asks for.
+    IMPORTANT: Do not use any unicode escape sequences like \\u0024 in your response. Use the actual characters like $.
+    """
+
+
+async def run_fused(tasks: list, section, generate_json: Callable[[str, dict], Awaitable[Any]]) -> dict:
+    """
+    Runs every task over `section` in one model call and returns {task name: result}.
+    `generate_json(prompt, schema)` makes the call and returns the parsed answer. Sub-results that
+    are missing or fail schema validation are re-run with the task's own individual call.
+    """
+    try:
+        answer = await generate_json(fused_prompt(tasks), fused_schema(tasks))
+    except Exception as e:
+        print(f"--- ERROR in fused analysis of {', '.join(task.name for task in tasks)}: {e}")
+        answer = {}
+    results, retry = {}, []
+    for task in tasks:
+        value = answer.get(task.name) if isinstance(answer, dict) else None
+        if matches_schema(value, task.schema):
+            results[task.name] = value
+        else:
+            retry.append(task)
+    if retry:
+        print(f"--- Fused analysis: re-running {', '.join(task.name for task in retry)} individually ---")
+        for task, value in zip(retry, await asyncio.gather(*(task.run(section) for task in retry))):
+            results[task.name] = value
+    return results
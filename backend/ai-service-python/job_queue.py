@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class JobStore:
+    """SQLite table of analysis jobs, so queued work and finished results survive restarts."""
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                pdf_hash TEXT NOT NULL,
+                filename TEXT,
+                pdf_path TEXT,
+                ticker TEXT,
+                status TEXT NOT NULL,
+                partial TEXT NOT NULL DEFAULT '{}',
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_by_hash ON jobs (pdf_hash, status)")
+        # Stores created before jobs carried a ticker.
+        if "ticker" not in {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN ticker TEXT")
+        self._db.commit()
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            cursor = self._db.execute(sql, params)
+            self._db.commit()
+            return cursor
+
+    def create(self, pdf_hash: str, filename: str, pdf_path: str, ticker: str = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, pdf_hash, filename, pdf_path, ticker, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, pdf_hash, filename, pdf_path, ticker, QUEUED, now, now))
+        return job_id
+
+    def find_reusable(self, pdf_hash: str):
+        """The newest job for this PDF that has not failed, if any."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE pdf_hash=? AND status != ? ORDER BY created_at DESC LIMIT 1",
+                (pdf_hash, FAILED)).fetchone()
+        return dict(row) if row else None
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def unfinished(self) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)).fetchall()
+        return [dict(row) for row in rows]
+
+    def set_status(self, job_id: str, status: str, result=None, error: str = None):
+        self._execute(
+            "UPDATE jobs SET status=?, result=?, error=?, updated_at=? WHERE id=?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id))
+
+    def save_partial(self, job_id: str, partial: dict):
+        self._execute("UPDATE jobs SET partial=?, updated_at=? WHERE id=?", (json.dumps(partial), time.time(), job_id))
+
+
+class JobQueue:
+    """
+    Runs analysis jobs on a fixed number of asyncio workers.
+    `runner(job, on_partial)` does the actual work and returns the final result; `on_partial(fields)`
+    merges fields into the job's partial results as they come in.
+    """
+
+    def __init__(self, store: JobStore, runner, upload_dir: str, concurrency: int = 2):
+        self.store = store
+        self.runner = runner
+        self.upload_dir = upload_dir
+        self.concurrency = concurrency
+        self._queue = asyncio.Queue()
+        self._workers = []
+        os.makedirs(upload_dir, exist_ok=True)
+
+    def start(self):
+        """Starts the workers and re-queues jobs that were pending or running at the last shutdown."""
+        for job in self.store.unfinished():
+            self.store.set_status(job["id"], QUEUED)
+            self._queue.put_nowait(job["id"])
+        self._workers = [asyncio.create_task(self._work(), name=f"job-worker-{n}") for n in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, spooled_path: str, pdf_hash: str, filename: str, ticker: str = None) -> dict:
+        """
+        Queues a spooled PDF. A PDF that is already queued, running or finished is not analyzed
+        again; the existing job is returned instead and the new upload is discarded.
+        """
+        existing = self.store.find_reusable(pdf_hash)
+        if existing is not None:
+            os.remove(spooled_path)
+            print(f"--- Job queue: duplicate upload of {filename}, reusing job {existing['id']} ---")
+            return existing
+        pdf_path = os.path.join(self.upload_dir, f"{pdf_hash}.pdf")
+        shutil.move(spooled_path, pdf_path)
+        job_id = self.store.create(pdf_hash, filename, pdf_path, ticker)
+        self._queue.put_nowait(job_id)
+        return self.store.get(job_id)
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = self.store.get(job_id)
+                if job is None or job["status"] not in (QUEUED, RUNNING):
+                    continue
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # A store error (disk full, locked database) fails this job, never the worker.
+                print(f"--- ERROR in job queue worker on job {job_id}: {e} ---")
+                self._mark_failed(job_id, str(e))
+            finally:
+                self._queue.task_done()
+
+    def _mark_failed(self, job_id: str, error: str):
+        try:
+            self.store.set_status(job_id, FAILED, error=error)
+        except Exception as e:
+            print(f"--- ERROR marking job {job_id} failed: {e} ---")
+
+    async def _run(self, job: dict):
+        self.store.set_status(job["id"], RUNNING)
+        partial = json.loads(job["partial"] or "{}")
+
+        def on_partial(fields: dict):
+            partial.update(fields)
+            try:
+                self.store.save_partial(job["id"], partial)
+            except Exception as e:
+                # Partial results are a progress view; the job goes on without them.
+                print(f"--- ERROR saving partial results of job {job['id']}: {e} ---")
+
+        finished = True
+        try:
+            result = await self.runner(job, on_partial)
+        except asyncio.CancelledError:
+            # Shutting down: leave the job (and its upload) to be picked up again on the next start.
+            finished = False
+            raise
+        except Exception as e:
+            print(f"--- ERROR in job {job['id']}: {e}")
+            self.store.set_status(job["id"], FAILED, error=getattr(e, "detail", None) or str(e))
+        else:
+            self.store.set_status(job["id"], SUCCEEDED, result=result)
+        finally:
+            if finished and job["pdf_path"] and os.path.exists(job["pdf_path"]):
+                os.remove(job["pdf_path"])
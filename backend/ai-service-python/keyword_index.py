@@ -0,0 +1,287 @@
+import bisect
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z\-]*[a-z]")
+MIN_TOKEN_CHARS = 3
+# Common English words plus filing boilerplate that says nothing about a specific filing.
+STOPWORDS = frozenset("""
+a about above after again against all also although am an and any are as at be because been before being
+below between both but by can cannot could did do does doing down during each either else etc even ever
+every few for from further had has have having he her here hers him his how however i if in into is it its
+itself just least less like made make many may might more most much must my no nor not now of off on once
+one only or other others otherwise our ours out over own per rather same shall she should since so some
+such than that the their theirs them then there thereby therefore these they this those through thus to too
+under until up upon us very via was we were what when where whether which while who whom whose why will
+with within without would yet you your
+company companys companies business businesses risk risks factor factors result results affect affected
+adversely adverse material materially significant significantly certain including include includes
+ability able future period periods year years quarter fiscal item part form report annual quarterly
+note notes table contents see page inc corp corporation llc ltd million billion thousand percent
+""".split())
+# (section, ticker) reference sets whose document frequencies are kept in memory.
+MAX_CACHED_FREQUENCIES = 64
+
+
+def tokenize(text: str) -> Counter:
+    """
+    Counts the unigrams and bigrams of `text`, ignoring stopwords. Bigrams never span a
+    stopword, so "supply chain" counts but "supply of chain" does not.
+    """
+    counts = Counter()
+    previous = None
+    for token in TOKEN_PATTERN.findall((text or "").lower()):
+        if len(token) < MIN_TOKEN_CHARS or token in STOPWORDS:
+            previous = None
+            continue
+        counts[token] += 1
+        if previous is not None:
+            counts[f"{previous} {token}"] += 1
+        previous = token
+    return counts
+
+
+class KeywordIndex:
+    """
+    Term counts for every indexed section, kept as a sparse (documents x terms) matrix so
+    TF-IDF scores against the whole corpus, or one ticker's filings, are a few vector operations.
+
+    The matrix is a list of segments, each a block of consecutive rows in its own file. `path`
+    also holds an append-only journal: one line per added section (its new terms, document
+    record and segment) and one per merge of segments. Segments are merged size-tiered: the
+    newest is merged into the one before it while it is at least as large, so each row is
+    rewritten O(log n) times and adding a filing costs O(log n) amortized, however large the
+    corpus. Document frequencies per (section, ticker) are cached and updated as sections arrive.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self.terms = []
+        self.term_ids = {}
+        self.docs = []
+        self.doc_rows = {}
+        self.segments = []
+        self.blocks = []
+        self._starts = []
+        self._frequencies = OrderedDict()
+        self._load()
+
+    # --- Persistence ---
+    def _manifest_path(self) -> str:
+        # Written by earlier versions; read as the starting point of the journal.
+        return os.path.join(self.path, "index.json")
+
+    def _journal_path(self) -> str:
+        return os.path.join(self.path, "journal.jsonl")
+
+    def _add_terms(self, terms) -> list:
+        new_terms = [term for term in terms if term not in self.term_ids]
+        for term in new_terms:
+            self.term_ids[term] = len(self.terms)
+            self.terms.append(term)
+        return new_terms
+
+    def _load(self):
+        if os.path.exists(self._manifest_path()):
+            with open(self._manifest_path(), encoding="utf-8") as manifest:
+                state = json.load(manifest)
+            self._add_terms(state["terms"])
+            self.docs = state["docs"]
+            self.doc_rows = {doc["id"]: row for row, doc in enumerate(self.docs)}
+            self.segments = state["segments"]
+        if os.path.exists(self._journal_path()):
+            good = 0
+            with open(self._journal_path(), "rb") as journal:
+                for line in journal:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("unterminated line")
+                        self._replay(json.loads(line))
+                    except ValueError:
+                        # A write cut short by a crash: the entries before it stand, the rest is cut
+                        # off so later lines are not appended after a broken one.
+                        with open(self._journal_path(), "r+b") as damaged:
+                            damaged.truncate(good)
+                        break
+                    good += len(line)
+        self.blocks = [self._resize(sparse.load_npz(os.path.join(self.path, name))) for name in self.segments]
+        self._index_blocks()
+
+    def _replay(self, entry: dict):
+        if "merge" in entry:
+            merged = len(entry["merge"])
+            if self.segments[-merged:] == entry["merge"]:
+                self.segments[-merged:] = [entry["segment"]]
+            return
+        if entry["doc"]["id"] in self.doc_rows:
+            return
+        self._add_terms(entry["terms"])
+        self.doc_rows[entry["doc"]["id"]] = len(self.docs)
+        self.docs.append(entry["doc"])
+        self.segments.append(entry["segment"])
+
+    def _append_journal(self, entry: dict):
+        with open(self._journal_path(), "a", encoding="utf-8") as journal:
+            journal.write(json.dumps(entry) + "\n")
+
+    def _write_segment(self, block) -> str:
+        name = f"segment-{time.time_ns()}.npz"
+        sparse.save_npz(os.path.join(self.path, name), block)
+        return name
+
+    def _resize(self, block):
+        block = block.tocsr()
+        block.resize((block.shape[0], len(self.terms)))
+        return block
+
+    def _index_blocks(self):
+        self._starts = list(itertools.accumulate((block.shape[0] for block in self.blocks), initial=0))[:-1]
+
+    def _merge(self):
+        """Size-tiered merging: the newest segment absorbs the one before it while it is at least as large."""
+        count = 1
+        while count < len(self.blocks) and self.blocks[-count - 1].shape[0] <= sum(
+                block.shape[0] for block in self.blocks[-count:]):
+            count += 1
+        if count == 1:
+            return
+        old_segments = self.segments[-count:]
+        block = sparse.vstack([self._resize(block) for block in self.blocks[-count:]], format="csr")
+        name = self._write_segment(block)
+        self._append_journal({"merge": old_segments, "segment": name})
+        self.blocks[-count:] = [block]
+        self.segments[-count:] = [name]
+        self._index_blocks()
+        for old in old_segments:
+            os.remove(os.path.join(self.path, old))
+
+    # --- Indexing ---
+    def add(self, doc_id: str, text: str, section: str, ticker: str = None) -> bool:
+        """Indexes one section. Returns False if `doc_id` is already indexed or the text has no terms."""
+        counts = tokenize(text)
+        with self._lock:
+            if doc_id in self.doc_rows or not counts:
+                return False
+            new_terms = self._add_terms(counts)
+            columns = np.fromiter((self.term_ids[term] for term in counts), dtype=np.int64, count=len(counts))
+            values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            row = sparse.csr_matrix((values, (np.zeros(len(counts), dtype=np.int64), columns)),
+                                    shape=(1, len(self.terms)))
+            doc = {"id": doc_id, "section": section, "ticker": ticker.upper() if ticker else None,
+                   "added_at": time.time()}
+            segment = self._write_segment(row)
+            self._append_journal({"terms": new_terms, "doc": doc, "segment": segment})
+            self.doc_rows[doc_id] = len(self.docs)
+            self.docs.append(doc)
+            self.segments.append(segment)
+            self.blocks.append(row)
+            self._starts.append(len(self.docs) - 1)
+            self._merge()
+            for (cached_section, cached_ticker), frequency in self._frequencies.items():
+                if cached_section == section and cached_ticker in (None, doc["ticker"]):
+                    frequency.add(row.indices, len(self.terms))
+        return True
+
+    def _row(self, row: int):
+        number = bisect.bisect_right(self._starts, row) - 1
+        return self._resize(self.blocks[number][row - self._starts[number]])
+
+    def _frequency(self, section: str, ticker: str):
+        """Document frequencies of the sections of one kind (of one ticker), cached and kept up to date by `add`."""
+        key = (section, ticker)
+        frequency = self._frequencies.get(key)
+        if frequency is not None:
+            self._frequencies.move_to_end(key)
+            frequency.fit(len(self.terms))
+            return frequency
+        frequency = DocumentFrequency(len(self.terms))
+        for block, start in zip(self.blocks, self._starts):
+            rows = [row for row in range(start, start + block.shape[0])
+                    if self.docs[row]["section"] == section and (ticker is None or self.docs[row]["ticker"] == ticker)]
+            if rows:
+                frequency.add_block(block[[row - start for row in rows]], len(self.terms))
+        self._frequencies[key] = frequency
+        if len(self._frequencies) > MAX_CACHED_FREQUENCIES:
+            self._frequencies.popitem(last=False)
+        return frequency
+
+    # --- Scoring ---
+    def top_terms(self, doc_id: str, top: int = 30, ticker: str = None) -> list:
+        """
+        The `top` most distinctive terms of an indexed section, as word cloud entries
+        {"text", "value"} with values scaled to 10-100. Terms are weighted by sublinear TF-IDF
+        against the other sections of the same kind, or only that ticker's if `ticker` is given.
+        """
+        with self._lock:
+            row = self.doc_rows.get(doc_id)
+            if row is None:
+                return []
+            doc = self.docs[row]
+            ticker = ticker.upper() if ticker else None
+            counts = self._row(row)
+            frequency = self._frequency(doc["section"], ticker)
+            documents = frequency.documents
+            document_frequency = frequency.counts[counts.indices].astype(np.float64)
+            terms = self.terms
+
+        if ticker is not None and doc["ticker"] != ticker:
+            # The section is scored against the ticker's sections plus itself.
+            documents += 1
+            document_frequency += 1
+        idf = np.log((1 + documents) / (1 + document_frequency)) + 1
+        scores = (1 + np.log(counts.data)) * idf
+        if scores.size == 0:
+            return []
+        best = np.argsort(-scores, kind="stable")[:top]
+        highest = scores[best[0]]
+        return [{"text": terms[counts.indices[i]], "value": int(round(10 + 90 * scores[i] / highest))}
+                for i in best]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "documents": len(self.docs),
+                "terms": len(self.terms),
+                "nonzeros": int(sum(block.nnz for block in self.blocks)),
+                "segments": len(self.segments),
+                "tickers": len({doc["ticker"] for doc in self.docs if doc["ticker"]}),
+            }
+
+
+class DocumentFrequency:
+    """Number of sections, and of sections containing each term, in one reference set of the index."""
+
+    def __init__(self, term_count: int):
+        self.documents = 0
+        self.counts = np.zeros(max(1, term_count), dtype=np.int32)
+
+    def fit(self, term_count: int):
+        if term_count > len(self.counts):
+            # Grown geometrically, so a growing vocabulary costs O(1) amortized per new term.
+            counts = np.zeros(max(term_count, 2 * len(self.counts)), dtype=np.int32)
+            counts[:len(self.counts)] = self.counts
+            self.counts = counts
+
+    def add(self, columns, term_count: int):
+        self.fit(term_count)
+        self.counts[columns] += 1
+        self.documents += 1
+
+    def add_block(self, block, term_count: int):
+        self.fit(term_count)
+        present = np.bincount(block.tocsr().indices, minlength=block.shape[1])
+        self.counts[:len(present)] += present.astype(np.int32)
+        self.documents += block.shape[0]
+
+def section_doc_id(pdf_hash: str, section: str) -> str:
+    return f"{pdf_hash}:{section}"
@@ -0,0 +1,176 @@
+import asyncio
+import importlib
+import json
+import threading
+import time
+from collections import Counter, deque
+
+import google.generativeai as genai
+
+import metrics
+from llm_scheduler import LLMScheduler, estimate_tokens
+
+# Latencies kept per (model, task) to derive the hedging threshold.
+LATENCY_WINDOW = 200
+
+
+def gemini_provider(model_name: str, generation_config: dict):
+    """The default provider: a Gemini model answering with JSON."""
+    return genai.GenerativeModel(model_name, generation_config=genai.types.GenerationConfig(**generation_config))
+
+
+def load_provider(spec: str):
+    """
+    A provider named as "module:attribute", e.g. a local stand-in for tests or a self-hosted
+    model. A provider is any callable `(model_name, generation_config) -> model` whose models
+    have `model_name` and `async generate_content_async(contents)`.
+    """
+    if not spec:
+        return gemini_provider
+    module, _colon, attribute = spec.partition(":")
+    return getattr(importlib.import_module(module), attribute or "provider")
+
+
+def parse_task_seconds(spec: str) -> dict:
+    """{task: seconds} from "kpi=30,tone=60"."""
+    deadlines = {}
+    for entry in (spec or "").split(","):
+        task, _equals, seconds = entry.partition("=")
+        if task.strip() and seconds.strip():
+            deadlines[task.strip()] = float(seconds)
+    return deadlines
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * (len(ordered) - 1) + 0.5))]
+
+
+class LLMClient:
+    """
+    Shared model layer for every analysis task. Models are created once per
+    (model, generation config) and reused; every call goes through the process-wide scheduler
+    with the task's deadline per attempt. With `hedge_percentile`, a call still running after
+    that percentile of the task's recent latencies is duplicated and the first answer wins.
+    Tasks in `fallback_tasks` that fail on the primary model are answered by `fallback_model`.
+    """
+
+    def __init__(self, scheduler: LLMScheduler, provider=gemini_provider, model: str = "gemini-1.5-pro-latest",
+                 fallback_model: str = None, fallback_tasks=(), deadline: float = 120.0, task_deadlines: dict = None,
+                 hedge_percentile: float = 0.0, hedge_min_samples: int = 20):
+        self.scheduler = scheduler
+        self.provider = provider
+        self.model_name = model
+        self.fallback_model = fallback_model
+        self.fallback_tasks = set(fallback_tasks)
+        self.deadline = deadline
+        self.task_deadlines = task_deadlines or {}
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._models = {}
+        self._models_lock = threading.Lock()
+        self._latencies = {}
+        self.events = Counter()
+
+    def model(self, schema: dict = None, model_name: str = None):
+        """The pooled model for `model_name` (default: the primary model) answering JSON, optionally with `schema`."""
+        config = {"response_mime_type": "application/json"}
+        if schema is not None:
+            config["response_schema"] = schema
+        key = (model_name or self.model_name, json.dumps(config, sort_keys=True))
+        with self._models_lock:
+            if key not in self._models:
+                self._models[key] = self.provider(key[0], config)
+            return self._models[key]
+
+    def deadline_for(self, label: str) -> float:
+        return self.task_deadlines.get(metrics.task_name(label), self.deadline)
+
+    def hedge_after(self, model, label: str):
+        """Seconds after which a call is hedged, or None while hedging is off or there are too few samples."""
+        if not self.hedge_percentile:
+            return None
+        latencies = self._latencies.get((model.model_name, metrics.task_name(label)))
+        if not latencies or len(latencies) < self.hedge_min_samples:
+            return None
+        return percentile(latencies, self.hedge_percentile / 100)
+
+    async def generate(self, contents: list, label: str, schema: dict = None):
+        """
+        Runs one JSON call for the task `label`. Returns (response, model name of the model
+        that answered).
+        """
+        model = self.model(schema)
+        try:
+            return await self._hedged(model, contents, label), model.model_name
+        except Exception as e:
+            task = metrics.task_name(label)
+            if not self.fallback_model or task not in self.fallback_tasks or self.fallback_model == self.model_name:
+                raise
+            print(f"--- LLM client: '{label}' failed on {self.model_name} ({e}), falling back to {self.fallback_model} ---")
+            self.events["fallback"] += 1
+            metrics.record_llm_event(label, "fallback")
+            fallback = self.model(schema, self.fallback_model)
+            return await self._attempt(fallback, contents, label), fallback.model_name
+
+    async def _attempt(self, model, contents: list, label: str, started: asyncio.Event = None):
+        window = self._latencies.setdefault((model.model_name, metrics.task_name(label)), deque(maxlen=LATENCY_WINDOW))
+
+        async def call():
+            if started is not None:
+                started.set()
+            begun = time.monotonic()
+            response = await model.generate_content_async(contents)
+            window.append(time.monotonic() - begun)
+            return response
+
+        return await self.scheduler.run(call, estimate_tokens(contents), label, self.deadline_for(label))
+
+    async def _hedged(self, model, contents: list, label: str):
+        threshold = self.hedge_after(model, label)
+        if threshold is None:
+            return await self._attempt(model, contents, label)
+        started = asyncio.Event()
+        primary = asyncio.create_task(self._attempt(model, contents, label, started))
+        admitted = asyncio.create_task(started.wait())
+        tasks = {primary, admitted}
+        try:
+            # The clock starts once the call is admitted, so waiting for quota never triggers a hedge.
+            await asyncio.wait({primary, admitted}, return_when=asyncio.FIRST_COMPLETED)
+            done, _pending = await asyncio.wait({primary}, timeout=threshold)
+            # A hedge only helps while there is spare quota; with calls queued it would only add load.
+            if done or self.scheduler.queue_depth:
+                return await primary
+            self.events["hedge"] += 1
+            metrics.record_llm_event(label, "hedge")
+            print(f"--- LLM client: '{label}' slower than {threshold:.1f}s, sending a hedged request ---")
+            hedge = asyncio.create_task(self._attempt(model, contents, label))
+            tasks.add(hedge)
+            pending, error = {primary, hedge}, None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.events["hedge_won"] += 1
+                            metrics.record_llm_event(label, "hedge_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "provider": getattr(self.provider, "__name__", type(self.provider).__name__),
+            "model": self.model_name,
+            "fallback_model": self.fallback_model,
+            "pooled_models": len(self._models),
+            "hedge_thresholds": {
+                f"{model_name}:{task}": round(percentile(latencies, self.hedge_percentile / 100), 3)
+                for (model_name, task), latencies in self._latencies.items()
+                if self.hedge_percentile and len(latencies) >= self.hedge_min_samples
+            },
+            **{event: self.events[event] for event in ("hedge", "hedge_won", "fallback")},
+        }
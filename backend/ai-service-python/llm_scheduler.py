@@ -0,0 +1,233 @@
+import asyncio
+import random
+import time
+from collections import Counter
+
+import metrics
+from prepared_filing import CHARS_PER_TOKEN
+
+
+def estimate_tokens(contents) -> int:
+    """Rough token estimate for a list of prompt parts (CHARS_PER_TOKEN characters per token)."""
+    if isinstance(contents, str):
+        contents = [contents]
+    return max(1, sum(len(part) for part in contents if isinstance(part, str)) // CHARS_PER_TOKEN)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True when the provider rejected the call because the quota is exhausted (HTTP 429)."""
+    if getattr(error, "code", None) == 429 or getattr(error, "status_code", None) == 429:
+        return True
+    if type(error).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    message = str(error).lower()
+    return "429" in message or "resource has been exhausted" in message or "quota" in message
+
+
+TRANSIENT_STATUS_CODES = (500, 502, 503, 504)
+TRANSIENT_ERROR_NAMES = ("ServiceUnavailable", "InternalServerError", "DeadlineExceeded", "GatewayTimeout",
+                         "BadGateway", "Aborted", "ServerError")
+
+
+def is_transient_error(error: Exception) -> bool:
+    """True for failures worth retrying right away: timeouts, dropped connections and 5xx answers."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    if getattr(error, "code", None) in TRANSIENT_STATUS_CODES or getattr(error, "status_code", None) in TRANSIENT_STATUS_CODES:
+        return True
+    return type(error).__name__ in TRANSIENT_ERROR_NAMES
+
+
+class TokenBucket:
+    """A bucket that refills continuously at `rate_per_minute` up to `capacity`."""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` can be taken. Requests larger than the bucket wait for a full bucket."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate_per_second
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control for LLM calls.
+    Every call waits (in FIFO order) until both the requests-per-minute and the
+    tokens-per-minute buckets have room, then runs concurrently with the others.
+    Calls are only delayed further when the provider answers with a 429; that pauses every call.
+    Timeouts and other transient errors are retried after a jittered back-off of that call alone.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, max_concurrency: int = 6,
+                 max_retries: int = 4, base_backoff: float = 2.0, max_transient_retries: int = 2,
+                 transient_backoff: float = 1.0):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_transient_retries = max_transient_retries
+        self.transient_backoff = transient_backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._admission_lock = asyncio.Lock()
+        self._paused_until = 0.0
+
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.transient_retries = 0
+        self.timed_out = 0
+        self.admissions = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.tokens_used = 0
+        self.tokens_by_task = Counter()
+
+    async def _acquire(self, estimated_tokens: int):
+        """Blocks until the call fits in both budgets and any 429 back-off has elapsed."""
+        async with self._admission_lock:
+            while True:
+                delay = max(
+                    self._paused_until - time.monotonic(),
+                    self.request_bucket.time_until(1),
+                    self.token_bucket.time_until(estimated_tokens),
+                )
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(estimated_tokens)
+
+    def _back_off(self, attempt: int) -> float:
+        delay = self.base_backoff * (2 ** attempt) + random.uniform(0, self.base_backoff)
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    async def run(self, call, estimated_tokens: int, label: str = "llm", timeout: float = None):
+        """
+        Runs `call` (a zero-argument coroutine factory) once it is admitted by the scheduler.
+        Retries with exponential back-off when the provider reports a rate limit, and with a
+        jittered back-off after transient errors. An attempt running longer than `timeout`
+        seconds is abandoned and counts as a transient error.
+        """
+        attempt = transient_attempt = 0
+        retry_delay = 0.0
+        while True:
+            if retry_delay:
+                # Slept outside the admission queue, so other calls are not held up.
+                await asyncio.sleep(retry_delay)
+                retry_delay = 0.0
+            enqueued_at = time.monotonic()
+            self.queue_depth += 1
+            try:
+                await self._acquire(estimated_tokens)
+                await self._semaphore.acquire()
+            finally:
+                self.queue_depth -= 1
+
+            waited = time.monotonic() - enqueued_at
+            self.admissions += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            metrics.record_llm_wait(label, waited)
+            if waited > 1:
+                print(f"--- Scheduler: '{label}' waited {waited:.1f}s for LLM quota ---")
+
+            self.in_flight += 1
+            started = time.monotonic()
+            try:
+                result = await (asyncio.wait_for(call(), timeout) if timeout else call())
+            except Exception as e:
+                if isinstance(e, (asyncio.TimeoutError, TimeoutError)):
+                    self.timed_out += 1
+                    metrics.record_llm_event(label, "timeout")
+                    print(f"--- Scheduler: '{label}' exceeded its {timeout:.0f}s deadline ---")
+                if is_rate_limit_error(e) and attempt < self.max_retries:
+                    self.rate_limited += 1
+                    self.token_bucket.refund(estimated_tokens)
+                    delay = self._back_off(attempt)
+                    metrics.record_llm_retry(label, delay)
+                    print(f"--- Scheduler: '{label}' hit a rate limit, backing off {delay:.1f}s ---")
+                    attempt += 1
+                    continue
+                if is_transient_error(e) and transient_attempt < self.max_transient_retries:
+                    self.transient_retries += 1
+                    self.token_bucket.refund(estimated_tokens)
+                    # Full jitter keeps calls that failed together from retrying together.
+                    retry_delay = random.uniform(0, self.transient_backoff * (2 ** transient_attempt))
+                    metrics.record_llm_retry(label, retry_delay)
+                    print(f"--- Scheduler: '{label}' failed ({type(e).__name__}), retrying in {retry_delay:.1f}s ---")
+                    transient_attempt += 1
+                    continue
+                self.failed += 1
+                metrics.record_llm_failure(label)
+                raise
+            finally:
+                self.in_flight -= 1
+                self._semaphore.release()
+
+            self.completed += 1
+            self._record_usage(result, estimated_tokens, label, time.monotonic() - started)
+            return result
+
+    def _record_usage(self, response, estimated_tokens: int, label: str = "llm", seconds: float = 0.0):
+        """Charges the token bucket for the real usage when the response reports it."""
+        usage = getattr(response, "usage_metadata", None)
+        actual = getattr(usage, "total_token_count", None) if usage is not None else None
+        input_tokens = getattr(usage, "prompt_token_count", None) or estimated_tokens
+        output_tokens = getattr(usage, "candidates_token_count", None) or (
+            max(0, actual - input_tokens) if actual else estimate_tokens(getattr(response, "text", "")))
+        metrics.record_llm_call(label, seconds, input_tokens, output_tokens)
+        # Chunked calls are labelled "task#n"; account them to the task.
+        task = label.split("#", 1)[0]
+        self.tokens_by_task[task] += actual or estimated_tokens
+        print(f"--- Scheduler: '{label}' used {actual or estimated_tokens} tokens{'' if actual else ' (estimated)'} ---")
+        if not actual:
+            self.tokens_used += estimated_tokens
+            return
+        self.tokens_used += actual
+        if actual > estimated_tokens:
+            self.token_bucket.consume(actual - estimated_tokens)
+        else:
+            self.token_bucket.refund(estimated_tokens - actual)
+
+    async def generate(self, model, contents, label: str = "llm", timeout: float = None):
+        """Schedules `model.generate_content_async(contents)`."""
+        return await self.run(lambda: model.generate_content_async(contents), estimate_tokens(contents), label, timeout)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "transient_retries": self.transient_retries,
+            "timed_out": self.timed_out,
+            "tokens_used": self.tokens_used,
+            "tokens_by_task": dict(self.tokens_by_task),
+            "average_wait_seconds": round(self.total_wait_seconds / self.admissions, 3) if self.admissions else 0.0,
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+            "paused_for_seconds": round(max(0.0, self._paused_until - time.monotonic()), 3),
+        }
@@ -1,12 +1,34 @@
 import os
 import json
 import asyncio
+import functools
+import time
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory,HarmBlockThreshold
 from dotenv import load_dotenv
-import re
-from fastapi import FastAPI, File, UploadFile, HTTPException
-import fitz  # PyMuPDF
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from contextlib import asynccontextmanager
+from llm_scheduler import LLMScheduler
+from llm_client import LLMClient, load_provider, parse_task_seconds
+from analysis_dag import AnalysisDAG, AnalysisNode
+from filing_index import StreamingFilingIndex
+from filing_artifacts import ArtifactStore
+from prepared_filing import PreparedFiling, SectionView, sha256_hex
+from pdf_extract import iter_pages, run_in_pool, shutdown_pool, spool_upload, warm_up_pool
+from statement_tables import STATEMENTS, extract_statement_tables
+from result_cache import ResultCache, current_document, prompt_version
+from job_queue import JobQueue, JobStore
+from ratios import compute_ratios
+from chunking import TASK_SECTIONS, chunk_spans, describe_chunks, merge_results, select_sections
+from risk_diff import diff_paragraphs
+from keyword_index import KeywordIndex, section_doc_id
+from pydantic import BaseModel
+import metrics
+from fused_analysis import FusableTask, fused_prompt, fused_schema, group_by_section, run_fused
+from batch import BatchDocument, contained_path, file_sha256, load_documents, read_completed, run_batch
+from section_history import CarryForward, SectionHistory
 
 #configuration
 load_dotenv()
@@ -15,135 +37,120 @@ if not GOOGLE_API_KEY:
     raise ValueError("GOOGLE_API_KEY not found")
 genai.configure(api_key=GOOGLE_API_KEY)
 
+# Shared by every AI task so the whole process stays inside the Gemini quota.
+scheduler = LLMScheduler(
+    requests_per_minute=int(os.getenv("LLM_REQUESTS_PER_MINUTE", "10")),
+    tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", "2000000")),
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "6")),
+    max_transient_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+)
+
+# Pooled models for every task. Each call attempt has a deadline (LLM_DEADLINE_SECONDS, or per
+# task in LLM_TASK_DEADLINES, e.g. "kpi=30,holistic_review=180"); LLM_HEDGE_PERCENTILE (e.g. 95)
+# duplicates calls slower than that percentile of the task's recent calls; tasks listed in
+# LLM_FALLBACK_TASKS are answered by LLM_FALLBACK_MODEL when the primary model fails.
+# LLM_PROVIDER ("module:callable") replaces Gemini, e.g. with a local stand-in.
+llm = LLMClient(
+    scheduler,
+    provider=load_provider(os.getenv("LLM_PROVIDER")),
+    model=os.getenv("LLM_MODEL", "gemini-1.5-pro-latest"),
+    fallback_model=os.getenv("LLM_FALLBACK_MODEL", "gemini-1.5-flash-latest"),
+    fallback_tasks=[task.strip() for task in os.getenv("LLM_FALLBACK_TASKS", "kpi").split(",") if task.strip()],
+    deadline=float(os.getenv("LLM_DEADLINE_SECONDS", "120")),
+    task_deadlines=parse_task_seconds(os.getenv("LLM_TASK_DEADLINES", "")),
+    hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0")),
+    hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+)
+
+DATA_DIR = os.getenv("AI_SERVICE_DATA_DIR", "data")
+result_cache = ResultCache(
+    os.path.join(DATA_DIR, "result_cache.sqlite3"),
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_MB", "256")) * 1024 * 1024,
+)
+# Compressed page texts and section index of every analyzed PDF, so the same filing is never parsed twice.
+artifact_store = ArtifactStore(
+    os.path.join(DATA_DIR, "artifacts"),
+    max_bytes=int(os.getenv("ARTIFACT_STORE_MAX_MB", "1024")) * 1024 * 1024,
+)
+
 # --- FastAPI App Initialization ---
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_up_pool()
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    shutdown_pool()
 
-# --- Parser for LAST match (Works for 10-K and 10-Q Risk Factors) ---
-def extract_last_match_section(full_text: str, start_pattern_str: str, end_pattern_str: str) -> str:
-    """
-    Extracts a section by finding the LAST occurrence of its start pattern.
-    """
-    try:
-        start_pattern = re.compile(start_pattern_str, re.IGNORECASE | re.DOTALL)
-        end_pattern = re.compile(end_pattern_str, re.IGNORECASE | re.DOTALL)
-
-        all_start_matches = list(start_pattern.finditer(full_text))
-        if not all_start_matches:
-            return ""
-        
-        # Use the last match to skip the Table of Contents
-        start_match = all_start_matches[-1]
-        start_index = start_match.start()
-
-        end_match = end_pattern.search(full_text, pos=start_index + 1)
-        if not end_match:
-            return full_text[start_index:].strip()
-
-        end_index = end_match.start()
-        return full_text[start_index:end_index].strip()
-    except Exception as e:
-        print(f"--- ERROR in last_match_parser: {e}")
-        return ""
+app = FastAPI(lifespan=lifespan)
 
-def extract_first_match_section(full_text: str, start_pattern_str: str, end_pattern_str: str) -> str:
-    """
-    Extracts a section by finding the FIRST occurrence of its start pattern.
-    This is specifically for 10-Q Management's Discussion (Item 2 in Part I).
-    """
+async def generate(contents: list, task: str, schema: dict = None):
+    """Runs a model call through the per-task result cache and the shared client."""
+    # Hashing the input and the SQLite queries run off the event loop; the thread inherits current_document.
+    cached = await asyncio.to_thread(result_cache.lookup, task, llm.model(schema).model_name, contents)
+    if cached is not None:
+        return cached
+    response, model_name = await llm.generate(contents, task, schema)
+    await asyncio.to_thread(result_cache.store, task, model_name, contents, response.text)
+    return response
+
+def parse_json(response, task: str):
+    """Parses a model answer, counting answers that are not valid JSON."""
     try:
-        start_pattern = re.compile(start_pattern_str, re.IGNORECASE | re.DOTALL)
-        end_pattern = re.compile(end_pattern_str, re.IGNORECASE | re.DOTALL)
-
-        # Use the first match, which is the one in Part I
-        start_match = start_pattern.search(full_text)
-        if not start_match:
-            return ""
-        
-        start_index = start_match.start()
-
-        end_match = end_pattern.search(full_text, pos=start_index + 1)
-        if not end_match:
-            return full_text[start_index:].strip()
-
-        end_index = end_match.start()
-        return full_text[start_index:end_index].strip()
-    except Exception as e:
-        print(f"--- ERROR in first_match_parser: {e}")
-        return ""
+        return json.loads(response.text)
+    except ValueError:
+        metrics.record_json_failure(task)
+        raise
 
+# Largest prompt input sent in one call; bigger inputs are split into chunks and map-reduced.
+TASK_TOKEN_BUDGET = int(os.getenv("TASK_TOKEN_BUDGET", "120000"))
 
-def extract_10q_mda_section(full_text: str, start_pattern_str: str, end_pattern_str: str) -> str:
+async def generate_json_chunked(prompt: str, view, task: str, schema: dict = None):
     """
-    Specifically for 10-Q MD&A. It first finds the end of the Table of Contents,
-    then finds the FIRST match of the pattern in the report body.
+    Runs `prompt` over the sanitized text of `view` and parses the JSON answer (shaped by
+    `schema` when given). Text over
+    TASK_TOKEN_BUDGET is split at paragraph breaks of the raw text, each chunk is analyzed
+    separately and the answers are merged.
     """
-    try:
-        # Step 1: Find the end of the Table of Contents.
-        # A reliable marker is the last occurrence of "Part I" in the TOC area.
-        toc_end_pattern = re.compile(r"part\s+i", re.IGNORECASE | re.DOTALL)
-        toc_matches = list(toc_end_pattern.finditer(full_text[:5000])) # Search first ~5 pages
-        
-        content_start_index = 0
-        if toc_matches:
-            # The real content starts after the last TOC mention of "Part I"
-            content_start_index = toc_matches[-1].end()
-        
-        report_body_text = full_text[content_start_index:]
-
-        # Step 2: Find the FIRST match of the MD&A pattern within the report body.
-        start_pattern = re.compile(start_pattern_str, re.IGNORECASE | re.DOTALL)
-        end_pattern = re.compile(end_pattern_str, re.IGNORECASE | re.DOTALL)
-
-        start_match = start_pattern.search(report_body_text)
-        if not start_match:
-            return ""
-        
-        start_index = start_match.start()
-
-        end_match = end_pattern.search(report_body_text, pos=start_index + 1)
-        if not end_match:
-            return report_body_text[start_index:].strip()
-
-        end_index = end_match.start()
-        return report_body_text[start_index:end_index].strip()
-    except Exception as e:
-        print(f"--- ERROR in extract_10q_mda_section: {e}")
-        return ""
-    
-def sanitize_text_for_ai(text: str) -> str:
-    """A more aggressive function to clean text for AI JSON generation."""
-    if not text:
-        return ""
-    # Replace backslashes with a safe character (like a space)
-    text = text.replace('\\', ' ')
-    # Replace double quotes with single quotes
-    text = text.replace('"', "'")
-    # Remove characters that are invalid in JSON strings and other control chars
-    # This regex removes characters in the C0 and C1 control blocks, plus backspace.
-    text = re.sub(r'[\x00-\x1F\x7F-\x9F\x08]', ' ', text)
-    return text
- 
-async def get_kpi_analysis(full_text:str):
-    print('--AI Task: Extracting KPIs--')
-    prompt="""
+    clean_text = view.clean_text
+    spans = chunk_spans(view.text, TASK_TOKEN_BUDGET)
+    if len(spans) <= 1:
+        response = await generate([prompt, clean_text], task, schema)
+        return parse_json(response, task)
+    # Sanitizing keeps every offset, so the raw-text cut points apply to the clean text.
+    chunks = [clean_text[start:end] for start, end in spans]
+    print(f"--- '{task}' input split into {len(chunks)} chunks (~{describe_chunks(chunks)} tokens) ---")
+    responses = await asyncio.gather(*(
+        generate([prompt, chunk], f"{task}#{number}", schema) for number, chunk in enumerate(chunks)
+    ))
+    return merge_results([parse_json(response, task) for response in responses])
+
+# The KPI task reads at most this much of the statements (or of the opening pages).
+KPI_CONTEXT_CHARS = 150000
+
+KPI_PROMPT = """
     You are a financial analyst. From the provided financial report text, extract the exact values for
     Total Revenue, Net Income, and Diluted Earnings Per Share (EPS).
     Respond ONLY with a single, valid JSON object with three keys: "revenue", "netIncome", "eps".
     The values should be strings representing the primary figures (e.g., "$1,175 million", "1.31").
     If a value cannot be found, use "N/A".
     """
+
+@metrics.timed("task:key_metrics")
+async def get_kpi_analysis(financial_statements_text: SectionView, report_head: SectionView):
+    print('--AI Task: Extracting KPIs--')
     try:
-        model=genai.GenerativeModel('gemini-1.5-pro-latest',generation_config=genai.types.GenerationConfig(response_mime_type="application/json"))
-        # clean_text = sanitize_text_for_ai(full_text[:80000])
-        response=await model.generate_content_async([prompt,full_text[:150000]])
-        return json.loads(response.text)
+        # The figures live in the statements; without them, fall back to the opening pages.
+        source = financial_statements_text or report_head
+        return await generate_json_chunked(KPI_PROMPT, source.prefix(KPI_CONTEXT_CHARS), "kpi")
     except Exception as e:
         print(f'--Error in KPI Aalysis:{e}')
+        metrics.record_task_error("kpi")
         return {"revenue": "Error", "netIncome": "Error", "eps": "Error"}
 
-async def get_tone_analysis(mda_text: str):
-    print("--- AI Task: Analyzing Management Tone ---")
-    prompt = """
+# --- MD&A analyses ---
+# Prompts and answer schemas are module level so the analyses can also run fused in one call.
+TONE_PROMPT = """
 You are an expert in financial linguistics. Analyze the tone of the following "Management's Discussion & Analysis" section.
     Is the tone more optimistic, neutral, or cautious than a standard report?
 
@@ -151,58 +158,99 @@ You are an expert in financial linguistics. Analyze the tone of the following "M
 
     Respond ONLY with a JSON object with two keys: "summary" (a one-sentence summary of the tone) and "cautiousness_score" (a score from 1 to 10, where 10 is extremely cautious).
     """
+TONE_SCHEMA = {
+    "type": "object",
+    "properties": {"summary": {"type": "string"}, "cautiousness_score": {"type": "number"}},
+    "required": ["summary", "cautiousness_score"],
+}
+
+COMPETITOR_PROMPT = """
+    You are a strategic analyst. Read the following "Management's Discussion & Analysis" section.
+    Identify all mentions of specific competing companies.
+    For each competitor found, provide a brief, three-sentence summary of the context in which they were mentioned (e.g., "competing on price", "mentioned as a market leader", "partner in a new venture").
+    Respond ONLY with a single, valid JSON object with one key: "competitors". Ensure all special characters within the summary text, such as backslashes and quotes, are correctly escaped for JSON formatting.
+    The value of "competitors" should be an array of objects, where each object has two keys: "name" (the competitor's name) and "context" (the summary).
+    If no competitors are mentioned, return an empty array.
+    IMPORTANT: Do not use any unicode escape sequences like \\u0024 in your response. Use the actual characters like $.
+    """
+COMPETITOR_SCHEMA = {
+    "type": "object",
+    "properties": {"competitors": {"type": "array", "items": {
+        "type": "object",
+        "properties": {"name": {"type": "string"}, "context": {"type": "string"}},
+        "required": ["name", "context"],
+    }}},
+    "required": ["competitors"],
+}
+
+GUIDANCE_PROMPT = """
+    You are a quantitative analyst specializing in parsing forward-looking statements.
+    Read the following "Management's Discussion & Analysis" section and identify any statement that provides guidance or an outlook on future performance.
+    For each statement found, classify its sentiment as 'Positive', 'Neutral', or 'Negative'.
+    IMPORTANT: Do not use any unicode escape sequences like \\u0024 in your response. Use the actual characters like $.
+
+    Respond ONLY with a single, valid JSON object with one key: "guidance".
+    The value of "guidance" should be an array of objects, where each object has two keys: "statement" (the quoted forward-looking statement) and "sentiment" (the classification).
+    
+    Example: [{"statement": "We expect net sales to grow between 7% and 11%", "sentiment": "Positive"}]
+    
+    If no forward-looking statements are found, return an empty array.
+    """
+GUIDANCE_SCHEMA = {
+    "type": "object",
+    "properties": {"guidance": {"type": "array", "items": {
+        "type": "object",
+        "properties": {"statement": {"type": "string"}, "sentiment": {"type": "string"}},
+        "required": ["statement", "sentiment"],
+    }}},
+    "required": ["guidance"],
+}
+
+@metrics.timed("task:management_tone")
+async def get_tone_analysis(mda_text: SectionView):
+    print("--- AI Task: Analyzing Management Tone ---")
     try:
-        model = genai.GenerativeModel('gemini-1.5-pro-latest', generation_config=genai.types.GenerationConfig(response_mime_type="application/json"))
-        clean_text = sanitize_text_for_ai(mda_text)
-        response = await model.generate_content_async([prompt, clean_text])
-        return json.loads(response.text)
+        clean_text = mda_text.clean_text
+        response = await generate([TONE_PROMPT, clean_text], "tone")
+        return parse_json(response, "tone")
     except Exception as e:
         print(f"--- ERROR in Tone Analysis: {e}")
+        metrics.record_task_error("tone")
         return {"summary": "Error analyzing tone.", "cautiousness_score": -1}
 
-async def get_risk_summary(risk_text: str):
-    print("--- AI Task: Summarizing Risks ---")
-    prompt = """
+RISK_PROMPT = """
     You are a compliance officer. From the "Risk Factors" section provided, identify and summarize the top 3 most significant or newly emphasized risks.
     Respond ONLY with a single, valid JSON object with one key: "top_risks", which should be an array of strings. Each string should be a one-sentence summary of a key risk.
     IMPORTANT: Do not use any unicode escape sequences like \\u0024 in your response. Use the actual characters like $.
 
     """
+
+@metrics.timed("task:risk_summary")
+async def get_risk_summary(risk_text: SectionView):
+    print("--- AI Task: Summarizing Risks ---")
     try:
-        model = genai.GenerativeModel('gemini-1.5-pro-latest', generation_config=genai.types.GenerationConfig(response_mime_type="application/json"))
-        clean_text = sanitize_text_for_ai(risk_text)
-        response = await model.generate_content_async([prompt, clean_text])
-        return json.loads(response.text)
+        clean_text = risk_text.clean_text
+        response = await generate([RISK_PROMPT, clean_text], "risk")
+        return parse_json(response, "risk")
     except Exception as e:
         print(f"--- ERROR in Risk Summary: {e}")
+        metrics.record_task_error("risk")
         return {"top_risks": ["Error summarizing risks."]}
     
-async def get_competitor_analysis(mda_text: str):
+@metrics.timed("task:competitor_analysis")
+async def get_competitor_analysis(mda_text: SectionView):
     """Uses AI to identify competitors and the context of their mention."""
     print("--- AI Task: Analyzing Competitive Landscape ---")
-    prompt = """
-    You are a strategic analyst. Read the following "Management's Discussion & Analysis" section.
-    Identify all mentions of specific competing companies.
-    For each competitor found, provide a brief, three-sentence summary of the context in which they were mentioned (e.g., "competing on price", "mentioned as a market leader", "partner in a new venture").
-    Respond ONLY with a single, valid JSON object with one key: "competitors". Ensure all special characters within the summary text, such as backslashes and quotes, are correctly escaped for JSON formatting.
-    The value of "competitors" should be an array of objects, where each object has two keys: "name" (the competitor's name) and "context" (the summary).
-    If no competitors are mentioned, return an empty array.
-    IMPORTANT: Do not use any unicode escape sequences like \\u0024 in your response. Use the actual characters like $.
-    """
     try:
-        model = genai.GenerativeModel('gemini-1.5-pro-latest', generation_config=genai.types.GenerationConfig(response_mime_type="application/json"))
-        clean_text = sanitize_text_for_ai(mda_text)
-        response = await model.generate_content_async([prompt, clean_text])
-        print(json.loads(response.text))
-        return json.loads(response.text)
+        clean_text = mda_text.clean_text
+        response = await generate([COMPETITOR_PROMPT, clean_text], "competitor")
+        return parse_json(response, "competitor")
     except Exception as e:
         print(f"--- ERROR in Competitor Analysis: {e}")
+        metrics.record_task_error("competitor")
         return {"competitors": [{"name": "Error", "context": "Failed to analyze competitive landscape."}]}
     
-async def get_legal_summary(full_text: str):
-    """Finds and summarizes the Legal Proceedings section from a focused chunk of the document."""
-    print("--- AI Task: Summarizing Legal Proceedings ---")
-    prompt = """
+LEGAL_PROMPT = """
     You are a legal analyst. First, find the "Legal Proceedings" section in the provided financial report text.
     Once found, read the section and provide a concise summary of the key legal matters discussed.
     Focus on the main parties involved and the core issue of each proceeding.
@@ -212,79 +260,108 @@ async def get_legal_summary(full_text: str):
     IMPORTANT: Do not use any unicode escape sequences like \\u0024 in your response. Use the actual characters like $.
     If the section does not exist, return an empty array.
     """
+
+@metrics.timed("task:legal_summary")
+async def get_legal_summary(legal_proceedings_text: SectionView, filing: PreparedFiling):
+    """Summarizes the Legal Proceedings section, or searches the whole document if it was not located."""
+    print("--- AI Task: Summarizing Legal Proceedings ---")
     try:
-        model = genai.GenerativeModel('gemini-1.5-pro-latest', generation_config=genai.types.GenerationConfig(response_mime_type="application/json"))
-        
-        start_char = 15000  # Skip the first ~15 pages of boilerplate
-        end_char = 150000 # Search within the next ~135 pages
-        # middle_chunk = full_text[start_char:end_char]
-        
-        clean_text = sanitize_text_for_ai(full_text)
-        response = await model.generate_content_async([prompt, clean_text])
-        return json.loads(response.text)
+        return await generate_json_chunked(LEGAL_PROMPT, legal_proceedings_text or filing.whole(), "legal")
     except Exception as e:
         print(f"--- ERROR in Legal Summary: {e}")
+        metrics.record_task_error("legal")
         return {"legal_summary": ["Error summarizing legal proceedings."]}
     
-async def get_guidance_analysis(mda_text: str):
+@metrics.timed("task:guidance_analysis")
+async def get_guidance_analysis(mda_text: SectionView):
     """Identifies and classifies forward-looking statements."""
     print("--- AI Task: Analyzing Guidance & Outlook ---")
-    prompt = """
-    You are a quantitative analyst specializing in parsing forward-looking statements.
-    Read the following "Management's Discussion & Analysis" section and identify any statement that provides guidance or an outlook on future performance.
-    For each statement found, classify its sentiment as 'Positive', 'Neutral', or 'Negative'.
-    IMPORTANT: Do not use any unicode escape sequences like \\u0024 in your response. Use the actual characters like $.
-
-    Respond ONLY with a single, valid JSON object with one key: "guidance".
-    The value of "guidance" should be an array of objects, where each object has two keys: "statement" (the quoted forward-looking statement) and "sentiment" (the classification).
-    
-    Example: [{"statement": "We expect net sales to grow between 7% and 11%", "sentiment": "Positive"}]
-    
-    If no forward-looking statements are found, return an empty array.
-    """
     try:
-        model = genai.GenerativeModel('gemini-1.5-pro-latest', generation_config=genai.types.GenerationConfig(response_mime_type="application/json"))
-        clean_text = sanitize_text_for_ai(mda_text)
-        response = await model.generate_content_async([prompt, clean_text])
-        return json.loads(response.text)
+        clean_text = mda_text.clean_text
+        response = await generate([GUIDANCE_PROMPT, clean_text], "guidance")
+        return parse_json(response, "guidance")
     except Exception as e:
         print(f"--- ERROR in Guidance Analysis: {e}")
+        metrics.record_task_error("guidance")
         return {"guidance": [{"statement": "Error analyzing guidance.", "sentiment": "Error"}]}
 
-async def get_financial_statements(financial_statements_text: str):
-    """Extracts the three core financial statements from a pre-parsed text block."""
-    print("--- AI Task: Deconstructing Financial Statements ---")
-    prompt = """
+# Statements parsed from the PDF layout with at least this confidence are not sent to the model.
+LOCAL_STATEMENTS_MIN_CONFIDENCE = float(os.getenv("LOCAL_STATEMENTS_MIN_CONFIDENCE", "0.8"))
+STATEMENT_TITLES = {
+    "income_statement": "Consolidated Statements of Operations (or Income Statement)",
+    "balance_sheet": "Consolidated Balance Sheets",
+    "cash_flow_statement": "Consolidated Statements of Cash Flows",
+}
+
+async def locate_statement_tables(path: str, statements_section) -> dict:
+    """Parses the statement tables on the pages of the statements section, in the PDF worker pool."""
+    try:
+        section = await statements_section
+        if not section:
+            return {}
+        first, last = section.page_range()
+        with metrics.stage("statement_tables"):
+            return await run_in_pool(extract_statement_tables, path, first, last + 1)
+    except Exception as e:
+        print(f"--- ERROR in statement table extraction: {e}")
+        return {}
+
+# Filled in with the statements left to the model.
+FINANCIAL_STATEMENTS_PROMPT = """
     You are an expert financial data extraction bot. The following text contains the core financial statements from a report.
-    Your task is to parse the three main statements:
-    1. Consolidated Statements of Operations (or Income Statement)
-    2. Consolidated Balance Sheets
-    3. Consolidated Statements of Cash Flows
+    Your task is to parse {subject}:
+    {listing}
 
     For each statement, extract the key line items and their values for the two most recent periods presented.
     
-    Respond ONLY with a single, valid JSON object with three main keys: "income_statement", "balance_sheet", and "cash_flow_statement".
+    Respond ONLY with a single, valid JSON object with {count} main key(s): {keys}.
     Each key should contain an array of objects, where each object has three keys: "item" (the line item name), "current_period", and "previous_period".
     
     If a statement cannot be found, return an empty array for that key.
     """
+
+@metrics.timed("task:financial_statements")
+async def get_financial_statements(financial_statements_text: SectionView, statement_tables: dict):
+    """
+    Extracts the three core financial statements. Statements the layout parser read with enough
+    confidence are used as is; only the others are extracted by the model from the section text.
+    """
+    print("--- AI Task: Deconstructing Financial Statements ---")
+    statements = {}
+    for statement in STATEMENTS:
+        table = (statement_tables or {}).get(statement)
+        if table and table["confidence"] >= LOCAL_STATEMENTS_MIN_CONFIDENCE:
+            statements[statement] = table["rows"]
+            metrics.record_statement_source(statement, "layout")
+    missing = [statement for statement in STATEMENTS if statement not in statements]
+    print(f"--- Financial statements: {len(statements)} parsed from the layout"
+          + (f", {', '.join(missing)} left to the model" if missing else "") + " ---")
+    if not missing:
+        return statements
+
+    listing = "\n    ".join(f"{number}. {STATEMENT_TITLES[statement]}" for number, statement in enumerate(missing, 1))
+    keys = ", ".join(f'"{statement}"' for statement in missing)
+    prompt = FINANCIAL_STATEMENTS_PROMPT.format(subject="these statements" if len(missing) > 1 else "this statement",
+                                                listing=listing, count=len(missing), keys=keys)
     try:
-        model = genai.GenerativeModel('gemini-1.5-pro-latest', generation_config=genai.types.GenerationConfig(response_mime_type="application/json"))
-        clean_text = sanitize_text_for_ai(financial_statements_text)
-        response = await model.generate_content_async([prompt, clean_text])
-        return json.loads(response.text)
+        clean_text = financial_statements_text.clean_text
+        response = await generate([prompt, clean_text], "financial_statements")
+        extracted = parse_json(response, "financial_statements")
+        for statement in missing:
+            statements[statement] = extracted.get(statement, [])
+            metrics.record_statement_source(statement, "llm")
+        return statements
     except Exception as e:
         print(f"--- ERROR in Financial Statement Deconstruction: {e}")
-        return {"income_statement": [], "balance_sheet": [], "cash_flow_statement": []}
+        metrics.record_task_error("financial_statements")
+        if statements:
+            # The statements read from the layout still feed the ratios.
+            return {**statements, **{statement: [] for statement in missing}}
+        # Re-raised so the pipeline falls back to empty statements and cancels the ratio task.
+        raise
 
 
-async def get_holistic_review(full_text: str):
-    """
-    Performs multiple full-document analyses in a single, efficient AI call.
-    It detects red flags and governance changes simultaneously.
-    """
-    print("--- AI Task: Performing Holistic Review (Red Flags & Governance) ---")
-    prompt = """
+HOLISTIC_PROMPT = """
     You are an expert forensic accountant and corporate governance analyst. Your task is to scan the entire provided financial report text for two types of information:
     
     1.  **Potential Red Flags:** Your task is to scan the entire provided financial report text for potential anomalies, inconsistencies, or red flags.
@@ -301,19 +378,22 @@ async def get_holistic_review(full_text: str):
     Each key should contain an array of strings. Each string should be a concise summary of a single finding.
     If no items are found for a category, return an empty array for that key.
     """
+
+@metrics.timed("task:holistic_review")
+async def get_holistic_review(filing: PreparedFiling):
+    """
+    Performs multiple full-document analyses in a single, efficient AI call.
+    It detects red flags and governance changes simultaneously.
+    """
+    print("--- AI Task: Performing Holistic Review (Red Flags & Governance) ---")
     try:
-        model = genai.GenerativeModel('gemini-1.5-pro-latest', generation_config=genai.types.GenerationConfig(response_mime_type="application/json"))
-        clean_text = sanitize_text_for_ai(full_text)
-        response = await model.generate_content_async([prompt, clean_text])
-        return json.loads(response.text)
+        return await generate_json_chunked(HOLISTIC_PROMPT, select_sections(filing, "holistic_review"), "holistic_review")
     except Exception as e:
         print(f"--- ERROR in Holistic Review: {e}")
+        metrics.record_task_error("holistic_review")
         return {"red_flags": ["Error detecting red flags."], "governance_changes": ["Error analyzing governance changes."]}
     
-async def get_deep_qualitative_analysis(full_text: str):
-    """Finds and extracts details about the company's debt schedule and covenants."""
-    print("--- AI Task: Deconstructing Debt & Covenants ---")
-    prompt = """
+DEEP_QUALITATIVE_PROMPT = """
     You are an expert financial analyst with specialties in credit and ESG. Your task is to scan the provided financial report text for two types of information:
     1.  **Debt Schedule & Debt Covenants:** Find the table or section detailing the company's term debt. Extract the maturity year and the principal amount for each future year listed. Find any sentences that describe specific rules or covenants the company must follow related to its debt (e.g., "limit the aggregate amount of secured indebtedness," "consolidated net interest expense ratio cannot be less than 2.20 to 1.0").
     2. **ESG Mentions:**  Your task is to carefully scan the provided financial report text for any statements related to ESG initiatives or risks.
@@ -330,53 +410,31 @@ async def get_deep_qualitative_analysis(full_text: str):
 
     If either type of information is not found, return an empty array for that key.
     """
+
+@metrics.timed("task:deep_qualitative")
+async def get_deep_qualitative_analysis(filing: PreparedFiling):
+    """Finds and extracts details about the company's debt schedule and covenants."""
+    print("--- AI Task: Deconstructing Debt & Covenants ---")
     try:
-        model = genai.GenerativeModel('gemini-1.5-pro-latest', generation_config=genai.types.GenerationConfig(response_mime_type="application/json"))
-        # This task requires a large context to find these specific details
-        clean_text = sanitize_text_for_ai(full_text)
-        response = await model.generate_content_async([prompt, clean_text])
-        return json.loads(response.text)
+        # Only the business, MD&A and statements sections carry debt and ESG details.
+        return await generate_json_chunked(DEEP_QUALITATIVE_PROMPT, select_sections(filing, "deep_qualitative"), "deep_qualitative")
     except Exception as e:
         print(f"--- ERROR in Debt Deconstruction: {e}")
+        metrics.record_task_error("deep_qualitative")
         return {"debt_schedule": [], "covenants": []}
     
+@metrics.timed("task:financial_ratios")
 async def calculate_financial_ratios(financial_statements_json: dict):
-    """Calculates key financial ratios from the structured statement data."""
-    print("--- AI Task: Calculating Financial Ratios ---")
-    prompt = """
-    You are an expert financial analyst. Based on the provided JSON data from a company's financial statements, calculate the following key financial ratios for the 'current_period'.
-    - Gross Margin %
-    - Operating Margin %
-    - Net Profit Margin %
-    - Debt-to-Equity Ratio
-
-    Use the following formulas and be precise:
-    - Gross Margin % = (Gross margin / Total net sales) * 100
-    - Operating Margin % = (Operating income / Total net sales) * 100
-    - Net Profit Margin % = (Net income / Total net sales) * 100
-    - Debt-to-Equity Ratio = (Total liabilities / Total shareholders' equity)
-
-    Extract the necessary numbers from the 'income_statement' and 'balance_sheet' arrays in the provided JSON. The numbers are strings with commas, which you must parse correctly.
-    Present the results as percentages rounded to two decimal places, or as a ratio rounded to two decimal places for Debt-to-Equity.
-
-    Respond ONLY with a single, valid JSON object with one key: "ratios".
-    The value should be an array of objects, where each object has two keys: "name" (the ratio's name) and "value" (the calculated string value, e.g., "44.12%", "1.52").
-
-    If you cannot calculate a ratio because a specific line item is missing, omit it from the final array.
-    """
+    """Calculates key financial ratios locally from the structured statement data."""
+    print("--- Task: Calculating Financial Ratios (local) ---")
     try:
-        model = genai.GenerativeModel('gemini-1.5-pro-latest', generation_config=genai.types.GenerationConfig(response_mime_type="application/json"))
-        # Convert the dict to a JSON string to send to the model
-        json_input = json.dumps(financial_statements_json)
-        response = await model.generate_content_async([prompt, json_input])
-        return json.loads(response.text)
+        return compute_ratios(financial_statements_json)
     except Exception as e:
         print(f"--- ERROR in Ratio Analysis: {e}")
+        metrics.record_task_error("financial_ratios")
         return {"ratios": []}
-async def summarize_footnotes(footnotes_text: str):
-    """Creates a summarized index of the key topics in the financial footnotes."""
-    print("--- AI Task: Summarizing Financial Footnotes ---")
-    prompt = """
+
+FOOTNOTE_PROMPT = """
     You are a senior auditor. The following text contains the "Notes to Consolidated Financial Statements" from a financial report.
     Your task is to read this entire section and create a summarized index of the key topics discussed.
     For each major topic (e.g., "Note 1 - Summary of Significant Accounting Policies", "Note 4 - Financial Instruments", "Note 9 - Debt"), provide a concise, one or two-sentence summary of the most important information in that note.
@@ -386,152 +444,701 @@ async def summarize_footnotes(footnotes_text: str):
     
     If the provided text is empty or does not contain footnotes, return an empty array.
     """
+
+@metrics.timed("task:footnote_summary")
+async def summarize_footnotes(footnotes_text: SectionView):
+    """Creates a summarized index of the key topics in the financial footnotes."""
+    print("--- AI Task: Summarizing Financial Footnotes ---")
     try:
-        model = genai.GenerativeModel('gemini-1.5-pro-latest', generation_config=genai.types.GenerationConfig(response_mime_type="application/json"))
-        clean_text = sanitize_text_for_ai(footnotes_text)
-        response = await model.generate_content_async([prompt, clean_text])
-        return json.loads(response.text)
+        clean_text = footnotes_text.clean_text
+        response = await generate([FOOTNOTE_PROMPT, clean_text], "footnotes")
+        return parse_json(response, "footnotes")
     except Exception as e:
         print(f"--- ERROR in Footnote Summarization: {e}")
+        metrics.record_task_error("footnotes")
         return {"footnote_summary": []}
     
+# --- Analysis pipeline ---
+# Each node starts as soon as its inputs are ready, so the end-to-end latency is the
+# critical path (statements -> ratios) rather than the sum of all calls.
+SECTION_NAMES = ("mda_text", "risk_factors_text", "financial_statements_text", "footnotes_text", "legal_proceedings_text")
+ANALYSIS_SOURCES = ("filing", "report_head", "statement_tables") + SECTION_NAMES
+EMPTY_STATEMENTS = {"income_statement": [], "balance_sheet": [], "cash_flow_statement": []}
+
+# Analyses that read a single section. With FUSED_ANALYSIS=true, those sharing a section run as
+# one structured-output call, with per-field fallback to their individual calls.
+FUSABLE_TASKS = [
+    FusableTask("management_tone", "mda_text", TONE_PROMPT, TONE_SCHEMA, get_tone_analysis,
+                fallback={"summary": "N/A", "cautiousness_score": 0}),
+    FusableTask("competitor_analysis", "mda_text", COMPETITOR_PROMPT, COMPETITOR_SCHEMA, get_competitor_analysis,
+                fallback={"competitors": []}),
+    FusableTask("guidance_analysis", "mda_text", GUIDANCE_PROMPT, GUIDANCE_SCHEMA, get_guidance_analysis,
+                fallback={"guidance": []}),
+]
+FUSED_ANALYSIS = os.getenv("FUSED_ANALYSIS", "false").lower() == "true"
+FUSED_NODE_PREFIX = "fused:"
+
+async def run_fused_section(tasks: list, section: SectionView) -> dict:
+    """Runs `tasks` over one section in a single call; returns {task name: result}."""
+    label = FUSED_NODE_PREFIX + "+".join(task.name for task in tasks)
+    print(f"--- AI Task: Fused analysis ({', '.join(task.name for task in tasks)}) ---")
+
+    async def generate_json(prompt: str, schema: dict):
+        return await generate_json_chunked(prompt, section, label, schema)
+
+    return await run_fused(tasks, section, generate_json)
+
+def section_task_nodes(tasks: list, fused: bool) -> list:
+    nodes = []
+    for section, group in group_by_section(tasks).items():
+        if fused and len(group) > 1:
+            name = FUSED_NODE_PREFIX + section
+            nodes.append(AnalysisNode(name, metrics.timed(f"task:{name}")(functools.partial(run_fused_section, group)),
+                                      inputs=(section,), required=(section,),
+                                      fallback={task.name: task.fallback for task in group}))
+        else:
+            nodes.extend(AnalysisNode(task.name, task.run, inputs=(section,), required=(section,), fallback=task.fallback)
+                         for task in group)
+    return nodes
+
+ANALYSIS_DAG = AnalysisDAG([
+    AnalysisNode("key_metrics", get_kpi_analysis, inputs=("financial_statements_text", "report_head"),
+                 fallback={"revenue": "Error", "netIncome": "Error", "eps": "Error"}),
+    *section_task_nodes(FUSABLE_TASKS, FUSED_ANALYSIS),
+    AnalysisNode("risk_summary", get_risk_summary, inputs=("risk_factors_text",), required=("risk_factors_text",),
+                 fallback={"top_risks": ["N/A"]}),
+    AnalysisNode("legal_summary", get_legal_summary, inputs=("legal_proceedings_text", "filing"),
+                 fallback={"legal_summary": []}),
+    AnalysisNode("financial_statements", get_financial_statements, inputs=("financial_statements_text", "statement_tables"),
+                 required=("financial_statements_text",), fallback=EMPTY_STATEMENTS),
+    AnalysisNode("financial_ratios", calculate_financial_ratios, inputs=("financial_statements",),
+                 required=("financial_statements",), fallback={"ratios": []}),
+    AnalysisNode("holistic_review", get_holistic_review, inputs=("filing",),
+                 fallback={"red_flags": [], "governance_changes": []}),
+    AnalysisNode("deep_qualitative", get_deep_qualitative_analysis, inputs=("filing",),
+                 fallback={"debt_details": {}, "esg_analysis": {}}),
+    AnalysisNode("footnote_summary", summarize_footnotes, inputs=("footnotes_text",), required=("footnotes_text",),
+                 fallback={}),
+], sources=ANALYSIS_SOURCES)
+
+# Which Item (and Part) holds each section, per form type. Footnotes come from the statements section.
+SECTION_SPECS = {
+    "10-K": {"risk_factors_text": ("1A", None), "mda_text": ("7", None), "financial_statements_text": ("8", None),
+             "legal_proceedings_text": ("3", None)},
+    "10-Q": {"risk_factors_text": ("1A", "II"), "mda_text": ("2", "I"), "financial_statements_text": ("1", "I"),
+             "legal_proceedings_text": ("1", "II")},
+}
+
+async def ingest_filing(path: str, index: StreamingFilingIndex):
+    """Feeds extracted pages into the streaming index as the PDF workers produce them."""
+    started = time.perf_counter()
+    parsing_seconds = 0.0
+    try:
+        async for page in iter_pages(path):
+            parse_started = time.perf_counter()
+            index.add_page(page)
+            parsing_seconds += time.perf_counter() - parse_started
+        # Extraction and section detection are interleaved; parsing time is reported on its own.
+        metrics.record_stage("pdf_extract", time.perf_counter() - started - parsing_seconds)
+        if not any(page.strip() for page in index.pages):
+            index.fail(HTTPException(status_code=400, detail="Could not extract text from PDF."))
+            return
+        parse_started = time.perf_counter()
+        final = index.finish(current_document.get())
+        metrics.record_stage("section_parse", parsing_seconds + time.perf_counter() - parse_started)
+        print(f"--- Parsing Complete: {len(index.page_starts)} pages, form type {final.form_type or 'unknown'} ---")
+    except Exception as e:
+        index.fail(e)
+        raise
+
+async def restore_filing(artifact, index: StreamingFilingIndex, path: str) -> bool:
+    """
+    Loads a filing analyzed before from its stored artifact instead of parsing the PDF. An artifact
+    whose pages cannot be read is discarded and the PDF at `path` is parsed after all.
+    Returns whether the filing came from the artifact.
+    """
+    try:
+        with metrics.stage("artifact_load"):
+            pages = await asyncio.to_thread(artifact.pages)
+    except Exception as e:
+        artifact.close()
+        await asyncio.to_thread(artifact_store.discard, current_document.get(), e)
+        await ingest_filing(path, index)
+        return False
+    try:
+        final = index.restore(pages, artifact.raw_headings, current_document.get())
+        print(f"--- Loaded stored filing: {artifact.page_count} pages, form type {final.form_type or 'unknown'} ---")
+        return True
+    except Exception as e:
+        index.fail(e)
+        raise
+    finally:
+        artifact.close()
+
+async def save_artifact(index: StreamingFilingIndex, statement_tables):
+    """Stores the parsed filing for later requests; a failure only costs the next request a re-parse."""
+    try:
+        filing = index.prepared
+        # A task while they are parsed from the PDF; the stored tables when an artifact had to be re-parsed.
+        tables = await statement_tables if asyncio.isfuture(statement_tables) else statement_tables
+        pages = [filing.page(number) for number in range(filing.page_count)]
+        with metrics.stage("artifact_save"):
+            await asyncio.to_thread(artifact_store.save, filing.pdf_hash, pages, index.raw_headings, index.final, tables)
+    except Exception as e:
+        print(f"--- ERROR storing filing artifact: {e}")
+
+def artifact_section(pdf_hash: str, name: str):
+    """One section of a stored filing, reading only the pages it spans; None if the filing is not stored."""
+    artifact = artifact_store.open(pdf_hash)
+    if artifact is None:
+        return None
+    with artifact:
+        spec = SECTION_SPECS.get(artifact.form_type, {})
+        try:
+            if name == "footnotes_text":
+                text = artifact.footnotes_text(*spec["financial_statements_text"]) if spec else ""
+            else:
+                text = artifact.section_text(*spec[name]) if name in spec else ""
+        except Exception as e:
+            artifact_store.discard(pdf_hash, e)
+            return None
+        return {"pdf_hash": pdf_hash, "section": name, "form_type": artifact.form_type, "text": text}
+
+async def filing_section(index: StreamingFilingIndex, name: str) -> SectionView:
+    """Resolves one named section, as a view into the filing, as soon as the streaming index can locate it."""
+    spec = SECTION_SPECS.get(await index.form_type(), {})
+    if name == "footnotes_text":
+        return await index.footnotes(*spec["financial_statements_text"]) if spec else SectionView.of_text("")
+    return await index.section(*spec[name]) if name in spec else SectionView.of_text("")
+
+# --- Carry-forward of unchanged results ---
+# With a ticker, a task whose inputs hash the same as in an earlier filing of that ticker reuses
+# the earlier result. A task's model and prompt are part of its fingerprint; bump
+# CARRY_FORWARD_VERSION to start a fresh history after other changes (e.g. section parsing).
+# Local nodes (the ratios) always run, so fixes to them apply to every filing.
+CARRY_FORWARD = os.getenv("CARRY_FORWARD", "true").lower() == "true"
+CARRY_FORWARD_VERSION = os.getenv("CARRY_FORWARD_VERSION", "1")
+# The prompt each model-backed node sends; fused nodes send the fused prompt of their group.
+TASK_PROMPTS = {
+    "key_metrics": KPI_PROMPT,
+    "management_tone": TONE_PROMPT,
+    "competitor_analysis": COMPETITOR_PROMPT,
+    "guidance_analysis": GUIDANCE_PROMPT,
+    "risk_summary": RISK_PROMPT,
+    "legal_summary": LEGAL_PROMPT,
+    "financial_statements": FINANCIAL_STATEMENTS_PROMPT,
+    "holistic_review": HOLISTIC_PROMPT,
+    "deep_qualitative": DEEP_QUALITATIVE_PROMPT,
+    "footnote_summary": FOOTNOTE_PROMPT,
+}
+
+section_history = SectionHistory(os.path.join(DATA_DIR, "section_history.sqlite3"))
+
+def task_inputs(name: str, args: tuple) -> list:
+    """What a task actually reads from its arguments, so unrelated changes do not invalidate it."""
+    if name in TASK_SECTIONS:
+        return [select_sections(args[0], name)]
+    if name == "legal_summary":
+        legal_proceedings_text, filing = args
+        return [legal_proceedings_text or filing.whole()]
+    if name == "key_metrics":
+        financial_statements_text, report_head = args
+        return [(financial_statements_text or report_head).prefix(KPI_CONTEXT_CHARS)]
+    # Everything else reads all its arguments; for the statements that includes the parsed tables,
+    # so a layout parser fix reaches filings analyzed before.
+    return list(args)
+
+def task_version(name: str):
+    """
+    Version hash of the model and prompt behind a node, as the result cache computes it. None for
+    nodes computed locally (the ratios), which cost nothing to recompute and are never carried forward.
+    """
+    if name.startswith(FUSED_NODE_PREFIX):
+        group = group_by_section(FUSABLE_TASKS)[name[len(FUSED_NODE_PREFIX):]]
+        return prompt_version(llm.model_name, fused_prompt(group) + json.dumps(fused_schema(group), sort_keys=True))
+    prompt = TASK_PROMPTS.get(name)
+    return prompt_version(llm.model_name, prompt) if prompt is not None else None
+
+def carry_forward(ticker: str = None):
+    """The carry-forward wrapper for the filing being analyzed, or None without a ticker."""
+    if not ticker or not CARRY_FORWARD:
+        return None
+    return CarryForward(section_history, ticker.upper(), current_document.get(), task_inputs, CARRY_FORWARD_VERSION,
+                        task_version)
+
+def carried_fields(carry, results: dict) -> list:
+    """Report fields whose result was carried forward from an earlier filing."""
+    if carry is None:
+        return []
+    return [field for name in carry.carried if name in results for field in report_fields(name, results[name])]
+
+class TaskFailed(Exception):
+    """A node that settled with its placeholder result because something failed inside it."""
+
+def track_failures(around, on_complete):
+    """
+    DAG hooks that report a node as failed to `on_complete` when it noted failures while running,
+    even though it caught them and returned a placeholder. `around` (e.g. carry-forward) still wraps each node.
+    """
+    failed = {}
+
+    async def tracked(name: str, run, args: tuple):
+        with metrics.collect_task_failures() as failures:
+            try:
+                return await (around(name, run, args) if around is not None else run(*args))
+            finally:
+                if failures:
+                    failed[name] = failures
+
+    def settled(name: str, result, error):
+        if error is None and name in failed:
+            error = TaskFailed(f"'{name}' answered with a placeholder after failures in: {', '.join(sorted(set(failed[name])))}")
+        if on_complete is not None:
+            on_complete(name, result, error)
+
+    return tracked, settled
+
+async def analyze_filing(path: str, on_complete=None, on_section=None, completed: dict = None, carry=None):
+    """
+    Runs the whole pipeline on a spooled PDF. Sections are handed to the analysis DAG while
+    pages are still being extracted; a PDF analyzed before is loaded from its stored artifact
+    instead. `on_complete(name, result, error)` fires as each analysis node settles and
+    `on_section(name, text)` as each section is located; a node that answered with its placeholder
+    after an error is reported with a TaskFailed error. Nodes in `completed`
+    keep their stored result instead of being run; with `carry` (see `carry_forward`), nodes
+    whose inputs did not change since an earlier filing of the ticker reuse its result.
+    Returns (task results, extracted sections).
+    """
+    index = StreamingFilingIndex()
+    artifact = await asyncio.to_thread(artifact_store.open, current_document.get())
+    statement_tables = artifact.statement_tables if artifact is not None else None
+    if artifact is not None:
+        ingestion = asyncio.create_task(restore_filing(artifact, index, path))
+    else:
+        ingestion = asyncio.create_task(ingest_filing(path, index))
+    sections = {name: asyncio.create_task(filing_section(index, name)) for name in SECTION_NAMES}
+    background = [ingestion, *sections.values()]
+    if statement_tables is None:
+        statement_tables = asyncio.create_task(locate_statement_tables(path, sections["financial_statements_text"]))
+        background.append(statement_tables)
+    if on_section is not None:
+        for name, task in sections.items():
+            task.add_done_callback(
+                lambda task, name=name: on_section(name, task.result().text) if not task.cancelled() and task.exception() is None else None)
+    around, on_complete = track_failures(carry, on_complete)
+    try:
+        results = await ANALYSIS_DAG.run({
+            "filing": index.complete(),
+            "report_head": index.head(KPI_CONTEXT_CHARS),
+            "statement_tables": statement_tables,
+            **sections,
+        }, on_complete, completed, around)
+        # None from ingest_filing, False from an artifact that had to be re-parsed: store it (again).
+        if not await ingestion:
+            await save_artifact(index, statement_tables)
+        return results, {name: task.result().text for name, task in sections.items()}
+    finally:
+        for task in background:
+            task.cancel()
+            if task.done() and not task.cancelled():
+                task.exception()
+
+# Report fields that are not named after the node producing them.
+SECTION_FIELDS = {"risk_factors_text": "raw_risk_factors", "mda_text": "raw_management_discussion"}
+
+def report_fields(name: str, result) -> dict:
+    """The response fields produced by one analysis node."""
+    if name.startswith(FUSED_NODE_PREFIX):
+        return dict(result)
+    if name == "holistic_review":
+        return {"red_flags": result.get("red_flags", []), "governance_changes": result.get("governance_changes", [])}
+    if name == "deep_qualitative":
+        return {"debt_details": result.get("debt_details", {}), "esg_analysis": result.get("esg_analysis", {})}
+    return {name: result}
+
+# Extracted sections kept in the TF-IDF keyword index, by the section name used there.
+KEYWORD_SECTIONS = {"risk_factors_text": "risk_factors", "mda_text": "mda"}
+KEYWORD_CLOUD_TERMS = 30
+
+keyword_index = KeywordIndex(os.path.join(DATA_DIR, "keyword_index"))
+
+def record_section_hashes(pdf_hash: str, sections: dict, ticker: str):
+    section_history.record_sections(ticker.upper(), pdf_hash, {name: sha256_hex(sections[name] or "") for name in SECTION_NAMES})
+
+def index_keywords(pdf_hash: str, sections: dict, ticker: str = None) -> list:
+    """Adds the filing's sections to the keyword index; returns the risk factor word cloud."""
+    for name, section in KEYWORD_SECTIONS.items():
+        keyword_index.add(section_doc_id(pdf_hash, section), sections.get(name) or "", section, ticker)
+    return keyword_index.top_terms(section_doc_id(pdf_hash, "risk_factors"), KEYWORD_CLOUD_TERMS)
+
+async def build_report(filename: str, results: dict, sections: dict, pdf_hash: str, ticker: str = None,
+                       carried: list = ()) -> dict:
+    report = {"filename": filename}
+    for name, result in results.items():
+        report.update(report_fields(name, result))
+    for name, field in SECTION_FIELDS.items():
+        report[field] = sections[name]
+    report["carried_forward"] = list(carried)
+    if ticker:
+        try:
+            await asyncio.to_thread(record_section_hashes, pdf_hash, sections, ticker)
+        except Exception as e:
+            print(f"--- ERROR in section history: {e}")
+    try:
+        report["risk_keywords"] = await asyncio.to_thread(index_keywords, pdf_hash, sections, ticker)
+    except Exception as e:
+        print(f"--- ERROR in keyword indexing: {e}")
+        report["risk_keywords"] = []
+    return report
+
+async def run_job(job: dict, on_partial) -> dict:
+    """Job queue runner: analyzes a stored PDF, saving each report field as it completes."""
+    current_document.set(job["pdf_hash"])
+    metrics.record_stage("job_queue_wait", max(0.0, time.time() - job["updated_at"]))
+    carry = carry_forward(job["ticker"])
+    with metrics.stage("analysis"):
+        results, sections = await analyze_filing(
+            job["pdf_path"],
+            on_complete=lambda name, result, error: on_partial(report_fields(name, result)),
+            on_section=lambda name, text: on_partial({SECTION_FIELDS[name]: text}) if name in SECTION_FIELDS else None,
+            carry=carry,
+        )
+    print(f"--- Job {job['id']} complete ---")
+    return await build_report(job["filename"], results, sections, job["pdf_hash"], job["ticker"],
+                              carried_fields(carry, results))
+
+job_queue = JobQueue(
+    JobStore(os.path.join(DATA_DIR, "jobs.sqlite3")),
+    run_job,
+    upload_dir=os.path.join(DATA_DIR, "job_uploads"),
+    concurrency=int(os.getenv("JOB_CONCURRENCY", "2")),
+)
+
+def job_view(job: dict) -> dict:
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "filename": job["filename"],
+        "partial_results": json.loads(job["partial"] or "{}"),
+        "result": json.loads(job["result"]) if job["result"] else None,
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
 @app.get("/")
 def read_root():
     return {"message": "AI Service is running"}
 
+@app.get("/scheduler/stats")
+def scheduler_stats():
+    """Queue depth, wait times and token usage of the shared LLM scheduler."""
+    return scheduler.stats()
+
+metrics.watch("ai_service_llm_queue_depth", "LLM calls waiting for quota.", lambda: scheduler.queue_depth)
+metrics.watch("ai_service_llm_in_flight", "LLM calls currently running.", lambda: scheduler.in_flight)
+metrics.watch("ai_service_job_queue_depth", "Analysis jobs waiting for a worker.", lambda: job_queue.depth())
+
+@app.get("/llm/stats")
+def llm_stats():
+    """Pooled models, hedging thresholds and hedge/fallback counts of the shared LLM client."""
+    return llm.stats()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Stage, LLM latency, token and error metrics in the Prometheus text format."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters and size of the per-task result cache."""
+    return result_cache.stats()
+
+@app.get("/artifacts/stats")
+def artifact_stats():
+    """Hits, writes, evictions and size of the filing artifact store."""
+    return artifact_store.stats()
+
+@app.get("/filings/{pdf_hash}/sections/{section}")
+async def get_filing_section(pdf_hash: str, section: str):
+    """
+    One extracted section ("risk_factors_text", "mda_text", ...) of a filing analyzed before,
+    read from its stored artifact without the PDF.
+    """
+    if section not in SECTION_NAMES:
+        raise HTTPException(status_code=400, detail=f"Unknown section; expected one of {', '.join(SECTION_NAMES)}.")
+    found = await asyncio.to_thread(artifact_section, pdf_hash, section)
+    if found is None:
+        raise HTTPException(status_code=404, detail="No stored artifact for this filing.")
+    return found
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status, partial results and (once finished) the final report of a queued analysis."""
+    job = job_queue.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    view = job_view(job)
+    if job["status"] == "queued":
+        view["queue_depth"] = job_queue.depth()
+    return view
+
+@app.get("/keywords/stats")
+def keyword_stats():
+    """Size of the TF-IDF keyword index."""
+    return keyword_index.stats()
+
+@app.get("/history/stats")
+def history_stats():
+    """Tickers and task results kept for carry-forward."""
+    return section_history.stats()
+
+@app.get("/history/{ticker}")
+def ticker_history(ticker: str):
+    """The ticker's analyzed filings, oldest first, with section hashes and the sections changed since the previous one."""
+    filings = section_history.filings(ticker.upper())
+    if not filings:
+        raise HTTPException(status_code=404, detail="No analyzed filings for this ticker.")
+    return {"ticker": ticker.upper(), "filings": filings}
+
+@app.get("/keywords/{pdf_hash}")
+def keywords(pdf_hash: str, section: str = Query("risk_factors"), top: int = Query(KEYWORD_CLOUD_TERMS), ticker: str = Query(None)):
+    """
+    The most distinctive terms of an analyzed filing's section ("risk_factors" or "mda"), scored
+    against every indexed filing, or only against `ticker`'s history when it is given.
+    """
+    terms = keyword_index.top_terms(section_doc_id(pdf_hash, section), top, ticker)
+    if not terms:
+        raise HTTPException(status_code=404, detail="No indexed section for this filing.")
+    return {"section": section, "terms": terms}
+
+class RiskDiffRequest(BaseModel):
+    previous_text: str = ""
+    current_text: str = ""
+
+
+@app.post("/diff/risk-factors")
+async def diff_risk_factors(request: RiskDiffRequest):
+    """
+    Paragraph-level diff of two risk factor sections: only added, removed and modified
+    paragraphs are returned, so callers can send just those to the model.
+    """
+    result = await asyncio.to_thread(diff_paragraphs, request.previous_text, request.current_text)
+    summary = result["summary"]
+    print(f"--- Risk diff: {summary['added']} added, {summary['removed']} removed, {summary['modified']} modified, "
+          f"{summary['unchanged']} unchanged ({summary['reduction']:.0%} of the text left out) ---")
+    return result
+
+
 @app.post("/analyze")
-async def analyze_report(file: UploadFile = File(...)):
+async def analyze_report(file: UploadFile = File(...), job: bool = Query(False), ticker: str = Query(None),
+                         timings: bool = Query(False)):
+    """
+    Analyzes a filing and returns the full report. With `?job=true` the filing is queued instead
+    and a job ID is returned right away; poll GET /jobs/{job_id} for progress and the result.
+    `ticker`, when given, tags the filing's sections in the keyword index and lets tasks whose
+    inputs did not change since the ticker's previous filing carry their result forward.
+    With `?timings=true` the report includes a per-stage timing and token breakdown.
+    """
+    request_timings = metrics.RequestTimings()
+    metrics.request_timings.set(request_timings)
     try:
-        pdf_bytes = await file.read()
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        full_text = "".join(page.get_text() for page in doc)
-        doc.close()
-        
-        if not full_text.strip():
-            raise HTTPException(status_code=400, detail="Could not extract text from PDF.")
+        # The upload is spooled to disk and parsed page by page in the PDF worker pool,
+        # so analysis tasks start as soon as their sections are found.
+        with metrics.stage("spool_upload"):
+            path, digest = await spool_upload(file)
+        if job:
+            queued = job_queue.submit(path, digest, file.filename, ticker)
+            return JSONResponse(status_code=202, content={"job_id": queued["id"], "status": queued["status"]})
 
+        current_document.set(digest)
+        carry = carry_forward(ticker)
         print("\n--- Starting Definitive Form-Aware Analysis ---")
-        
-        risk_factors_text = ""
-        mda_text = ""
-        financial_statements_text=""
-
-        doc_header = full_text[:3000].lower()
-        is_10k = "form 10-k" in doc_header
-        is_10q = "form 10-q" in doc_header
-
-        if is_10k:
-            print("--- Detected Form Type: 10-K (Using validated logic) ---")
-            risk_start = r"Item\s+1\s*A\s*\..*?Risk\s+Factors"
-            risk_end = r"Item\s+1\s*B\s*\."
-            risk_factors_text = extract_last_match_section(full_text, risk_start, risk_end)
-            financial_statements_text = extract_last_match_section(full_text, r"Item\s+8\s*\..*?Financial\s+Statements\s+and\s+Supplementary\s+Data", r"Item\s+9\s*\.")
-            footnotes_text = extract_last_match_section(financial_statements_text, r"Notes\s+to\s+Consolidated\s+Financial\s+Statements", r"Item\s+9\s*\.")
-
-            mda_start = r"Item\s+7\s*\..*?Management['’]?s\s+Discussion"
-            mda_end = r"Item\s+(?:7A|8)\s*\."
-            mda_text = extract_last_match_section(full_text, mda_start, mda_end)
-
-
-        elif is_10q:
-            print("--- Detected Form Type: 10-Q ---")
-            
-            # Step 1: Find the start of the actual report body, after the Table of Contents.
-            # A reliable marker is the last occurrence of the "Part I" header.
-            part_i_pattern = re.compile(r"part\s+i\s*–\s*financial\s+information", re.IGNORECASE | re.DOTALL)
-            part_i_matches = list(part_i_pattern.finditer(full_text))
-            content_start_index = 0
-            if part_i_matches:
-                content_start_index = part_i_matches[-1].start()
-            
-            # Create a new text block that contains only the actual report body.
-            report_body_text = full_text[content_start_index:]
-
-            # Step 2: Search for MD&A ONLY within the report body text.
-            mda_start_10q = r"Item\s+2\s*\..*?Management['’]?s\s+Discussion\s+and\s+Analysis"
-            mda_end_10q = r"Item\s+[34]\s*\."
-            mda_text = extract_10q_mda_section(report_body_text, mda_start_10q, mda_end_10q)
-
-            # 10-Q Risk Factors: Use the LAST match for Item 1A to skip the table of contents.
-            risk_start_10q = r"Item\s+1\s*A\s*\..*?Risk\s+Factors"
-            risk_end_10q = r"Item\s+2\s*\."
-            risk_factors_text = extract_last_match_section(full_text, risk_start_10q, risk_end_10q)
-
-            financial_statements_text = extract_10q_mda_section(report_body_text, r"Item\s+1\s*\..*?Financial\s+Statements", r"Item\s+2\s*\.")
-            footnotes_text = extract_last_match_section(financial_statements_text, r"Notes\s+to\s+Consolidated\s+Financial\s+Statements", r"Item\s+2\s*\.")
-
-
-        
-        print(f"--- Parsing Complete: Found {len(risk_factors_text)} risk chars, {len(mda_text)} MDA chars.")
-
-        print("--- Starting Sequential AI Analysis to respect API limits ---")
-        
-        kpi_results = await get_kpi_analysis(full_text)
-        print("--- Waiting 15 seconds before next API call... ---")
-        await asyncio.sleep(15)
-
-        tone_results = await get_tone_analysis(mda_text) if mda_text else {"summary": "N/A", "cautiousness_score": 0}
-        print("--- Waiting 15 seconds before next API call... ---")
-        await asyncio.sleep(15)
-
-        risk_results = await get_risk_summary(risk_factors_text) if risk_factors_text else {"top_risks": ["N/A"]}
-        print("--- Waiting 15 seconds before next API call... ---")
-        await asyncio.sleep(15)
-
-        competitor_results = await get_competitor_analysis(mda_text) if mda_text else {"competitors": []}
-        print("--- Waiting 15 seconds before next API call... ---")
-        await asyncio.sleep(15)
-
-        legal_results = await get_legal_summary(full_text)
-        print("--- Waiting 15 seconds before next API call... ---")
-        await asyncio.sleep(15)
-        guidance_results = await get_guidance_analysis(mda_text) if mda_text else {"guidance": []}
-        print("--- Waiting 15 seconds before next API call... ---")
-
-        await asyncio.sleep(15)
-        financial_statements_results = await get_financial_statements(financial_statements_text) if financial_statements_text else {"income_statement": [], "balance_sheet": [], "cash_flow_statement": []}
-
-        await asyncio.sleep(15)
-        holistic_review_results = await get_holistic_review(full_text)
-
-        await asyncio.sleep(15)
-        ratio_results = await calculate_financial_ratios(financial_statements_results) if financial_statements_results else {}
-
-        await asyncio.sleep(15)
-        deep_qualitative_results = await get_deep_qualitative_analysis(full_text)
-
-        await asyncio.sleep(15)
-        footnote_results = await summarize_footnotes(footnotes_text) if footnotes_text else {}
+        try:
+            with metrics.stage("analysis"):
+                results, sections = await analyze_filing(path, carry=carry)
+        finally:
+            os.remove(path)
 
         print("--- AI Analysis Complete ---")
+        report = await build_report(file.filename, results, sections, digest, ticker, carried_fields(carry, results))
+        if timings:
+            report["timings"] = request_timings.as_dict()
+        return report
 
-        print(competitor_results)
-        print(legal_results)
-        print(guidance_results)
-        print(holistic_review_results.get('red_flags'))
-        print(holistic_review_results.get('governance_changes'))
-        print(ratio_results)
-        print(deep_qualitative_results.get('debt_details'))
-        print(deep_qualitative_results.get('esg_analysis'))
-
-        return {
-            "filename": file.filename,
-            "key_metrics": kpi_results,
-            "management_tone": tone_results,
-            "risk_summary": risk_results,
-            "raw_risk_factors": risk_factors_text,
-            "raw_management_discussion": mda_text,
-            "competitor_analysis": competitor_results,
-            "legal_summary": legal_results,
-            "guidance_analysis": guidance_results, 
-            "financial_statements": financial_statements_results,
-            "red_flags": holistic_review_results.get("red_flags", []),
-            "governance_changes": holistic_review_results.get("governance_changes",[]),
-            "financial_ratios": ratio_results, 
-            "debt_details": deep_qualitative_results.get("debt_details", {}),
-            "esg_analysis": deep_qualitative_results.get("esg_analysis", {}),
-            "footnote_summary": footnote_results, # New field
-        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+# --- Bulk backfill ---
+# Every document of a batch shares the process-wide LLM scheduler, so the batch as a whole runs
+# at the quota; documents are parsed concurrently in the PDF worker pool.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# /analyze/batch only reads manifests and filings, and writes results, below this directory;
+# manifest entries are checked as well as the request's own paths.
+BATCH_ROOT = os.path.realpath(os.getenv("BATCH_ROOT", os.path.join(DATA_DIR, "batch")))
+# Per-document results that do not come from an analysis node, resumable like the nodes.
+BATCH_EXTRA_TASKS = ("raw_sections", "risk_keywords")
+
+async def analyze_batch_document(document: BatchDocument, emit, completed: dict):
+    """
+    Analyzes one filing of a batch, emitting a "task" record per analysis node as it settles and
+    a closing "document" record. Tasks that succeeded in an earlier run are skipped.
+    """
+    started = time.perf_counter()
+    record = {"document": document.path, "ticker": document.ticker, "pdf_hash": None}
+    try:
+        record["pdf_hash"] = pdf_hash = await asyncio.to_thread(file_sha256, document.path)
+        done = dict(completed.get(pdf_hash, {}))
+        # A node that runs again may answer differently, so whatever was computed from it runs again too.
+        for name in ANALYSIS_DAG.nodes:
+            if name not in done:
+                for child in ANALYSIS_DAG.descendants(name):
+                    done.pop(child, None)
+        if all(task in done for task in (*ANALYSIS_DAG.nodes, *BATCH_EXTRA_TASKS)):
+            emit({"type": "document", **record, "status": "skipped", "error": None, "seconds": 0.0})
+            return
+        current_document.set(pdf_hash)
+        carry = carry_forward(document.ticker)
+
+        def emit_task(name, result, error=None):
+            emit({"type": "task", **record, "task": name, "result": result, "error": str(error) if error else None,
+                  "carried_forward": carry is not None and name in carry.carried})
+
+        _results, sections = await analyze_filing(document.path, on_complete=emit_task, completed=done, carry=carry)
+        if document.ticker:
+            await asyncio.to_thread(record_section_hashes, pdf_hash, sections, document.ticker)
+        if "raw_sections" not in done:
+            emit_task("raw_sections", {field: sections[name] for name, field in SECTION_FIELDS.items()})
+        if "risk_keywords" not in done:
+            emit_task("risk_keywords", await asyncio.to_thread(index_keywords, pdf_hash, sections, document.ticker))
+        emit({"type": "document", **record, "status": "succeeded", "error": None,
+              "seconds": round(time.perf_counter() - started, 3)})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
\ No newline at end of file
+        print(f"--- ERROR in batch document {document.path}: {e}")
+        emit({"type": "document", **record, "status": "failed", "error": getattr(e, "detail", None) or str(e),
+              "seconds": round(time.perf_counter() - started, 3)})
+
+async def batch_lines(documents: list, output_path: str = None, concurrency: int = BATCH_CONCURRENCY):
+    """
+    Runs a batch and yields its records as JSON Lines. With `output_path`, every line is also
+    appended there, and tasks already recorded there as succeeded are not run again.
+    """
+    completed = read_completed(output_path)
+    if completed:
+        print(f"--- Batch: resuming, {sum(len(tasks) for tasks in completed.values())} tasks already done ---")
+    output = open(output_path, "a", encoding="utf-8") if output_path else None
+    try:
+        run_document = functools.partial(analyze_batch_document, completed=completed)
+        async for record in run_batch(documents, run_document, concurrency):
+            line = json.dumps(record) + "\n"
+            if output is not None:
+                output.write(line)
+                output.flush()
+            yield line
+    finally:
+        if output is not None:
+            output.close()
+
+def batch_path(path: str) -> str:
+    try:
+        return contained_path(BATCH_ROOT, path)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"'{path}' is outside the batch directory.")
+
+class BatchRequest(BaseModel):
+    source: str
+    output: str = None
+    ticker: str = None
+    concurrency: int = BATCH_CONCURRENCY
+
+
+@app.post("/analyze/batch")
+async def analyze_batch(request: BatchRequest):
+    """
+    Analyzes every filing of a directory or manifest (paths relative to BATCH_ROOT) and streams
+    one JSON line per finished task and per finished document. Give `output` to keep the
+    results in a JSON Lines file there; a repeated request resumes from it.
+    """
+    source = batch_path(request.source)
+    output_path = batch_path(request.output) if request.output else None
+    try:
+        documents = await asyncio.to_thread(load_documents, source, request.ticker, BATCH_ROOT)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read the batch source: {e}")
+    print(f"--- Batch: {len(documents)} filings from {request.source} ---")
+    return StreamingResponse(batch_lines(documents, output_path, request.concurrency),
+                             media_type="application/x-ndjson")
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+SSE_KEEPALIVE_SECONDS = 15
+
+def discard_upload(path: str):
+    """Removes a spooled upload; safe to call more than once."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+@app.post("/analyze/stream")
+async def analyze_report_stream(file: UploadFile = File(...), ticker: str = Query(None)):
+    """
+    Same analysis as /analyze, streamed as server-sent events: one "section" event per report
+    field the moment its task finishes, then a "complete" event with the full report
+    (or an "error" event).
+    """
+    with metrics.stage("spool_upload"):
+        path, digest = await spool_upload(file)
+    filename = file.filename
+
+    async def events():
+        current_document.set(digest)
+        carry = carry_forward(ticker)
+        queue = asyncio.Queue()
+
+        def on_complete(name, result, error):
+            carried = carry is not None and name in carry.carried
+            for field, value in report_fields(name, result).items():
+                queue.put_nowait({"section": field, "data": value, "error": str(error) if error else None,
+                                  "carried_forward": carried})
+
+        def on_section(name, text):
+            if name in SECTION_FIELDS:
+                queue.put_nowait({"section": SECTION_FIELDS[name], "data": text, "error": None, "carried_forward": False})
+
+        run = asyncio.create_task(analyze_filing(path, on_complete, on_section, carry=carry))
+        run.add_done_callback(lambda _task: queue.put_nowait(None))
+        try:
+            yield sse_event("started", {"filename": filename})
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield sse_event("section", event)
+
+            try:
+                results, sections = run.result()
+            except HTTPException as e:
+                yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+                return
+            except Exception as e:
+                yield sse_event("error", {"status_code": 500, "detail": f"An unexpected error occurred: {str(e)}"})
+                return
+            print("--- AI Analysis Complete (streamed) ---")
+            yield sse_event("complete", await build_report(filename, results, sections, digest, ticker,
+                                                           carried_fields(carry, results)))
+        finally:
+            run.cancel()
+            discard_upload(path)
+
+    # The generator may never run (client gone before the response starts), so the response removes the upload too.
+    return StreamingResponse(events(), media_type="text/event-stream", background=BackgroundTask(discard_upload, path),
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
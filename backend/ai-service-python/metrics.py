@@ -0,0 +1,178 @@
+import functools
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+STAGE_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+STAGE_SECONDS = Histogram("ai_service_stage_seconds", "Wall time of each pipeline stage.", ["stage"],
+                          buckets=STAGE_BUCKETS)
+LLM_QUEUE_SECONDS = Histogram("ai_service_llm_queue_seconds",
+                              "Time an LLM call waited for quota, back-off and a concurrency slot.", ["task"],
+                              buckets=STAGE_BUCKETS)
+LLM_CALL_SECONDS = Histogram("ai_service_llm_call_seconds", "Model latency of one LLM call attempt.", ["task"],
+                             buckets=STAGE_BUCKETS)
+LLM_BACKOFF_SECONDS = Counter("ai_service_llm_backoff_seconds_total", "Back-off scheduled after rate limit errors.",
+                              ["task"])
+LLM_TOKENS = Counter("ai_service_llm_tokens_total", "Tokens sent to and received from the model.",
+                     ["task", "direction"])
+LLM_RETRIES = Counter("ai_service_llm_retries_total", "LLM calls retried after a rate limit or transient error.",
+                      ["task"])
+LLM_EVENTS = Counter("ai_service_llm_events_total",
+                     "Timeouts, hedged requests (and hedges that won) and cheaper-tier fallbacks of LLM calls.",
+                     ["task", "event"])
+LLM_FAILURES = Counter("ai_service_llm_failures_total", "LLM calls that failed for good.", ["task"])
+STATEMENT_SOURCES = Counter("ai_service_statements_total",
+                            "Financial statements by how they were extracted (layout or llm).", ["statement", "source"])
+JSON_PARSE_FAILURES = Counter("ai_service_json_parse_failures_total", "Model answers that were not valid JSON.",
+                              ["task"])
+TASK_ERRORS = Counter("ai_service_task_errors_total", "Analysis tasks that answered with a placeholder after an error.",
+                      ["task"])
+
+
+def task_name(label: str) -> str:
+    """Chunked calls are labelled "task#n"; metrics are kept per task."""
+    return label.split("#", 1)[0]
+
+
+class RequestTimings:
+    """Per-request breakdown of stage times and LLM usage, returned with /analyze?timings=true."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = defaultdict(float)
+        self.tasks = defaultdict(lambda: defaultdict(float))
+
+    def as_dict(self) -> dict:
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 3),
+            "stages": {name: round(seconds, 3) for name, seconds in self.stages.items()},
+            "llm": {task: {key: round(value, 3) for key, value in usage.items()} for task, usage in self.tasks.items()},
+        }
+
+
+# Set per request; asyncio tasks copy the context, so every stage of the request sees it.
+request_timings: ContextVar = ContextVar("request_timings", default=None)
+# Set to a list around one analysis task; its failed LLM calls and unparseable answers are appended.
+task_failures: ContextVar = ContextVar("task_failures", default=None)
+
+
+def record_stage(name: str, seconds: float):
+    STAGE_SECONDS.labels(name).observe(seconds)
+    timings = request_timings.get()
+    if timings is not None:
+        timings.stages[name] += seconds
+
+
+def _record_task(task: str, **values):
+    timings = request_timings.get()
+    if timings is not None:
+        for key, value in values.items():
+            timings.tasks[task][key] += value
+
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def timed(name: str):
+    """Decorator recording the wall time of an async function as stage `name`."""
+    def decorate(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with stage(name):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_llm_wait(label: str, seconds: float):
+    task = task_name(label)
+    LLM_QUEUE_SECONDS.labels(task).observe(seconds)
+    _record_task(task, queue_seconds=seconds)
+
+
+def record_llm_call(label: str, seconds: float, input_tokens: int = 0, output_tokens: int = 0):
+    task = task_name(label)
+    LLM_CALL_SECONDS.labels(task).observe(seconds)
+    LLM_TOKENS.labels(task, "input").inc(input_tokens)
+    LLM_TOKENS.labels(task, "output").inc(output_tokens)
+    _record_task(task, calls=1, call_seconds=seconds, input_tokens=input_tokens, output_tokens=output_tokens)
+
+
+def record_llm_retry(label: str, backoff_seconds: float):
+    task = task_name(label)
+    LLM_RETRIES.labels(task).inc()
+    LLM_BACKOFF_SECONDS.labels(task).inc(backoff_seconds)
+    _record_task(task, retries=1, backoff_seconds=backoff_seconds)
+
+
+def record_llm_event(label: str, event: str):
+    task = task_name(label)
+    LLM_EVENTS.labels(task, event).inc()
+    _record_task(task, **{event: 1})
+
+
+def _note_task_failure(*tasks: str):
+    failures = task_failures.get()
+    if failures is not None:
+        failures.extend(tasks)
+
+
+@contextmanager
+def collect_task_failures():
+    """
+    Collects the failures noted while the block runs into the list it yields. They are passed on
+    to an enclosing collector too, so wrappers around the same task each see them.
+    """
+    failures = []
+    token = task_failures.set(failures)
+    try:
+        yield failures
+    finally:
+        task_failures.reset(token)
+        _note_task_failure(*failures)
+
+
+def record_task_error(task: str):
+    """Called where a task catches an error and answers with its placeholder result instead."""
+    TASK_ERRORS.labels(task).inc()
+    _note_task_failure(task)
+
+
+def record_llm_failure(label: str):
+    task = task_name(label)
+    LLM_FAILURES.labels(task).inc()
+    _record_task(task, failures=1)
+    _note_task_failure(task)
+
+
+def record_json_failure(label: str):
+    task = task_name(label)
+    JSON_PARSE_FAILURES.labels(task).inc()
+    _record_task(task, json_errors=1)
+    _note_task_failure(task)
+
+
+def record_statement_source(statement: str, source: str):
+    STATEMENT_SOURCES.labels(statement, source).inc()
+
+
+def watch(name: str, documentation: str, read):
+    """A gauge whose value is read from `read()` at scrape time."""
+    gauge = Gauge(name, documentation)
+    gauge.set_function(read)
+    return gauge
+
+
+def render() -> tuple:
+    """The Prometheus exposition of every metric, as (body, content type)."""
+    return generate_latest(), CONTENT_TYPE_LATEST
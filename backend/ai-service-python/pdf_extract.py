@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+# Text extraction is CPU bound, so it runs in a bounded pool of long-lived worker processes
+# instead of on the event loop. Large documents are split into page ranges across workers.
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "40"))
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+_pool = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+async def warm_up_pool():
+    """Starts every worker up front so the first upload does not pay interpreter start-up."""
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(get_pool(), _ping) for _ in range(PDF_WORKERS)))
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+# --- Worker-side functions (run inside the pool) ---
+def _page_count(path: str) -> int:
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def _extract_range(path: str, start: int, stop: int) -> list:
+    with fitz.open(path) as doc:
+        return [doc[number].get_text() for number in range(start, stop)]
+
+
+def page_ranges(page_count: int, pages_per_task: int = PAGES_PER_TASK) -> list:
+    return [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+
+
+async def iter_pages(path: str):
+    """
+    Yields the text of every page of the PDF at `path` in page order, as soon as each page range
+    is extracted. At most PDF_WORKERS ranges are in flight, so memory stays bounded on big filings.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    page_count = await loop.run_in_executor(pool, _page_count, path)
+    ranges = iter(page_ranges(page_count))
+    in_flight = deque()
+
+    def submit_next():
+        next_range = next(ranges, None)
+        if next_range is not None:
+            in_flight.append(loop.run_in_executor(pool, _extract_range, path, *next_range))
+
+    try:
+        for _ in range(PDF_WORKERS):
+            submit_next()
+        while in_flight:
+            chunk = await in_flight.popleft()
+            submit_next()
+            for text in chunk:
+                yield text
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+async def run_in_pool(function, *args):
+    """Runs a CPU-bound, worker-side function (e.g. table extraction) in the PDF pool."""
+    return await asyncio.get_running_loop().run_in_executor(get_pool(), function, *args)
+
+
+async def spool_upload(upload) -> tuple:
+    """
+    Copies an uploaded PDF to a temp file in fixed-size chunks, hashing it on the way,
+    so the whole file never has to sit in memory. Returns (path, sha256 hex digest);
+    the caller removes the file.
+    """
+    handle, path = tempfile.mkstemp(suffix=".pdf")
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(handle, "wb") as spool:
+            while True:
+                chunk = await upload.read(SPOOL_CHUNK_BYTES)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                await asyncio.to_thread(spool.write, chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
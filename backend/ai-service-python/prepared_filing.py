@@ -0,0 +1,192 @@
+import bisect
+import hashlib
+from dataclasses import dataclass
+from functools import cached_property
+
+# Rough size of a token in characters, for every estimate made before calling the model.
+CHARS_PER_TOKEN = 4
+
+# One translate pass instead of two str.replace calls and a regex: backslashes and C0/C1 control
+# characters (newlines included) become spaces and double quotes become single quotes. Every
+# character maps to exactly one character, so raw-text offsets are valid in the sanitized text.
+SANITIZE_TABLE = str.maketrans({
+    **{chr(code): " " for code in (*range(0x00, 0x20), *range(0x7F, 0xA0))},
+    "\\": " ",
+    '"': "'",
+})
+
+
+def sha256_hex(data) -> str:
+    """SHA-256 hex digest of bytes or text; content hashes, fingerprints and cache keys all use it."""
+    if isinstance(data, str):
+        data = data.encode("utf-8", "surrogatepass")
+    return hashlib.sha256(data).hexdigest()
+
+
+def sanitize(text: str) -> str:
+    """Cleans text for AI JSON generation."""
+    return text.translate(SANITIZE_TABLE) if text else ""
+
+
+def page_range(page_starts, start: int, end: int) -> tuple:
+    """(first, last) page numbers holding the characters [start, end), given each page's start offset."""
+    first = bisect.bisect_right(page_starts, start) - 1
+    return first, max(first, bisect.bisect_right(page_starts, max(start, end - 1)) - 1)
+
+
+class TextSource:
+    """A plain string as a view source, for text that does not come from a filing."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def slice(self, start: int, end: int) -> str:
+        return self.text[start:end]
+
+    def clean_slice(self, start: int, end: int) -> str:
+        return sanitize(self.text[start:end])
+
+
+class SectionView:
+    """
+    A section as an offset pair into its source's raw and sanitized text. Nothing is copied
+    until `text` or `clean_text` is read, and each is materialized at most once.
+    """
+
+    def __init__(self, source, start: int, end: int):
+        self.source = source
+        self.start = start
+        self.end = max(start, end)
+
+    @classmethod
+    def of_text(cls, text: str) -> "SectionView":
+        return cls(TextSource(text or ""), 0, len(text or ""))
+
+    @cached_property
+    def text(self) -> str:
+        return self.source.slice(self.start, self.end)
+
+    @cached_property
+    def clean_text(self) -> str:
+        return self.source.clean_slice(self.start, self.end)
+
+    @cached_property
+    def content_hash(self) -> str:
+        return sha256_hex(self.text)
+
+    @property
+    def tokens(self) -> int:
+        return len(self) // CHARS_PER_TOKEN
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __bool__(self) -> bool:
+        return self.end > self.start
+
+    def __str__(self) -> str:
+        return self.text
+
+    def page_range(self) -> tuple:
+        """(first, last) page numbers the view spans."""
+        return self.source.page_range(self.start, self.end)
+
+    def prefix(self, chars: int) -> "SectionView":
+        return SectionView(self.source, self.start, min(self.end, self.start + chars))
+
+    def trimmed(self) -> "SectionView":
+        """The same view without leading and trailing whitespace."""
+        text = self.text
+        stripped = text.strip()
+        if not stripped:
+            return SectionView(self.source, self.start, self.start)
+        lead = len(text) - len(text.lstrip())
+        return SectionView(self.source, self.start + lead, self.start + lead + len(stripped))
+
+
+class CompositeView:
+    """Several views read as one text, separated by a blank line (two spaces once sanitized)."""
+
+    def __init__(self, views: list):
+        self.views = [view for view in views if view]
+
+    @cached_property
+    def text(self) -> str:
+        return "\n\n".join(view.text for view in self.views)
+
+    @cached_property
+    def clean_text(self) -> str:
+        return "  ".join(view.clean_text for view in self.views)
+
+    @cached_property
+    def content_hash(self) -> str:
+        return sha256_hex(self.text)
+
+    @property
+    def tokens(self) -> int:
+        return len(self) // CHARS_PER_TOKEN
+
+    def __len__(self) -> int:
+        return sum(len(view) for view in self.views) + 2 * max(0, len(self.views) - 1)
+
+    def __bool__(self) -> bool:
+        return bool(self.views)
+
+    def __str__(self) -> str:
+        return self.text
+
+
+@dataclass(frozen=True)
+class PreparedFiling:
+    """
+    Everything the analyses need from one uploaded filing, computed once: the document text and
+    its sanitized twin (same offsets), page offsets, the section index and hashes. Sections are
+    handed out as views into it rather than copies.
+    """
+    pdf_hash: str
+    text: str
+    clean_text: str
+    page_starts: tuple
+    index: object
+
+    @property
+    def form_type(self) -> str:
+        return self.index.form_type
+
+    @cached_property
+    def content_hash(self) -> str:
+        return sha256_hex(self.text)
+
+    @property
+    def token_estimate(self) -> int:
+        return len(self.text) // CHARS_PER_TOKEN
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_starts)
+
+    def page_range(self, start: int, end: int) -> tuple:
+        return page_range(self.page_starts, start, end)
+
+    def page(self, number: int) -> str:
+        end = self.page_starts[number + 1] if number + 1 < len(self.page_starts) else len(self.text)
+        return self.text[self.page_starts[number]:end]
+
+    # --- View source ---
+    def slice(self, start: int, end: int) -> str:
+        return self.text[start:end]
+
+    def clean_slice(self, start: int, end: int) -> str:
+        return self.clean_text[start:end]
+
+    # --- Views ---
+    def view(self, start: int, end: int) -> SectionView:
+        return SectionView(self, start, end)
+
+    def whole(self) -> SectionView:
+        return SectionView(self, 0, len(self.text))
+
+    def section(self, item: str, part: str = None) -> SectionView:
+        """"Item <item>" (optionally within Part <part>) without surrounding whitespace; empty if absent."""
+        span = self.index.span(item, part)
+        return self.view(*span).trimmed() if span is not None else self.view(0, 0)
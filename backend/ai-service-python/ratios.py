@@ -0,0 +1,221 @@
+import difflib
+import re
+
+import numpy as np
+
+# --- Line item matching ---
+# Each concept lists the statement it lives in and the line item names it goes by, most specific first.
+CONCEPTS = {
+    "revenue": ("income_statement", ["total net sales", "net sales", "total net revenues", "total net revenue",
+                                     "total revenues", "total revenue", "net revenues", "net revenue",
+                                     "revenues", "revenue", "sales"]),
+    "cost_of_revenue": ("income_statement", ["total cost of sales", "cost of sales", "total cost of revenues",
+                                             "total cost of revenue", "cost of revenues", "cost of revenue",
+                                             "cost of goods sold"]),
+    "gross_profit": ("income_statement", ["gross margin", "total gross margin", "gross profit"]),
+    "operating_income": ("income_statement", ["operating income", "income from operations",
+                                              "operating income loss", "income loss from operations",
+                                              "operating profit"]),
+    "net_income": ("income_statement", ["net income", "net earnings", "net income loss", "net loss",
+                                        "net income attributable to common stockholders",
+                                        "net income loss attributable to", "net income attributable to",
+                                        "net loss attributable to", "net earnings attributable to"]),
+    "current_assets": ("balance_sheet", ["total current assets"]),
+    "total_assets": ("balance_sheet", ["total assets"]),
+    "current_liabilities": ("balance_sheet", ["total current liabilities"]),
+    "total_liabilities": ("balance_sheet", ["total liabilities"]),
+    "equity": ("balance_sheet", ["total shareholders equity", "total stockholders equity",
+                                 "total shareholders equity deficit", "total stockholders equity deficit",
+                                 "total equity"]),
+    "operating_cash_flow": ("cash_flow_statement", ["cash generated by operating activities",
+                                                    "net cash provided by operating activities",
+                                                    "net cash from operating activities",
+                                                    "net cash provided by used in operating activities",
+                                                    "cash flows from operating activities"]),
+    "capital_expenditures": ("cash_flow_statement", ["payments for acquisition of property plant and equipment",
+                                                     "purchases of property and equipment",
+                                                     "purchases of property plant and equipment",
+                                                     "capital expenditures"]),
+}
+CONCEPT_NAMES = list(CONCEPTS)
+FUZZY_MATCH_THRESHOLD = 0.9
+# Qualifiers that turn a line item into a different one: "non operating income", "other current assets",
+# "net income attributable to noncontrolling interests".
+NEGATING_WORDS = frozenset({"non", "other", "noncontrolling", "minority"})
+# Aliases ending like this also match any name they start: "net income attributable to Acme Corp".
+OPEN_ENDED_ALIAS = " attributable to"
+PERIODS = ("current_period", "previous_period")
+
+NORMALIZE_PATTERN = re.compile(r"[^a-z0-9]+")
+AMOUNT_PATTERN = re.compile(r"-?\d[\d,]*(?:\.\d+)?|-?\.\d+")
+SCALES = {"thousand": 1e3, "k": 1e3, "million": 1e6, "mn": 1e6, "m": 1e6, "billion": 1e9, "bn": 1e9, "b": 1e9,
+          "trillion": 1e12, "t": 1e12}
+SCALE_PATTERN = re.compile(r"\)?\s*(thousand|million|billion|trillion|mn|bn|k|m|b|t)\b", re.IGNORECASE)
+
+
+def normalize_item(name: str) -> str:
+    return NORMALIZE_PATTERN.sub(" ", str(name).lower().replace("’", "'").replace("'", "")).strip()
+
+
+def parse_amount(value) -> float:
+    """
+    Parses statement values such as "1,234", "(1,234)", "-1,234.5", "$1.2 billion" or "12%".
+    Returns NaN when no number can be read (e.g. "—" or "N/A").
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, str):
+        return np.nan
+    text = value.strip()
+    match = AMOUNT_PATTERN.search(text)
+    if match is None:
+        return np.nan
+    amount = float(match.group().replace(",", ""))
+    scale = SCALE_PATTERN.match(text, match.end())
+    if scale is not None:
+        amount *= SCALES[scale.group(1).lower()]
+    if "(" in text[:match.start()]:
+        amount = -abs(amount)
+    return amount
+
+
+def _qualifies_away(name: str, alias: str) -> bool:
+    """
+    True when `name` is `alias` plus a qualifier that changes its meaning, e.g. "non operating
+    income" or "total noncurrent liabilities". Such names are close by spelling but never a match.
+    """
+    alias_words = set(alias.split())
+    for word in name.split():
+        if word in alias_words:
+            continue
+        if word in NEGATING_WORDS or (word.startswith("non") and word[3:] in alias_words):
+            return True
+    return False
+
+
+def match_concepts(rows: list, statement: str) -> dict:
+    """Maps each concept of `statement` to the row whose item name matches it best."""
+    names = [normalize_item(row.get("item", "")) for row in rows]
+    found = {}
+    for concept, (concept_statement, aliases) in CONCEPTS.items():
+        if concept_statement != statement:
+            continue
+        best_score, best_row = 0.0, None
+        for row, name in zip(rows, names):
+            for rank, alias in enumerate(aliases):
+                if name == alias:
+                    score = 2.0 - rank / 100
+                elif alias.endswith(OPEN_ENDED_ALIAS):
+                    if not name.startswith(alias + " ") or _qualifies_away(name, alias):
+                        continue
+                    score = 1.5 - rank / 100
+                else:
+                    score = difflib.SequenceMatcher(None, name, alias).ratio()
+                    if score < FUZZY_MATCH_THRESHOLD or _qualifies_away(name, alias):
+                        continue
+                if score > best_score:
+                    best_score, best_row = score, row
+        if best_row is not None:
+            found[concept] = best_row
+    return found
+
+
+def concept_matrix(statements: dict) -> np.ndarray:
+    """A (periods x concepts) array of the values found in one report's statements (NaN if missing)."""
+    values = np.full((len(PERIODS), len(CONCEPT_NAMES)), np.nan)
+    matched = {}
+    for statement in {statement for statement, _aliases in CONCEPTS.values()}:
+        rows = [row for row in (statements or {}).get(statement) or [] if isinstance(row, dict)]
+        matched.update(match_concepts(rows, statement))
+    for column, concept in enumerate(CONCEPT_NAMES):
+        if concept in matched:
+            for period_index, period in enumerate(PERIODS):
+                values[period_index, column] = parse_amount(matched[concept].get(period))
+    return values
+
+
+# --- Ratio engine ---
+# (display name, kind) in output order; "percent" values are shown as "12.34%".
+RATIOS = [
+    ("Gross Margin %", "percent"),
+    ("Operating Margin %", "percent"),
+    ("Net Profit Margin %", "percent"),
+    ("Debt-to-Equity Ratio", "ratio"),
+    ("Current Ratio", "ratio"),
+    ("Return on Equity %", "percent"),
+    ("Return on Assets %", "percent"),
+    ("Free Cash Flow Margin %", "percent"),
+]
+GROWTH = [("Revenue Growth %", "revenue"), ("Net Income Growth %", "net_income"), ("Operating Income Growth %", "operating_income")]
+
+
+def _divide(numerator, denominator):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = numerator / denominator
+    return np.where(np.isfinite(result), result, np.nan)
+
+
+def ratio_arrays(values: np.ndarray) -> np.ndarray:
+    """
+    Computes every ratio for a batch of reports at once.
+    `values` has shape (reports, periods, concepts); the result has shape (reports, periods, ratios).
+    """
+    column = {concept: values[..., index] for index, concept in enumerate(CONCEPT_NAMES)}
+    revenue = column["revenue"]
+    gross_profit = np.where(np.isnan(column["gross_profit"]), revenue - np.abs(column["cost_of_revenue"]), column["gross_profit"])
+    liabilities = np.where(np.isnan(column["total_liabilities"]), column["total_assets"] - column["equity"], column["total_liabilities"])
+    free_cash_flow = column["operating_cash_flow"] - np.abs(column["capital_expenditures"])
+    return np.stack([
+        _divide(gross_profit, revenue) * 100,
+        _divide(column["operating_income"], revenue) * 100,
+        _divide(column["net_income"], revenue) * 100,
+        _divide(liabilities, column["equity"]),
+        _divide(column["current_assets"], column["current_liabilities"]),
+        _divide(column["net_income"], column["equity"]) * 100,
+        _divide(column["net_income"], column["total_assets"]) * 100,
+        _divide(free_cash_flow, revenue) * 100,
+    ], axis=-1)
+
+
+def growth_arrays(values: np.ndarray) -> np.ndarray:
+    """Period-over-period growth (%) for the GROWTH concepts, shape (reports, len(GROWTH))."""
+    columns = [CONCEPT_NAMES.index(concept) for _name, concept in GROWTH]
+    current, previous = values[:, 0, columns], values[:, 1, columns]
+    return _divide(current - previous, np.abs(previous)) * 100
+
+
+def _format(value: float, kind: str):
+    if np.isnan(value):
+        return None
+    return f"{value:.2f}%" if kind == "percent" else f"{value:.2f}"
+
+
+def compute_ratios_batch(reports: list) -> list:
+    """
+    Computes the ratio set for many reports' `get_financial_statements` output in one vectorized pass.
+    Each result is {"ratios": [{"name", "value", "previous_value"}]}; ratios whose inputs are
+    missing for the current period are omitted.
+    """
+    if not reports:
+        return []
+    values = np.stack([concept_matrix(statements) for statements in reports])
+    ratios = ratio_arrays(values)
+    growth = growth_arrays(values)
+    results = []
+    for report_index in range(len(reports)):
+        entries = []
+        for ratio_index, (name, kind) in enumerate(RATIOS):
+            current = _format(ratios[report_index, 0, ratio_index], kind)
+            if current is not None:
+                entries.append({"name": name, "value": current,
+                                "previous_value": _format(ratios[report_index, 1, ratio_index], kind)})
+        for growth_index, (name, _concept) in enumerate(GROWTH):
+            value = _format(growth[report_index, growth_index], "percent")
+            if value is not None:
+                entries.append({"name": name, "value": value, "previous_value": None})
+        results.append({"ratios": entries})
+    return results
+
+
+def compute_ratios(statements: dict) -> dict:
+    return compute_ratios_batch([statements])[0]
@@ -0,0 +1,121 @@
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, namedtuple
+
+from prepared_filing import sha256_hex
+
+# SHA-256 of the PDF currently being analyzed. Set once per request; the analysis tasks
+# inherit it, so every cached LLM result is scoped to the document it came from.
+current_document = contextvars.ContextVar("current_document", default=None)
+
+CachedResponse = namedtuple("CachedResponse", ["text"])
+
+
+def prompt_version(model_name: str, prompt: str) -> str:
+    """Version hash of one task's model and prompt. Changing either invalidates only that task."""
+    return sha256_hex(f"{model_name}\x00{prompt}")[:16]
+
+
+class ResultCache:
+    """
+    SQLite-backed cache of LLM task results, keyed by (PDF hash, task, prompt version).
+    The hash of the task's input section is stored alongside, so a parser change that
+    alters the section text is a miss too. Least recently used entries are evicted
+    once the stored results exceed `max_bytes`.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                pdf_hash TEXT NOT NULL,
+                task TEXT NOT NULL,
+                version TEXT NOT NULL,
+                input_hash TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (pdf_hash, task, version)
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_lru ON results (last_access)")
+        self._db.commit()
+
+    @staticmethod
+    def _split(model_name: str, contents: list):
+        prompt, inputs = contents[0], contents[1:]
+        return prompt_version(model_name, prompt), sha256_hex("\x00".join(str(part) for part in inputs))
+
+    def lookup(self, task: str, model_name: str, contents: list):
+        """Returns a cached response for this task of the current document, or None."""
+        pdf_hash = current_document.get()
+        if pdf_hash is None:
+            return None
+        version, input_hash = self._split(model_name, contents)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM results WHERE pdf_hash=? AND task=? AND version=? AND input_hash=?",
+                (pdf_hash, task, version, input_hash)).fetchone()
+            if row is None:
+                self.misses[task] += 1
+                return None
+            self._db.execute("UPDATE results SET last_access=? WHERE pdf_hash=? AND task=? AND version=?",
+                             (time.time(), pdf_hash, task, version))
+            self._db.commit()
+        self.hits[task] += 1
+        print(f"--- Result cache hit for '{task}' ---")
+        return CachedResponse(row[0])
+
+    def store(self, task: str, model_name: str, contents: list, text: str):
+        """Caches a response text. Responses that are not valid JSON are never cached."""
+        pdf_hash = current_document.get()
+        if pdf_hash is None or not text:
+            return
+        try:
+            json.loads(text)
+        except ValueError:
+            return
+        version, input_hash = self._split(model_name, contents)
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (pdf_hash, task, version, input_hash, value, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (pdf_hash, task, version, input_hash, text, size, time.time()))
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT pdf_hash, task, version, size FROM results ORDER BY last_access").fetchall()
+        for pdf_hash, task, version, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM results WHERE pdf_hash=? AND task=? AND version=?", (pdf_hash, task, version))
+            total -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {
+            "hits": sum(self.hits.values()),
+            "misses": sum(self.misses.values()),
+            "hits_by_task": dict(self.hits),
+            "misses_by_task": dict(self.misses),
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+        }
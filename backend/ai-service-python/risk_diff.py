@@ -0,0 +1,197 @@
+import hashlib
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+# --- Paragraph splitting ---
+BLANK_LINE_PATTERN = re.compile(r"\n\s*\n")
+PAGE_NUMBER_LINE = re.compile(r"^\s*(?:page\s+)?\d{1,4}\s*$|^\s*table of contents\s*$", re.IGNORECASE)
+SENTENCE_END = (".", "?", "!", ":", ";")
+# A wrapped line this much shorter than the block's usual line width ends a paragraph.
+SHORT_LINE_RATIO = 0.8
+MIN_PARAGRAPH_CHARS = 40
+
+# --- Fingerprinting ---
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+SHINGLE_WORDS = 3
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1)
+PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+
+# Pairs at or above UNCHANGED_SIMILARITY only differ in formatting or a word or two.
+UNCHANGED_SIMILARITY = 0.9
+MODIFIED_SIMILARITY = 0.5
+
+ADDED, REMOVED, MODIFIED, UNCHANGED = "added", "removed", "modified", "unchanged"
+
+
+def _split_block(block: str) -> list:
+    lines = [line.strip() for line in block.split("\n")]
+    lines = [line for line in lines if line and not PAGE_NUMBER_LINE.match(line)]
+    if not lines:
+        return []
+    width = np.percentile([len(line) for line in lines], 75)
+    paragraphs, current = [], []
+    for line in lines:
+        if current and current[-1].endswith("-"):
+            current[-1] = current[-1][:-1] + line
+        else:
+            current.append(line)
+        if line.endswith(SENTENCE_END) and len(line) < width * SHORT_LINE_RATIO:
+            paragraphs.append(" ".join(current))
+            current = []
+    if current:
+        paragraphs.append(" ".join(current))
+    return paragraphs
+
+
+def split_paragraphs(text: str) -> list:
+    """
+    Splits extracted PDF text into paragraphs. Blank lines always separate paragraphs; inside a
+    block, a short line ending a sentence does too, since PDF text often has no blank lines at all.
+    Fragments shorter than MIN_PARAGRAPH_CHARS (risk headings, stray captions) are joined to the next paragraph.
+    """
+    paragraphs, pending = [], ""
+    for block in BLANK_LINE_PATTERN.split(text or ""):
+        for paragraph in _split_block(block):
+            paragraph = f"{pending} {paragraph}".strip()
+            if len(paragraph) < MIN_PARAGRAPH_CHARS:
+                pending = paragraph
+                continue
+            paragraphs.append(paragraph)
+            pending = ""
+    if pending:
+        paragraphs.append(pending)
+    return paragraphs
+
+
+def _words(paragraph: str) -> list:
+    return WORD_PATTERN.findall(paragraph.lower())
+
+
+def _shingles(words: list) -> np.ndarray:
+    size = min(SHINGLE_WORDS, len(words))
+    if size == 0:
+        return np.zeros(0, dtype=np.uint64)
+    hashes = {zlib.crc32(" ".join(words[i:i + size]).encode()) for i in range(len(words) - size + 1)}
+    return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+
+def minhash(shingles: np.ndarray) -> np.ndarray:
+    """MinHash signature (NUM_PERM values) of a set of 32-bit shingle hashes."""
+    if shingles.size == 0:
+        return np.full(NUM_PERM, MAX_HASH, dtype=np.uint64)
+    permuted = ((np.outer(shingles, PERM_A) + PERM_B) % MERSENNE_PRIME) & MAX_HASH
+    return permuted.min(axis=0)
+
+
+class Fingerprints:
+    """Exact hashes, shingle sets and MinHash signatures for a list of paragraphs."""
+
+    def __init__(self, paragraphs: list):
+        self.paragraphs = paragraphs
+        words = [_words(paragraph) for paragraph in paragraphs]
+        self.exact = [hashlib.sha1(" ".join(w).encode()).hexdigest() for w in words]
+        self.shingles = [_shingles(w) for w in words]
+        self.signatures = np.array([minhash(s) for s in self.shingles]).reshape(len(paragraphs), NUM_PERM)
+
+    def band_keys(self, index: int):
+        signature = self.signatures[index]
+        for band in range(LSH_BANDS):
+            yield band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes()
+
+
+def _jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    if a.size == 0 and b.size == 0:
+        return 1.0
+    shared = np.intersect1d(a, b, assume_unique=True).size
+    return shared / (a.size + b.size - shared)
+
+
+def diff_paragraphs(previous_text: str, current_text: str) -> dict:
+    """
+    Classifies every paragraph of two versions of a section as added, removed, modified or unchanged.
+    Identical paragraphs (after normalizing case, punctuation and whitespace) are matched by hash;
+    the rest are paired through MinHash LSH buckets, so the work stays close to linear in the
+    number of paragraphs. Returns the changed paragraphs, in document order, plus summary counts.
+    """
+    previous = Fingerprints(split_paragraphs(previous_text))
+    current = Fingerprints(split_paragraphs(current_text))
+
+    # 1. Exact matches, respecting repeated paragraphs.
+    unmatched_previous = defaultdict(list)
+    for index, digest in enumerate(previous.exact):
+        unmatched_previous[digest].append(index)
+    pairs = {}
+    for index, digest in enumerate(current.exact):
+        if unmatched_previous.get(digest):
+            pairs[index] = (unmatched_previous[digest].pop(0), 1.0)
+    matched_previous = {previous_index for previous_index, _similarity in pairs.values()}
+
+    # 2. Near duplicates among the rest, through LSH buckets over the previous paragraphs.
+    buckets = defaultdict(list)
+    for index in range(len(previous.paragraphs)):
+        if index not in matched_previous:
+            for key in previous.band_keys(index):
+                buckets[key].append(index)
+    candidates = []
+    for index in range(len(current.paragraphs)):
+        if index in pairs:
+            continue
+        seen = set()
+        for key in current.band_keys(index):
+            for previous_index in buckets.get(key, ()):
+                if previous_index not in seen:
+                    seen.add(previous_index)
+                    similarity = _jaccard(current.shingles[index], previous.shingles[previous_index])
+                    if similarity >= MODIFIED_SIMILARITY:
+                        candidates.append((similarity, index, previous_index))
+    for similarity, index, previous_index in sorted(candidates, reverse=True):
+        if index not in pairs and previous_index not in matched_previous:
+            pairs[index] = (previous_index, similarity)
+            matched_previous.add(previous_index)
+
+    # 3. Classify, ordering removed paragraphs after the current paragraph they used to precede.
+    changes, counts = [], {ADDED: 0, REMOVED: 0, MODIFIED: 0, UNCHANGED: 0}
+    previous_position = {previous_index: index for index, (previous_index, _s) in pairs.items()}
+    for index, paragraph in enumerate(current.paragraphs):
+        if index not in pairs:
+            counts[ADDED] += 1
+            changes.append((index, 0, {"status": ADDED, "similarity": 0.0, "previous": None, "current": paragraph}))
+            continue
+        previous_index, similarity = pairs[index]
+        if similarity >= UNCHANGED_SIMILARITY:
+            counts[UNCHANGED] += 1
+            continue
+        counts[MODIFIED] += 1
+        changes.append((index, 0, {"status": MODIFIED, "similarity": round(similarity, 3),
+                                   "previous": previous.paragraphs[previous_index], "current": paragraph}))
+    anchor = -1
+    for previous_index, paragraph in enumerate(previous.paragraphs):
+        if previous_index in previous_position:
+            anchor = previous_position[previous_index]
+            continue
+        counts[REMOVED] += 1
+        changes.append((anchor, 1, {"status": REMOVED, "similarity": 0.0, "previous": paragraph, "current": None}))
+    changes.sort(key=lambda change: change[:2])
+
+    changed_chars = sum(len(change["previous"] or "") + len(change["current"] or "") for _i, _o, change in changes)
+    total_chars = len(previous_text or "") + len(current_text or "")
+    return {
+        "changes": [change for _index, _order, change in changes],
+        "summary": {
+            **counts,
+            "previous_paragraphs": len(previous.paragraphs),
+            "current_paragraphs": len(current.paragraphs),
+            "changed_chars": changed_chars,
+            "total_chars": total_chars,
+            "reduction": round(1 - changed_chars / total_chars, 3) if total_chars else 0.0,
+        },
+    }
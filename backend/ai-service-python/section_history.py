@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+from prepared_filing import sha256_hex
+
+# Results kept per (ticker, task): enough to go back and forth between 10-K, 10-Q and amendments.
+RESULTS_PER_TASK = 8
+
+
+def fingerprint(*values) -> str:
+    """Hash of a task's inputs: views by their content hash, anything else by its JSON form."""
+    hashes = []
+    for value in values:
+        content_hash = getattr(value, "content_hash", None)
+        if content_hash is None:
+            content_hash = sha256_hex(json.dumps(value, sort_keys=True, default=str))
+        hashes.append(content_hash + "\x00")
+    return sha256_hex("".join(hashes))
+
+
+class SectionHistory:
+    """
+    SQLite history, per ticker, of each filing's section hashes and of analysis task results
+    keyed by the fingerprint of the inputs they were computed from.
+    """
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS task_results (
+                ticker TEXT NOT NULL,
+                task TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                result TEXT NOT NULL,
+                pdf_hash TEXT,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (ticker, task, fingerprint)
+            )""")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS section_hashes (
+                ticker TEXT NOT NULL,
+                pdf_hash TEXT NOT NULL,
+                section TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (ticker, pdf_hash, section)
+            )""")
+        self._db.commit()
+
+    def lookup(self, ticker: str, task: str, key: str):
+        """(True, result) when `task` already ran for `ticker` on inputs with this fingerprint."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result FROM task_results WHERE ticker=? AND task=? AND fingerprint=?",
+                (ticker, task, key)).fetchone()
+        return (True, json.loads(row[0])) if row else (False, None)
+
+    def store(self, ticker: str, task: str, key: str, result, pdf_hash: str = None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO task_results (ticker, task, fingerprint, result, pdf_hash, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (ticker, task, key, json.dumps(result), pdf_hash, time.time()))
+            self._db.execute(
+                "DELETE FROM task_results WHERE ticker=? AND task=? AND fingerprint NOT IN ("
+                "SELECT fingerprint FROM task_results WHERE ticker=? AND task=? ORDER BY created_at DESC LIMIT ?)",
+                (ticker, task, ticker, task, RESULTS_PER_TASK))
+            self._db.commit()
+
+    def record_sections(self, ticker: str, pdf_hash: str, hashes: dict):
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO section_hashes (ticker, pdf_hash, section, hash, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(ticker, pdf_hash, section, value, now) for section, value in hashes.items()])
+            self._db.commit()
+
+    def filings(self, ticker: str) -> list:
+        """The ticker's filings, oldest first, with their section hashes and the sections changed since the one before."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT pdf_hash, section, hash, created_at FROM section_hashes WHERE ticker=? ORDER BY created_at, pdf_hash",
+                (ticker,)).fetchall()
+        filings = {}
+        for pdf_hash, section, value, created_at in rows:
+            filing = filings.setdefault(pdf_hash, {"pdf_hash": pdf_hash, "analyzed_at": created_at, "sections": {}})
+            filing["sections"][section] = value
+        history, previous = [], None
+        for filing in filings.values():
+            if previous is not None:
+                filing["changed_sections"] = [section for section, value in filing["sections"].items()
+                                              if previous["sections"].get(section) != value]
+            history.append(filing)
+            previous = filing
+        return history
+
+    def stats(self) -> dict:
+        with self._lock:
+            tickers, results = self._db.execute("SELECT COUNT(DISTINCT ticker), COUNT(*) FROM task_results").fetchone()
+        return {"tickers": tickers, "task_results": results}
+
+
+class CarryForward:
+    """
+    Wraps the analysis tasks of one filing: a task whose inputs hash the same as in an earlier
+    filing of the same ticker returns that filing's result instead of running again.
+    `inputs(name, args)` picks what a task actually reads from its arguments and
+    `task_version(name)` hashes how it reads them (its model and prompt), so a changed prompt
+    invalidates only that task; tasks it returns None for are local and always run. `version`
+    is part of every fingerprint, so bumping it invalidates the whole history.
+    """
+
+    def __init__(self, history: SectionHistory, ticker: str, pdf_hash: str, inputs, version: str = "1",
+                 task_version=None):
+        self.history = history
+        self.ticker = ticker
+        self.pdf_hash = pdf_hash
+        self.inputs = inputs
+        self.version = version
+        self.task_version = task_version or (lambda name: "")
+        self.carried = []
+
+    async def __call__(self, name: str, run, args: tuple):
+        task_version = self.task_version(name)
+        if task_version is None:
+            return await run(*args)
+        key = fingerprint(self.version, task_version, name, *self.inputs(name, args))
+        found, result = await asyncio.to_thread(self.history.lookup, self.ticker, name, key)
+        if found:
+            print(f"--- Carried forward '{name}' for {self.ticker}: inputs unchanged ---")
+            self.carried.append(name)
+            return result
+        with metrics.collect_task_failures() as failures:
+            result = await run(*args)
+        # Tasks answer failures with placeholders (and note them); only real results are reused later.
+        if not failures:
+            await asyncio.to_thread(self.history.store, self.ticker, name, key, result, self.pdf_hash)
+        return result
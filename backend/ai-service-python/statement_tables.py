@@ -0,0 +1,231 @@
+import re
+
+import fitz  # PyMuPDF
+
+from ratios import match_concepts, normalize_item, parse_amount
+
+# Reconstructs the three primary statements from word coordinates: words are grouped into rows
+# by baseline, the trailing numbers of each row are assigned to period columns found by
+# clustering their right edges, and the period order is read from the year header.
+# Runs inside the PDF worker pool.
+
+STATEMENT_TITLES = {
+    "income_statement": re.compile(r"statements?\s+of\s+(?:consolidated\s+)?(?:operations|income|earnings)\b"),
+    "balance_sheet": re.compile(r"balance\s+sheets?|statements?\s+of\s+(?:consolidated\s+)?financial\s+(?:position|condition)"),
+    "cash_flow_statement": re.compile(r"statements?\s+of\s+(?:consolidated\s+)?cash\s+flows?"),
+}
+STATEMENTS = tuple(STATEMENT_TITLES)
+# The line a statement ends with (on normalized labels); until it is seen, the statement goes on on the next page.
+STATEMENT_ENDS = {
+    "income_statement": re.compile(r"^net (?:income|earnings|loss)"),
+    "balance_sheet": re.compile(r"^total liabilities and"),
+    "cash_flow_statement": re.compile(r"financing activities|\bend of (?:the )?(?:period|year)"),
+}
+# Concepts a statement must contain to be trusted, as alternatives per slot.
+KEY_CONCEPTS = {
+    "income_statement": [("revenue",), ("net_income",)],
+    "balance_sheet": [("total_assets",), ("total_liabilities", "equity")],
+    "cash_flow_statement": [("operating_cash_flow",)],
+}
+
+VALUE_PATTERN = re.compile(r"^\$?\(?\$?-?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?\)?%?$|^[—–-]+$")
+YEAR_PATTERN = re.compile(r"^(?:19|20)\d{2}$")
+TITLE_ROWS = 8
+TITLE_MAX_WORDS = 12
+ROW_TOLERANCE = 3.0
+COLUMN_GAP = 15.0
+MIN_ROWS = 4
+MAX_PAGES = 60
+MAX_CONTINUATION_PAGES = 3
+
+
+def _rows(words: list) -> list:
+    """Words grouped into rows by vertical position, each row sorted left to right."""
+    rows = []
+    for word in sorted(words, key=lambda word: ((word[1] + word[3]) / 2, word[0])):
+        middle = (word[1] + word[3]) / 2
+        if rows and abs(rows[-1][0] - middle) <= ROW_TOLERANCE:
+            rows[-1][1].append(word)
+        else:
+            rows.append([middle, [word]])
+    return [sorted(row, key=lambda word: word[0]) for _middle, row in rows]
+
+
+def _split_row(row: list) -> tuple:
+    """(label, value words): the values are the trailing run of numbers, dashes and "$" signs."""
+    cut = len(row)
+    while cut > 0 and (VALUE_PATTERN.match(row[cut - 1][4]) or row[cut - 1][4] in ("$", "(", ")")):
+        cut -= 1
+    values = [word for word in row[cut:] if word[4] not in ("$", "(", ")")]
+    return " ".join(word[4] for word in row[:cut]).strip(), values
+
+
+def _statement_of(rows: list):
+    """The statement a page starts, judged by a short title line among its first rows."""
+    for row in rows[:TITLE_ROWS]:
+        text = " ".join(word[4] for word in row).lower()
+        if len(row) > TITLE_MAX_WORDS or "notes to" in text or "comprehensive" in text:
+            continue
+        for statement, pattern in STATEMENT_TITLES.items():
+            if pattern.search(text):
+                return statement
+    return None
+
+
+def _continues(rows: list) -> bool:
+    """Whether an untitled page can be the continuation of a statement: a table, not the notes."""
+    if any("notes to" in " ".join(word[4] for word in row).lower() for row in rows[:TITLE_ROWS]):
+        return False
+    return sum(1 for row in rows if _split_row(row)[1]) >= MIN_ROWS
+
+
+def _ends(labels, statement: str) -> bool:
+    """Whether the statement's closing line is among `labels`."""
+    return any(STATEMENT_ENDS[statement].search(normalize_item(label)) for label in labels)
+
+
+def _columns(value_rows: list) -> list:
+    """Right-edge positions of the period columns, left to right."""
+    edges = sorted(word[2] for _label, values in value_rows for word in values)
+    clusters = []
+    for edge in edges:
+        if clusters and edge - clusters[-1][-1] <= COLUMN_GAP:
+            clusters[-1].append(edge)
+        else:
+            clusters.append([edge])
+    support = max(2, len(value_rows) // 3)
+    return [sum(cluster) / len(cluster) for cluster in clusters if len(cluster) >= support]
+
+
+def _clean_value(text: str) -> str:
+    return text.replace("$", "")
+
+
+def parse_statement(rows: list, statement: str) -> dict:
+    """Turns the word rows of one statement into {"rows", "confidence", "periods"}."""
+    year_words, value_rows, pending = [], [], ""
+    for row in rows:
+        label, values = _split_row(row)
+        if not value_rows:
+            # Column headers ("2024", "September 28, 2024") sit above the first line item.
+            year_words.extend(word for word in row if YEAR_PATTERN.match(word[4].rstrip(",")))
+        if values and all(YEAR_PATTERN.match(word[4]) for word in values):
+            continue
+        if not values:
+            # A label without numbers is a caption ("Current assets:") or the first line of a wrapped label.
+            pending = label if label and not label.endswith(":") else ""
+            continue
+        if pending and (not label or label[:1].islower()):
+            label = f"{pending} {label}".strip()
+        pending = ""
+        if label:
+            value_rows.append((label, values))
+
+    columns = _columns(value_rows)
+    if len(value_rows) < MIN_ROWS or len(columns) < 2:
+        return {"rows": [], "confidence": 0.0, "periods": []}
+
+    by_column = {}
+    for word in year_words:
+        column = min(range(len(columns)), key=lambda index: abs(columns[index] - word[2]))
+        if abs(columns[column] - word[2]) <= COLUMN_GAP * 2:
+            by_column.setdefault(column, int(word[4].rstrip(",")))
+    current, previous, ambiguous = _period_columns(len(columns), by_column)
+    periods = [by_column[current], by_column[previous]] if current in by_column and previous in by_column else []
+
+    items, aligned, total, complete = [], 0, 0, 0
+    for label, values in value_rows:
+        cells = {}
+        for word in values:
+            total += 1
+            column = min(range(len(columns)), key=lambda index: abs(columns[index] - word[2]))
+            if abs(columns[column] - word[2]) <= COLUMN_GAP and column not in cells:
+                cells[column] = _clean_value(word[4])
+                aligned += 1
+        if current not in cells:
+            continue
+        complete += previous in cells
+        items.append({"item": label, "current_period": cells[current], "previous_period": cells.get(previous, "")})
+
+    found = match_concepts(items, statement)
+    slots = KEY_CONCEPTS[statement]
+    coverage = sum(any(concept in found for concept in slot) for slot in slots) / len(slots)
+    confidence = 0.4 * coverage + 0.3 * (aligned / total if total else 0) + 0.3 * (complete / len(items) if items else 0)
+    if not periods:
+        confidence *= 0.9
+    if statement == "balance_sheet" and not _balances(items, found):
+        confidence *= 0.5
+    if not _ends((item["item"] for item in items), statement):
+        # Cut off before its closing line, e.g. on a page that was not found; the model reads it whole.
+        confidence *= 0.5
+    if ambiguous:
+        # Which column holds the prior period is a guess; below the threshold, so the model decides.
+        confidence *= 0.5
+    return {"rows": items, "confidence": round(confidence, 3), "periods": periods}
+
+
+def _period_columns(count: int, by_column: dict) -> tuple:
+    """
+    (current column, prior-period column, ambiguous). The current period is the latest year,
+    leftmost among equal years; its prior period is the nearest column of the next earlier year,
+    which keeps 10-Q period groups ("Three Months 2024 | 2023 | Nine Months 2024 | 2023") apart.
+    Without year headers the columns are read left to right, newest first (SEC layout).
+    """
+    if len(by_column) < 2:
+        # Two period groups cannot be told apart without their years.
+        return 0, 1, count >= 4
+    current = min(by_column, key=lambda column: (-by_column[column], column))
+    earlier = [column for column in by_column if by_column[column] < by_column[current]]
+    if not earlier:
+        return current, next(column for column in sorted(by_column) if column != current), True
+    latest_earlier = max(by_column[column] for column in earlier)
+    candidates = sorted((abs(column - current), column) for column in earlier if by_column[column] == latest_earlier)
+    ambiguous = len(candidates) > 1 and candidates[0][0] == candidates[1][0]
+    return current, candidates[0][1], ambiguous
+
+
+def _balances(items: list, found: dict) -> bool:
+    """Total assets equal total liabilities and equity, when the statement shows both."""
+    if "total_assets" not in found:
+        return True
+    assets = parse_amount(found["total_assets"]["current_period"])
+    for item in items:
+        if normalize_item(item["item"]).startswith("total liabilities and"):
+            other = parse_amount(item["current_period"])
+            return abs(assets - other) <= max(1.0, abs(assets) * 0.005)
+    return True
+
+
+def extract_statement_tables(path: str, start: int, stop: int) -> dict:
+    """
+    Finds the consolidated income statement, balance sheet and cash flow statement on pages
+    [start, stop) of the PDF at `path` and parses them. A statement that has not reached its
+    closing line by the end of a page goes on onto the following untitled pages. Returns {statement: {"rows",
+    "confidence", "periods", "pages"}} for each statement found.
+    """
+    found = {}
+    # The statement whose closing line has not been seen yet, and how many untitled pages it has taken.
+    open_statement, continued = None, 0
+    with fitz.open(path) as doc:
+        for number in range(start, min(stop, doc.page_count, start + MAX_PAGES)):
+            rows = _rows(doc[number].get_text("words"))
+            statement = _statement_of(rows)
+            if statement is not None:
+                continued = 0
+            elif open_statement is not None and continued < MAX_CONTINUATION_PAGES and _continues(rows):
+                statement = open_statement
+                continued += 1
+            else:
+                open_statement = None
+                if len(found) == len(STATEMENTS):
+                    break
+                continue
+            entry = found.setdefault(statement, {"rows": [], "pages": []})
+            entry["rows"].extend(rows)
+            entry["pages"].append(number)
+            labels = (_split_row(row)[0] for row in rows if _split_row(row)[1])
+            open_statement = None if _ends(labels, statement) else statement
+    tables = {}
+    for statement, entry in found.items():
+        tables[statement] = {**parse_statement(entry["rows"], statement), "pages": entry["pages"]}
+    return tables
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+# The service reads its configuration at import time, so it is set up before main is imported.
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+os.environ.setdefault("AI_SERVICE_DATA_DIR", tempfile.mkdtemp(prefix="ai-service-test-"))
+os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "100000")
+os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "1000000000")
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from analysis_dag import AnalysisDAG, AnalysisNode, UpstreamFailed
+
+
+def run(dag: AnalysisDAG, sources: dict, completed: dict = None):
+    settled = {}
+
+    def on_complete(name, result, error):
+        settled[name] = (result, error)
+
+    results = asyncio.run(dag.run(sources, on_complete, completed))
+    return results, settled
+
+
+async def echo(*values):
+    return {"inputs": list(values)}
+
+
+async def fail(*_values):
+    raise RuntimeError("model unavailable")
+
+
+def test_failure_propagates_to_descendants_only():
+    calls = []
+
+    async def downstream(value):
+        calls.append(value)
+        return {"ok": True}
+
+    dag = AnalysisDAG([
+        AnalysisNode("parent", fail, inputs=("text",), fallback={"parent": "fallback"}),
+        AnalysisNode("child", downstream, inputs=("parent",), fallback={"child": "fallback"}),
+        AnalysisNode("grandchild", echo, inputs=("child",), fallback={"grandchild": "fallback"}),
+        AnalysisNode("sibling", echo, inputs=("text",)),
+    ], sources=("text",))
+    results, settled = run(dag, {"text": "section"})
+
+    assert results["parent"] == {"parent": "fallback"}
+    assert results["child"] == {"child": "fallback"}
+    assert results["grandchild"] == {"grandchild": "fallback"}
+    assert results["sibling"] == {"inputs": ["section"]}
+    assert calls == []
+    assert isinstance(settled["parent"][1], RuntimeError)
+    assert isinstance(settled["child"][1], UpstreamFailed) and settled["child"][1].upstream == "parent"
+    assert isinstance(settled["grandchild"][1], UpstreamFailed)
+    assert settled["sibling"][1] is None
+
+
+def test_descendant_waiting_on_another_input_is_cancelled_when_an_upstream_fails():
+    started = []
+
+    async def never(_slow, _parent):
+        started.append(True)
+        return {"never": True}
+
+    async def slow_source():
+        await asyncio.sleep(30)
+        return "late section"
+
+    dag = AnalysisDAG([
+        AnalysisNode("parent", fail, inputs=("text",), fallback={}),
+        AnalysisNode("child", never, inputs=("slow", "parent"), fallback={"child": "fallback"}),
+    ], sources=("text", "slow"))
+
+    async def main():
+        settled = {}
+        results = await asyncio.wait_for(
+            dag.run({"text": "section", "slow": slow_source()}, lambda name, result, error: settled.setdefault(name, error)),
+            timeout=5)
+        return results, settled
+
+    results, settled = asyncio.run(main())
+    assert results["child"] == {"child": "fallback"}
+    assert isinstance(settled["child"], UpstreamFailed) and settled["child"].upstream == "parent"
+    assert started == []
+
+
+def test_cancelling_the_run_cancels_every_node():
+    cancelled = []
+
+    async def hang(_text):
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    dag = AnalysisDAG([AnalysisNode("a", hang, inputs=("text",)), AnalysisNode("b", hang, inputs=("text",))],
+                      sources=("text",))
+
+    async def main():
+        run_task = asyncio.create_task(dag.run({"text": "section"}))
+        await asyncio.sleep(0.05)
+        run_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run_task
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert cancelled == [True, True]
+
+
+def test_empty_required_input_uses_the_fallback_without_running():
+    dag = AnalysisDAG([AnalysisNode("summary", fail, inputs=("text",), required=("text",), fallback={"summary": []})],
+                      sources=("text",))
+    results, settled = run(dag, {"text": ""})
+    assert results["summary"] == {"summary": []}
+    assert settled["summary"][1] is None
+
+
+def test_completed_nodes_are_not_run_again_and_feed_their_dependents():
+    dag = AnalysisDAG([
+        AnalysisNode("parent", fail, inputs=("text",)),
+        AnalysisNode("child", echo, inputs=("parent",)),
+    ], sources=("text",))
+    results, settled = run(dag, {"text": "section"}, completed={"parent": {"stored": 1}})
+    assert results == {"parent": {"stored": 1}, "child": {"inputs": [{"stored": 1}]}}
+    assert "parent" not in settled
+
+
+def test_fallbacks_are_copies():
+    dag = AnalysisDAG([AnalysisNode("a", fail, inputs=("text",), fallback={"items": []})], sources=("text",))
+    first, _settled = run(dag, {"text": "x"})
+    first["a"]["items"].append("changed")
+    second, _settled = run(dag, {"text": "x"})
+    assert second["a"] == {"items": []}
+
+
+@pytest.mark.parametrize("nodes, message", [
+    ([AnalysisNode("a", echo, inputs=("b",)), AnalysisNode("b", echo, inputs=("a",))], "cycle"),
+    ([AnalysisNode("a", echo, inputs=("missing",))], "unknown input"),
+    ([AnalysisNode("a", echo, inputs=("text",), required=("other",))], "does not declare"),
+])
+def test_invalid_graphs_are_rejected(nodes, message):
+    with pytest.raises(ValueError, match=message):
+        AnalysisDAG(nodes, sources=("text",))
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from batch import BatchDocument, contained_path, load_documents, read_completed, run_batch
+
+
+def write_records(path, records, tail: str = ""):
+    with open(path, "w", encoding="utf-8") as output:
+        for record in records:
+            output.write(json.dumps(record) + "\n")
+        output.write(tail)
+
+
+def task(pdf_hash, name, result, error=None):
+    return {"type": "task", "document": "a.pdf", "pdf_hash": pdf_hash, "task": name, "result": result, "error": error}
+
+
+def test_read_completed_keeps_only_tasks_that_succeeded(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_records(output, [
+        task("h1", "risk_summary", {"top_risks": ["supply"]}),
+        task("h1", "key_metrics", {"revenue": "Error"}, error="TaskFailed: 'key_metrics' answered with its placeholder"),
+        task("h2", "risk_summary", {"top_risks": []}),
+        task(None, "risk_summary", {"top_risks": []}),
+        {"type": "document", "pdf_hash": "h1", "status": "done", "error": None},
+    ])
+    assert read_completed(str(output)) == {"h1": {"risk_summary": {"top_risks": ["supply"]}},
+                                           "h2": {"risk_summary": {"top_risks": []}}}
+
+
+def test_read_completed_uses_a_later_success_after_a_failure(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_records(output, [task("h1", "guidance", {}, error="timeout"), task("h1", "guidance", {"guidance": ["up"]})])
+    assert read_completed(str(output)) == {"h1": {"guidance": {"guidance": ["up"]}}}
+
+
+def test_read_completed_ignores_an_interrupted_last_line(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_records(output, [task("h1", "risk_summary", {"top_risks": []})], tail='{"type": "task", "pdf_hash": "h1", "ta')
+    assert read_completed(str(output)) == {"h1": {"risk_summary": {"top_risks": []}}}
+
+
+def test_read_completed_without_an_earlier_run(tmp_path):
+    assert read_completed(str(tmp_path / "missing.jsonl")) == {}
+    assert read_completed(None) == {}
+
+
+def test_contained_path_rejects_escapes(tmp_path):
+    root = os.path.realpath(tmp_path)
+    (tmp_path / "filings").mkdir()
+    os.symlink("/etc", tmp_path / "filings" / "elsewhere")
+    assert contained_path(root, "filings/a.pdf") == os.path.join(root, "filings", "a.pdf")
+    for path in ("../a.pdf", "/etc/passwd", "filings/elsewhere/passwd"):
+        with pytest.raises(ValueError, match="outside the batch directory"):
+            contained_path(root, path)
+
+
+def test_load_documents_from_a_manifest(tmp_path):
+    root = os.path.realpath(tmp_path)
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text('# comment\n{"path": "a.pdf", "ticker": "AAA"}\nb.pdf\n', encoding="utf-8")
+    assert load_documents(str(manifest), ticker="BBB", root=root) == [
+        BatchDocument(os.path.join(root, "a.pdf"), "AAA"), BatchDocument(os.path.join(root, "b.pdf"), "BBB")]
+    manifest.write_text('{"path": "../outside.pdf"}\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="Line 1"):
+        load_documents(str(manifest), root=root)
+
+
+def test_run_batch_bounds_concurrency_and_yields_every_record():
+    running, peak = [0], [0]
+
+    async def run_document(document, emit):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        emit({"document": document.path})
+        running[0] -= 1
+
+    async def main():
+        documents = [BatchDocument(f"{number}.pdf") for number in range(7)]
+        return [record async for record in run_batch(documents, run_document, concurrency=3)]
+
+    records = asyncio.run(main())
+    assert sorted(record["document"] for record in records) == [f"{number}.pdf" for number in range(7)]
+    assert peak[0] == 3
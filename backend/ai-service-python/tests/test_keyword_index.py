@@ -0,0 +1,118 @@
+import math
+import os
+import random
+import string
+from collections import Counter
+
+import pytest
+
+from keyword_index import KeywordIndex, tokenize
+
+
+def random_text(rng: random.Random, vocabulary: list) -> str:
+    return " ".join(rng.choice(vocabulary) for _ in range(rng.randint(5, 60)))
+
+
+@pytest.fixture
+def corpus():
+    rng = random.Random(7)
+    vocabulary = ["".join(rng.choice(string.ascii_lowercase) for _ in range(7)) for _ in range(300)]
+    return [(f"doc-{number}", random_text(rng, vocabulary[:40 + number]), rng.choice(["risk_factors", "mdna"]),
+             rng.choice(["AAA", "bbb", None])) for number in range(150)]
+
+
+def expected_scores(corpus: list, doc_id: str, ticker: str = None) -> dict:
+    """Sublinear TF-IDF of every term of one section, computed from scratch, as {term: score}."""
+    documents = {entry[0]: entry for entry in corpus}
+    _id, text, section, _ticker = documents[doc_id]
+    reference = [entry for entry in corpus if entry[2] == section
+                 and (ticker is None or (entry[3] or "").upper() == ticker.upper())]
+    if all(entry[0] != doc_id for entry in reference):
+        reference.append(documents[doc_id])
+    frequency = Counter(term for entry in reference for term in tokenize(entry[1]))
+    return {term: (1 + math.log(count)) * (math.log((1 + len(reference)) / (1 + frequency[term])) + 1)
+            for term, count in tokenize(text).items()}
+
+
+def assert_scores(index: KeywordIndex, corpus: list, doc_id: str, ticker: str = None):
+    scores = expected_scores(corpus, doc_id, ticker)
+    highest = max(scores.values())
+    terms = index.top_terms(doc_id, 10, ticker)
+    assert len(terms) == min(10, len(scores))
+    for entry in terms:
+        assert entry["value"] == int(round(10 + 90 * scores[entry["text"]] / highest))
+    # Nothing left out scores higher than what was returned.
+    lowest = min(scores[entry["text"]] for entry in terms)
+    assert all(score <= lowest + 1e-9 for term, score in scores.items() if term not in {e["text"] for e in terms})
+
+
+def test_top_terms_match_tf_idf(tmp_path, corpus):
+    index = KeywordIndex(str(tmp_path))
+    for entry in corpus:
+        assert index.add(*entry)
+    for doc_id in ("doc-0", "doc-77", "doc-149"):
+        for ticker in (None, "AAA", "bbb", "ZZZ"):
+            assert_scores(index, corpus, doc_id, ticker)
+
+
+def test_document_frequencies_follow_later_additions(tmp_path, corpus):
+    index = KeywordIndex(str(tmp_path))
+    for entry in corpus[:50]:
+        index.add(*entry)
+    assert_scores(index, corpus[:50], "doc-10", "AAA")
+    for entry in corpus[50:]:
+        index.add(*entry)
+    assert_scores(index, corpus, "doc-10", "AAA")
+    assert_scores(index, corpus, "doc-120")
+
+
+def test_segments_are_merged_by_size(tmp_path, corpus):
+    index = KeywordIndex(str(tmp_path))
+    for entry in corpus:
+        index.add(*entry)
+    stats = index.stats()
+    assert stats["documents"] == len(corpus)
+    # Size-tiered merging keeps one segment per set bit of the document count at most.
+    assert stats["segments"] <= len(corpus).bit_length()
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".npz")]) == stats["segments"]
+
+
+def test_reload_round_trip(tmp_path, corpus):
+    index = KeywordIndex(str(tmp_path))
+    for entry in corpus:
+        index.add(*entry)
+    reloaded = KeywordIndex(str(tmp_path))
+    assert reloaded.stats() == index.stats()
+    assert not reloaded.add(*corpus[3])
+    for doc_id in ("doc-1", "doc-100"):
+        assert reloaded.top_terms(doc_id, 20, "AAA") == index.top_terms(doc_id, 20, "AAA")
+        assert reloaded.top_terms(doc_id, 20) == index.top_terms(doc_id, 20)
+
+
+def test_interrupted_journal_write_is_cut_off(tmp_path, corpus):
+    index = KeywordIndex(str(tmp_path))
+    for entry in corpus[:20]:
+        index.add(*entry)
+    with open(tmp_path / "journal.jsonl", "a", encoding="utf-8") as journal:
+        journal.write('{"terms": ["half')
+    reloaded = KeywordIndex(str(tmp_path))
+    assert reloaded.stats()["documents"] == 20
+    assert reloaded.add(*corpus[20])
+    assert KeywordIndex(str(tmp_path)).stats()["documents"] == 21
+    assert_scores(KeywordIndex(str(tmp_path)), corpus[:21], "doc-20")
+
+
+def test_add_ignores_duplicates_and_empty_sections(tmp_path):
+    index = KeywordIndex(str(tmp_path))
+    assert index.add("a", "Supply chain disruption and supply shortages", "risk_factors", "aaa")
+    assert not index.add("a", "Something else entirely", "risk_factors")
+    assert not index.add("b", "the and of", "risk_factors")
+    assert index.top_terms("missing") == []
+    assert index.stats()["tickers"] == 1
+    assert "supply chain" in {entry["text"] for entry in index.top_terms("a")}
+
+
+def test_tokenize_skips_stopwords_and_bigrams_across_them():
+    counts = tokenize("Supply chain risks: the supply of chain parts.")
+    assert counts["supply"] == 2 and counts["supply chain"] == 1
+    assert "supply of" not in counts and "of" not in counts and "risks" not in counts
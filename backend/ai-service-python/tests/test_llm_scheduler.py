@@ -0,0 +1,119 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from llm_scheduler import LLMScheduler, TokenBucket, estimate_tokens
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+class Unavailable(Exception):
+    code = 503
+
+
+def scheduler(**options) -> LLMScheduler:
+    settings = {"requests_per_minute": 100000, "tokens_per_minute": 10 ** 9, "base_backoff": 0.05,
+                "transient_backoff": 0.01}
+    return LLMScheduler(**{**settings, **options})
+
+
+def failing(errors: list, answer="ok"):
+    """A call factory that raises `errors` in turn, then answers."""
+    calls = []
+
+    async def call():
+        calls.append(time.monotonic())
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return SimpleNamespace(text=answer)
+    return call, calls
+
+
+def test_rate_limit_is_retried_after_a_back_off():
+    llm = scheduler()
+    call, calls = failing([RateLimited("429 Resource has been exhausted")])
+    result = asyncio.run(llm.run(call, 100, "summary"))
+    assert result.text == "ok"
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.05
+    assert llm.rate_limited == 1 and llm.completed == 1 and llm.failed == 0
+
+
+def test_rate_limit_pauses_every_call():
+    llm = scheduler()
+    limited, _limited_calls = failing([RateLimited("quota")])
+    other, other_calls = failing([])
+
+    async def main():
+        first = asyncio.create_task(llm.run(limited, 100, "first"))
+        await asyncio.sleep(0.01)
+        # Admitted after the 429, so it waits for the pause although it never hit the limit itself.
+        started = time.monotonic()
+        await llm.run(other, 100, "second")
+        await first
+        return started
+
+    started = asyncio.run(main())
+    assert other_calls[0] - started >= 0.04
+
+
+def test_rate_limit_gives_up_after_max_retries():
+    llm = scheduler(max_retries=2)
+    call, calls = failing([RateLimited("429")] * 5)
+    with pytest.raises(RateLimited):
+        asyncio.run(llm.run(call, 100, "summary"))
+    assert len(calls) == 3
+    assert llm.rate_limited == 2 and llm.failed == 1
+
+
+def test_transient_errors_are_retried_without_pausing_others():
+    llm = scheduler(max_transient_retries=1)
+    call, calls = failing([Unavailable("service unavailable")])
+    assert asyncio.run(llm.run(call, 100, "summary")).text == "ok"
+    assert llm.transient_retries == 1 and llm.rate_limited == 0
+
+    call, calls = failing([Unavailable("down"), Unavailable("still down")])
+    with pytest.raises(Unavailable):
+        asyncio.run(llm.run(call, 100, "summary"))
+    assert len(calls) == 2
+
+
+def test_other_errors_are_not_retried():
+    llm = scheduler()
+    call, calls = failing([ValueError("bad request")])
+    with pytest.raises(ValueError):
+        asyncio.run(llm.run(call, 100, "summary"))
+    assert len(calls) == 1 and llm.failed == 1
+
+
+def test_timeout_counts_as_transient():
+    llm = scheduler(max_transient_retries=1)
+    attempts = []
+
+    async def slow():
+        attempts.append(True)
+        if len(attempts) == 1:
+            await asyncio.sleep(1)
+        return SimpleNamespace(text="ok")
+
+    assert asyncio.run(llm.run(slow, 100, "summary", timeout=0.05)).text == "ok"
+    assert llm.timed_out == 1 and len(attempts) == 2
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(rate_per_minute=600, capacity=10)
+    assert bucket.time_until(10) == 0.0
+    bucket.consume(10)
+    assert bucket.time_until(5) == pytest.approx(0.5, abs=0.05)
+    # Larger than the bucket: waits for a full bucket rather than forever.
+    assert bucket.time_until(50) == pytest.approx(1.0, abs=0.05)
+
+
+def test_estimate_tokens_counts_text_parts_only():
+    assert estimate_tokens("a" * 400) == 100
+    assert estimate_tokens(["a" * 40, b"bytes", "b" * 40]) == 20
+    assert estimate_tokens("") == 1
@@ -0,0 +1,102 @@
+import math
+
+import pytest
+
+from ratios import compute_ratios, match_concepts, parse_amount
+
+
+@pytest.mark.parametrize("item", [
+    "Net loss",
+    "Net income (loss)",
+    "Net income (loss) attributable to Acme Corp.",
+    "Net loss attributable to Acme, Inc.",
+    "Net income attributable to common stockholders",
+])
+def test_net_income_aliases_survive_the_qualifier_guard(item):
+    found = match_concepts([{"item": item, "current_period": "(1,234)"}], "income_statement")
+    assert found["net_income"]["item"] == item
+
+
+def test_noncontrolling_share_is_not_net_income():
+    rows = [{"item": "Net income attributable to noncontrolling interests", "current_period": "12"},
+            {"item": "Net income attributable to Acme Corp.", "current_period": "900"}]
+    assert match_concepts(rows, "income_statement")["net_income"]["current_period"] == "900"
+    assert "net_income" not in match_concepts(rows[:1], "income_statement")
+
+
+@pytest.mark.parametrize("item, concept", [
+    ("Non-operating income", "operating_income"),
+    ("Other current assets", "current_assets"),
+    ("Total noncurrent liabilities", "current_liabilities"),
+])
+def test_negating_qualifiers_are_rejected(item, concept):
+    statement = "income_statement" if concept == "operating_income" else "balance_sheet"
+    assert concept not in match_concepts([{"item": item, "current_period": "1"}], statement)
+
+
+STATEMENTS = {
+    "income_statement": [
+        {"item": "Total net sales", "current_period": "1,000", "previous_period": "800"},
+        {"item": "Cost of sales", "current_period": "(600)", "previous_period": "500"},
+        {"item": "Operating income", "current_period": "200", "previous_period": "150"},
+        {"item": "Net income", "current_period": "100", "previous_period": "80"},
+    ],
+    "balance_sheet": [
+        {"item": "Total current assets", "current_period": "$500", "previous_period": "400"},
+        {"item": "Total assets", "current_period": "2,000", "previous_period": "1,800"},
+        {"item": "Total current liabilities", "current_period": "250", "previous_period": "—"},
+        {"item": "Total shareholders' equity", "current_period": "800", "previous_period": "700"},
+    ],
+    "cash_flow_statement": [
+        {"item": "Net cash provided by operating activities", "current_period": "300", "previous_period": "200"},
+        {"item": "Purchases of property and equipment", "current_period": "(100)", "previous_period": "(50)"},
+    ],
+}
+
+
+def test_match_concepts_prefers_exact_names():
+    rows = [{"item": "Revenues", "current_period": "1"}, {"item": "Total revenues", "current_period": "2"}]
+    assert match_concepts(rows, "income_statement")["revenue"]["current_period"] == "2"
+
+
+def test_match_concepts_only_reads_its_statement():
+    assert match_concepts(STATEMENTS["income_statement"], "balance_sheet") == {}
+
+
+def test_compute_ratios():
+    ratios = {entry["name"]: entry for entry in compute_ratios(STATEMENTS)["ratios"]}
+    assert ratios["Gross Margin %"] == {"name": "Gross Margin %", "value": "40.00%", "previous_value": "37.50%"}
+    assert ratios["Operating Margin %"]["value"] == "20.00%"
+    assert ratios["Net Profit Margin %"]["value"] == "10.00%"
+    # Total liabilities are missing, so they are derived from assets minus equity.
+    assert ratios["Debt-to-Equity Ratio"] == {"name": "Debt-to-Equity Ratio", "value": "1.50", "previous_value": "1.57"}
+    # The prior current liabilities are "—": the ratio has no previous value.
+    assert ratios["Current Ratio"] == {"name": "Current Ratio", "value": "2.00", "previous_value": None}
+    assert ratios["Return on Equity %"]["value"] == "12.50%"
+    assert ratios["Return on Assets %"]["value"] == "5.00%"
+    assert ratios["Free Cash Flow Margin %"] == {"name": "Free Cash Flow Margin %", "value": "20.00%",
+                                                 "previous_value": "18.75%"}
+    assert ratios["Revenue Growth %"] == {"name": "Revenue Growth %", "value": "25.00%", "previous_value": None}
+    assert ratios["Net Income Growth %"]["value"] == "25.00%"
+
+
+def test_compute_ratios_omits_what_cannot_be_computed():
+    assert compute_ratios({}) == {"ratios": []}
+    only_revenue = {"income_statement": [{"item": "Revenue", "current_period": "10", "previous_period": "0"}]}
+    assert compute_ratios(only_revenue) == {"ratios": []}
+    losses = {"income_statement": [{"item": "Revenue", "current_period": "10", "previous_period": "10"},
+                                   {"item": "Net loss", "current_period": "(5)", "previous_period": "(10)"}]}
+    ratios = {entry["name"]: entry["value"] for entry in compute_ratios(losses)["ratios"]}
+    assert ratios == {"Net Profit Margin %": "-50.00%", "Revenue Growth %": "0.00%", "Net Income Growth %": "50.00%"}
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1,234", 1234.0), ("(1,234)", -1234.0), ("-1,234.5", -1234.5), ("$1.2 billion", 1.2e9), ("12%", 12.0), (7, 7.0),
+])
+def test_parse_amount(value, expected):
+    assert parse_amount(value) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("value", ["—", "N/A", None, ""])
+def test_parse_amount_without_a_number(value):
+    assert math.isnan(parse_amount(value))
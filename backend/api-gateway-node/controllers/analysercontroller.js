@@ -13,7 +13,10 @@ export const upload = multer({ storage: storage }).fields([
     { name: 'previousReport', maxCount: 1 }
 ]);
 
-const analyzeFile = async (file) => {
+// The ticker lets the Python service carry forward results of sections unchanged since the ticker's last filing.
+// Leave it out for an older filing (the previous-period upload), or the service's history would
+// take it for the ticker's latest one.
+const analyzeFile = async (file, ticker) => {
     if (!file) return null;
     const form = new FormData();
     form.append('file', file.buffer, {
@@ -23,32 +26,90 @@ const analyzeFile = async (file) => {
     console.log(`Calling Python service for: ${file.originalname}`);
     const response = await axios.post(process.env.PYTHON_SERVICE_URL, form, {
         headers: { ...form.getHeaders() },
+        params: { ticker },
         // timeout: 180000
     });
     return response.data;
 };
 
+// The Python service streams results from the /stream sub-route of its /analyze endpoint.
+const pythonStreamUrl = () => process.env.PYTHON_STREAM_URL || `${process.env.PYTHON_SERVICE_URL.replace(/\/$/, '')}/stream`;
+
+// Posts a file to the Python streaming endpoint and calls onEvent(event, data) for every server-sent event.
+const analyzeFileStream = async (file, ticker, onEvent, signal) => {
+    const form = new FormData();
+    form.append('file', file.buffer, {
+        filename: file.originalname,
+        contentType: file.mimetype,
+    });
+    console.log(`Streaming analysis from Python service for: ${file.originalname}`);
+    const response = await axios.post(pythonStreamUrl(), form, {
+        headers: { ...form.getHeaders() },
+        params: { ticker },
+        responseType: 'stream',
+        signal,
+    });
+    response.data.setEncoding('utf8');
+
+    let buffer = '';
+    for await (const chunk of response.data) {
+        buffer += chunk;
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = 'message';
+            const dataLines = [];
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+            }
+            // Lines starting with ":" are keep-alive comments and carry no data.
+            if (dataLines.length > 0) {
+                onEvent(event, JSON.parse(dataLines.join('\n')));
+            }
+        }
+    }
+};
+
+// The diff endpoint lives at the root of the Python service, next to /analyze.
+const pythonDiffUrl = () => process.env.PYTHON_DIFF_URL || `${new URL(process.env.PYTHON_SERVICE_URL).origin}/diff/risk-factors`;
+
+// Formats the changed paragraphs from the Python diff for the comparison prompt.
+const formatRiskChanges = (changes) => changes.map((change, index) => {
+    if (change.status === 'added') return `${index + 1}. ADDED: "${change.current}"`;
+    if (change.status === 'removed') return `${index + 1}. REMOVED: "${change.previous}"`;
+    return `${index + 1}. MODIFIED (similarity ${change.similarity}):\n   BEFORE: "${change.previous}"\n   AFTER: "${change.current}"`;
+}).join('\n');
+
 const getRiskComparison = async (previous_risk_text, current_risk_text) => {
     console.log("--- AI Task (Node.js): Comparing Risk Factors ---");
+    // Unchanged paragraphs are dropped locally so only real changes reach the model.
+    const { data: diff } = await axios.post(pythonDiffUrl(), {
+        previous_text: previous_risk_text || '',
+        current_text: current_risk_text || '',
+    });
+    console.log(`Risk diff: ${diff.summary.added} added, ${diff.summary.removed} removed, ${diff.summary.modified} modified, ${diff.summary.unchanged} unchanged`);
+    if (diff.changes.length === 0) {
+        return { comparison_summary: [] };
+    }
+
     const model = genAI.getGenerativeModel({ model: "gemini-1.5-pro-latest" });
     const prompt = `
-    You are an expert financial compliance officer. Compare the "Risk Factors" from two consecutive reports.
-    PREVIOUS: "${previous_risk_text}"
-    CURRENT: "${current_risk_text}"
-    1.  **Comparison Summary:**Summarize the meaningful, substantive changes (new risks, removed risks, or significantly altered language). The difference must be relevant, useless differences must be avoided
-    2.  **Word Cloud Data:** You are a risk analyst. Read the following "Risk Factors" text and identify the 30 most important and frequently mentioned keywords or two-word phrases.
-    Ignore common words like "company", "business", "risk", "factors", "may", "could". Focus on specific risk topics like "intense competition", "supply chain", "cybersecurity", "government regulation", "economic conditions", etc.
-
-    Respond ONLY with a single JSON object with two keys:
+    You are an expert financial compliance officer. Below are the paragraphs of the "Risk Factors" section that changed between two consecutive reports; unchanged paragraphs have been left out.
+    CHANGES:
+    ${formatRiskChanges(diff.changes)}
+    **Comparison Summary:** Summarize the meaningful, substantive changes (new risks, removed risks, or significantly altered language). The difference must be relevant, useless differences must be avoided.
+
+    Respond ONLY with a single JSON object with one key:
     - "comparison_summary": An array of strings, where each string is a summary of a single meaningful change.
-    - "wordcloud_data": An array of objects, where each object has "text" and "value" (a score from 10-100) keys.
 
     Respond ONLY with **strictly valid JSON**, using **double quotes** for keys and strings.  
 Do NOT include markdown, comments, or extra text. Do NOT include trailing commas.
 
 Make sure all arrays and objects are properly closed. The JSON must be parseable by JSON.parse() in Node.js.
 
-    If no changes are found for a task, return an empty array for that key.
+    If no meaningful changes are found, return an empty array.
     `;
     const result = await model.generateContent(prompt);
     const response = await result.response;
@@ -128,6 +189,81 @@ const getIndustryBenchmarks = async (ratios) => {
 };
 
 
+// Runs the gateway-side AI tasks on top of the Python analysis and stores the final report.
+const assembleAndSaveReport = async ({ userId, companyTicker, filename, currentAnalysis, previousAnalysis }) => {
+    let riskAnalysisSuiteResults = null;
+
+if (previousAnalysis && previousAnalysis.raw_risk_factors) {
+riskAnalysisSuiteResults = await getRiskComparison(
+    previousAnalysis.raw_risk_factors,
+    currentAnalysis.raw_risk_factors
+);
+console.log(riskAnalysisSuiteResults)
+} else {
+console.warn("No previous analysis available for risk comparison.");
+riskAnalysisSuiteResults = {
+    comparison_summary: "No previous report available for comparison."
+};
+}
+    console.log(riskAnalysisSuiteResults)
+
+    const executiveSummary = await generateExecutiveSummary(currentAnalysis);
+    console.log(executiveSummary)
+
+    const industryBenchmarks = await getIndustryBenchmarks(currentAnalysis.financial_ratios);
+    console.log(industryBenchmarks)
+
+    const finalReport = {
+        userId: userId,
+        companyTicker: companyTicker,
+        filename: filename,
+        key_metrics: currentAnalysis.key_metrics,
+        risk_comparison: { comparison_summary: riskAnalysisSuiteResults.comparison_summary },
+        // Word cloud terms are scored locally by the Python service's TF-IDF keyword index.
+        risk_wordcloud: { wordcloud_data: currentAnalysis.risk_keywords || [] },
+        management_tone: currentAnalysis.management_tone,
+        risk_summary: currentAnalysis.risk_summary,
+        raw_risk_factors: currentAnalysis.raw_risk_factors,
+        competitor_analysis: currentAnalysis.competitor_analysis,
+        raw_management_discussion: currentAnalysis.raw_management_discussion,
+        legal_summary: currentAnalysis.legal_summary,
+        guidance_analysis: currentAnalysis.guidance_analysis,
+        financial_statements: currentAnalysis.financial_statements,
+        governance_changes: currentAnalysis.governance_changes,
+        red_flags: currentAnalysis.red_flags,
+        executive_summary: executiveSummary,
+        financial_ratios: currentAnalysis.financial_ratios,
+        industry_benchmarks: industryBenchmarks,
+        debt_details: currentAnalysis.debt_details,
+        esg_analysis: currentAnalysis.esg_analysis,
+        footnote_summary: currentAnalysis.footnote_summary,
+        previous_raw_risk_factors: previousAnalysis?.raw_risk_factors || null,
+previous_key_metrics: previousAnalysis?.key_metrics || null,
+previous_management_tone: previousAnalysis?.management_tone || null,
+previous_risk_summary: previousAnalysis?.risk_summary || null,
+previous_competitor_analysis: previousAnalysis?.competitor_analysis || null,
+previous_raw_management_discussion: previousAnalysis?.raw_management_discussion || null,
+previous_legal_summary: previousAnalysis?.legal_summary || null,
+previous_guidance_analysis: previousAnalysis?.guidance_analysis || null,
+previous_financial_statements: previousAnalysis?.financial_statements || null,
+previous_governance_changes: previousAnalysis?.governance_changes || null,
+previous_red_flags: previousAnalysis?.red_flags || null,
+previous_financial_ratios: previousAnalysis?.financial_ratios || null,
+previous_debt_details: previousAnalysis?.debt_details || null,
+previous_esg_analysis: previousAnalysis?.esg_analysis || null,
+previous_footnote_summary: previousAnalysis?.footnote_summary || null,
+    };
+
+
+    const newReport = new AnalysisReport(finalReport);
+    await newReport.save();
+
+    console.log(finalReport)
+
+    console.log("Analysis report saved to MongoDB.");
+    return finalReport;
+};
+
 export const analyzeReport = async (req, res) => {
     try {
         console.log('--- analyzeReport function has started ---');
@@ -158,7 +294,7 @@ export const analyzeReport = async (req, res) => {
 
         console.log(`Starting analysis for ticker: ${companyTicker}, user: ${userId}`);
 
-        const currentAnalysis = await analyzeFile(currentReportFile);
+        const currentAnalysis = await analyzeFile(currentReportFile, companyTicker);
         let previousAnalysis = null;
 
         console.log("Step 1 Complete. Current report analysis finished.");
@@ -185,76 +321,14 @@ export const analyzeReport = async (req, res) => {
 
         console.log("Received analysis for both files. Assembling final report.");
 
-        let riskAnalysisSuiteResults = null;
-
-if (previousAnalysis && previousAnalysis.raw_risk_factors) {
-    riskAnalysisSuiteResults = await getRiskComparison(
-        previousAnalysis.raw_risk_factors,
-        currentAnalysis.raw_risk_factors
-    );
-    console.log(riskAnalysisSuiteResults)
-} else {
-    console.warn("No previous analysis available for risk comparison.");
-    riskAnalysisSuiteResults = {
-        comparison_summary: "No previous report available for comparison.",
-        wordcloud_data: []
-    };
-}
-        console.log(riskAnalysisSuiteResults)
-
-        const executiveSummary = await generateExecutiveSummary(currentAnalysis);
-        console.log(executiveSummary)
-
-        const industryBenchmarks = await getIndustryBenchmarks(currentAnalysis.financial_ratios);
-        console.log(industryBenchmarks)
-
-        const finalReport = {
-            userId: userId,
-            companyTicker: companyTicker,
+        const finalReport = await assembleAndSaveReport({
+            userId,
+            companyTicker,
             filename: currentReportFile.originalname,
-            key_metrics: currentAnalysis.key_metrics,
-            risk_comparison: { comparison_summary: riskAnalysisSuiteResults.comparison_summary },
-            risk_wordcloud: { wordcloud_data: riskAnalysisSuiteResults.wordcloud_data }, 
-            management_tone: currentAnalysis.management_tone,
-            risk_summary: currentAnalysis.risk_summary,
-            raw_risk_factors: currentAnalysis.raw_risk_factors,
-            competitor_analysis: currentAnalysis.competitor_analysis,
-            raw_management_discussion: currentAnalysis.raw_management_discussion,
-            legal_summary: currentAnalysis.legal_summary,
-            guidance_analysis: currentAnalysis.guidance_analysis,
-            financial_statements: currentAnalysis.financial_statements,
-            governance_changes: currentAnalysis.governance_changes,
-            red_flags: currentAnalysis.red_flags,
-            executive_summary: executiveSummary,
-            financial_ratios: currentAnalysis.financial_ratios,
-            industry_benchmarks: industryBenchmarks,
-            debt_details: currentAnalysis.debt_details,
-            esg_analysis: currentAnalysis.esg_analysis,
-            footnote_summary: currentAnalysis.footnote_summary,
-            previous_raw_risk_factors: previousAnalysis?.raw_risk_factors || null,
-    previous_key_metrics: previousAnalysis?.key_metrics || null,
-    previous_management_tone: previousAnalysis?.management_tone || null,
-    previous_risk_summary: previousAnalysis?.risk_summary || null,
-    previous_competitor_analysis: previousAnalysis?.competitor_analysis || null,
-    previous_raw_management_discussion: previousAnalysis?.raw_management_discussion || null,
-    previous_legal_summary: previousAnalysis?.legal_summary || null,
-    previous_guidance_analysis: previousAnalysis?.guidance_analysis || null,
-    previous_financial_statements: previousAnalysis?.financial_statements || null,
-    previous_governance_changes: previousAnalysis?.governance_changes || null,
-    previous_red_flags: previousAnalysis?.red_flags || null,
-    previous_financial_ratios: previousAnalysis?.financial_ratios || null,
-    previous_debt_details: previousAnalysis?.debt_details || null,
-    previous_esg_analysis: previousAnalysis?.esg_analysis || null,
-    previous_footnote_summary: previousAnalysis?.footnote_summary || null,
-        };
-
-
-        const newReport = new AnalysisReport(finalReport);
-        await newReport.save();
-
-        console.log(finalReport)
-
-        console.log("Analysis report saved to MongoDB.");
+            currentAnalysis,
+            previousAnalysis,
+        });
+
 
         res.status(200).json(finalReport);
 
@@ -271,6 +345,74 @@ if (previousAnalysis && previousAnalysis.raw_risk_factors) {
     }
 };
 
+// Same as analyzeReport, but forwards each section to the client as server-sent events
+// while the Python service is still working, then sends the saved report as a "complete" event.
+export const analyzeReportStream = async (req, res) => {
+    const userId = req.user.uid;
+    const { companyTicker } = req.body;
+    if (!companyTicker) {
+        return res.status(400).json({ message: "Company ticker is required." });
+    }
+    if (!req.files || !req.files.currentReport) {
+        return res.status(400).json({ message: "A current report file is required." });
+    }
+    const currentReportFile = req.files.currentReport[0];
+    const previousReportFile = req.files.previousReport ? req.files.previousReport[0] : null;
+
+    res.writeHead(200, {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive',
+    });
+    const send = (event, data) => res.write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+
+    // Stop the Python analysis if the browser goes away.
+    const controller = new AbortController();
+    res.on('close', () => {
+        if (!res.writableEnded) controller.abort();
+    });
+
+    try {
+        console.log(`Starting streamed analysis for ticker: ${companyTicker}, user: ${userId}`);
+
+        // The previous report is resolved in parallel; without it the report simply has no comparison.
+        const previousAnalysisPromise = (previousReportFile
+            ? analyzeFile(previousReportFile)
+            : AnalysisReport.findOne({ companyTicker: companyTicker, userId: userId }).sort({ uploadDate: -1 })
+        ).catch((error) => {
+            console.error("Error getting previous analysis:", error.message);
+            return null;
+        });
+
+        let currentAnalysis = null;
+        let streamError = null;
+        await analyzeFileStream(currentReportFile, companyTicker, (event, data) => {
+            if (event === 'complete') currentAnalysis = data;
+            else if (event === 'error') streamError = data;
+            else send(event, data);
+        }, controller.signal);
+
+        if (!currentAnalysis) {
+            throw new Error(streamError?.detail || "Failed to get analysis from Python service for the current file.");
+        }
+
+        const previousAnalysis = await previousAnalysisPromise;
+        const finalReport = await assembleAndSaveReport({
+            userId,
+            companyTicker,
+            filename: currentReportFile.originalname,
+            currentAnalysis,
+            previousAnalysis,
+        });
+        send('complete', finalReport);
+    } catch (error) {
+        console.error("Error in streamed orchestration logic:", error.message);
+        send('error', { message: "An error occurred during analysis.", details: error.message });
+    } finally {
+        res.end();
+    }
+};
+
 export const getAnalysisHistory = async (req, res) => {
     try {
         const userId = req.user.uid;
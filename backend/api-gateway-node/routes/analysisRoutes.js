@@ -1,10 +1,12 @@
 import express from 'express';
 const router = express.Router();
-import { upload, analyzeReport, getAnalysisHistory,explainChart } from '../controllers/analysercontroller.js';
+import { upload, analyzeReport, analyzeReportStream, getAnalysisHistory,explainChart } from '../controllers/analysercontroller.js';
 import { verifyToken } from '../middleware/authMiddleware.js';
 
 router.post('/analyze', verifyToken, upload, analyzeReport);
 
+router.post('/analyze/stream', verifyToken, upload, analyzeReportStream);
+
 router.get('/history/:ticker', verifyToken,getAnalysisHistory);
 
 router.post('/explain',verifyToken,explainChart)